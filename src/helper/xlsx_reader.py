@@ -0,0 +1,328 @@
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from xml.etree.ElementTree import Element, iterparse, parse
+
+import numpy as np
+
+# Reads the values of the cells of a xlsx file like 'ExcelEditor.read_page',
+# streaming the xml of the sheets, without building cells or styles
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_RELATIONSHIPS = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+)
+NS_PACKAGE_RELATIONSHIPS = (
+    "{http://schemas.openxmlformats.org/package/2006/relationships}"
+)
+
+EPOCH_1900 = datetime(1899, 12, 30)
+EPOCH_1904 = datetime(1904, 1, 1)
+
+# builtin number formats which are dates or times, and durations
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 47}
+BUILTIN_TIMEDELTA_FORMATS = {46}
+# anything in quotes or in square brackets, except hours, minutes or seconds
+STRIP_FORMAT_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+DATE_FORMAT_RE = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+TIMEDELTA_FORMAT_RE = re.compile(
+    r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?", re.I
+)
+REFERENCE_RE = re.compile(r"([A-Z]+)([0-9]+)")
+# character escaped in a string, '_x005F_' being the escaped '_'
+ESCAPED_RE = re.compile(r"_x([0-9A-Fa-f]{4})_")
+DIGITS = "0123456789"
+
+TAG_ROW = f"{NS_MAIN}row"
+TAG_CELL = f"{NS_MAIN}c"
+TAG_VALUE = f"{NS_MAIN}v"
+TAG_FORMULA = f"{NS_MAIN}f"
+
+
+class UnsupportedXlsx(ValueError):
+    """The file holds something only 'ExcelEditor' reads."""
+
+
+@dataclass
+class TableBounds:
+    """Cells of a page which are needed, indexes from 0: the columns until the
+    first empty cell of the row 'header_row' from 'first_col', the rows until the
+    first empty cell of the column 'key_col' from 'first_row'."""
+
+    header_row: int
+    first_col: int
+    first_row: int
+    key_col: int
+
+
+def is_date_format(number_format: str) -> bool:
+    number_format = STRIP_FORMAT_RE.sub("", number_format.split(";")[0])
+    return DATE_FORMAT_RE.search(number_format) is not None
+
+
+def is_timedelta_format(number_format: str) -> bool:
+    return TIMEDELTA_FORMAT_RE.search(number_format.split(";")[0]) is not None
+
+
+def split_reference(reference: str) -> Tuple[int, int]:
+    """Row and column indexes (from 0) of a reference like 'AB12'."""
+
+    match = REFERENCE_RE.fullmatch(reference)
+    if match is None:
+        raise UnsupportedXlsx(f"Cell reference '{reference}' not handled.")
+    letters, row = match.groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(row) - 1, col - 1
+
+
+def unescape(text: str) -> str:
+    """The characters written as '_xHHHH_', e.g. '_x000D_' for a carriage return."""
+
+    if "_x" not in text:
+        return text
+    return ESCAPED_RE.sub(lambda match: chr(int(match.group(1), 16)), text)
+
+
+def read_text(element: Element) -> str:
+    """Text of a string item, the runs of a rich text are joined."""
+
+    text = element.findtext(f"{NS_MAIN}t")
+    if not text:
+        text = "".join(
+            run.findtext(f"{NS_MAIN}t") or "" for run in element.iterfind(f"{NS_MAIN}r")
+        )
+    return unescape(text)
+
+
+def from_serial(value: float, epoch: datetime) -> datetime:
+    day, fraction = divmod(value, 1)
+    diff = timedelta(milliseconds=round(fraction * 24 * 3600 * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        raise UnsupportedXlsx("Times without a date are not handled.")
+    # the 29/02/1900 which does not exist
+    if 0 < value < 60 and epoch == EPOCH_1900:
+        day += 1
+    return epoch + timedelta(days=day) + diff
+
+
+class XlsxReader:
+
+    def __init__(self, path_excel: Path):
+        try:
+            self.zip = zipfile.ZipFile(path_excel)
+            self.sheet_paths = self.read_sheet_paths()
+            self.shared_strings = self.read_shared_strings()
+            self.date_styles = self.read_date_styles()
+        except (KeyError, SyntaxError, zipfile.BadZipFile) as e:
+            raise UnsupportedXlsx(f"Can not read '{path_excel}' : {e}") from e
+
+    def read_sheet_paths(self) -> Dict[str, str]:
+        workbook = parse(self.zip.open("xl/workbook.xml")).getroot()
+        properties = workbook.find(f"{NS_MAIN}workbookPr")
+        self.epoch = (
+            EPOCH_1904
+            if properties is not None
+            and properties.get("date1904", "false").lower() in ("1", "true")
+            else EPOCH_1900
+        )
+
+        relationships = parse(self.zip.open("xl/_rels/workbook.xml.rels")).getroot()
+        id_to_target = {
+            relationship.get("Id"): relationship.get("Target")
+            for relationship in relationships.iter(
+                f"{NS_PACKAGE_RELATIONSHIPS}Relationship"
+            )
+        }
+        sheet_paths = {}
+        for sheet in workbook.iter(f"{NS_MAIN}sheet"):
+            target = id_to_target[sheet.get(f"{NS_RELATIONSHIPS}id")]
+            # relative to the workbook, or absolute in the package
+            sheet_paths[sheet.get("name")] = (
+                target.lstrip("/")
+                if target.startswith("/")
+                else posixpath.normpath(posixpath.join("xl", target))
+            )
+        return sheet_paths
+
+    def read_shared_strings(self) -> List[str]:
+        if "xl/sharedStrings.xml" not in self.zip.namelist():
+            return []
+        shared_strings = []
+        for _, element in iterparse(self.zip.open("xl/sharedStrings.xml")):
+            if element.tag == f"{NS_MAIN}si":
+                shared_strings.append(read_text(element))
+                element.clear()
+        return shared_strings
+
+    def read_date_styles(self) -> Set[int]:
+        """Styles of the cells holding dates."""
+
+        if "xl/styles.xml" not in self.zip.namelist():
+            return set()
+        styles = parse(self.zip.open("xl/styles.xml")).getroot()
+        custom_formats = {
+            int(number_format.get("numFmtId")): number_format.get("formatCode", "")
+            for number_format in styles.iter(f"{NS_MAIN}numFmt")
+        }
+        cell_styles = styles.find(f"{NS_MAIN}cellXfs")
+        date_styles = set()
+        for style_idx, style in enumerate(
+            [] if cell_styles is None else cell_styles.iterfind(f"{NS_MAIN}xf")
+        ):
+            format_id = int(style.get("numFmtId", 0))
+            if format_id in custom_formats:
+                number_format = custom_formats[format_id]
+                is_date = is_date_format(number_format)
+                is_timedelta = is_timedelta_format(number_format)
+            else:
+                is_date = format_id in BUILTIN_DATE_FORMATS
+                is_timedelta = format_id in BUILTIN_TIMEDELTA_FORMATS
+            if is_timedelta:
+                raise UnsupportedXlsx("Durations are not handled.")
+            if is_date:
+                date_styles.add(style_idx)
+        return date_styles
+
+    def get_pages_name(self) -> List[str]:
+        return list(self.sheet_paths)
+
+    def read_cell_value(self, cell: Element) -> Optional[Any]:
+        data_type = cell.get("t", "n")
+        formula = cell.find(TAG_FORMULA)
+        if formula is not None:
+            # the formula is the value, as read by 'ExcelEditor'
+            if formula.text is None or formula.get("t") == "array":
+                raise UnsupportedXlsx("Shared and array formulas are not handled.")
+            return "=" + formula.text
+        if data_type == "inlineStr":
+            inline_string = cell.find(f"{NS_MAIN}is")
+            return None if inline_string is None else read_text(inline_string)
+
+        value = cell.findtext(TAG_VALUE) or None
+        if value is None:
+            return None
+        if data_type == "n":
+            number = (
+                float(value) if "." in value or "e" in value.lower() else int(value)
+            )
+            if int(cell.get("s", 0)) in self.date_styles:
+                return from_serial(number, self.epoch)
+            return number
+        elif data_type == "s":
+            return self.shared_strings[int(value)]
+        elif data_type == "b":
+            return bool(int(value))
+        elif data_type in ("str", "e"):
+            return value
+        elif data_type == "d":
+            return datetime.fromisoformat(value)
+        raise UnsupportedXlsx(f"Cell type '{data_type}' not handled.")
+
+    def read_page(
+        self, page_name: str, table: Optional[TableBounds] = None
+    ) -> np.ndarray:
+        """Values of the cells, rows x columns, None when empty. With a 'table',
+        only its cells and the ones above are read, the page ends with it."""
+
+        if page_name not in self.sheet_paths:
+            raise ValueError(f"The name page '{page_name}' has no worksheet.")
+
+        row_idxs, col_idxs, values = [], [], []
+        row_idx = -1
+        # unknown until the header row is read
+        last_col_idx = None
+        letters_to_col_idx: Dict[str, int] = {}
+        try:
+            with self.zip.open(self.sheet_paths[page_name]) as sheet:
+                # the cells are read once their row is parsed
+                for _, row in iterparse(sheet):
+                    if row.tag != TAG_ROW:
+                        continue
+                    reference = row.get("r")
+                    row_idx_before = row_idx
+                    row_idx = row_idx + 1 if reference is None else int(reference) - 1
+                    if table is not None:
+                        # a missing row is empty, the table ends before it
+                        if row_idx > max(row_idx_before + 1, table.first_row):
+                            break
+                        # a missing header row, the table has no column
+                        if last_col_idx is None and row_idx > table.header_row:
+                            last_col_idx = table.first_col - 1
+                    row_values: Dict[int, Any] = {}
+                    col_idx = -1
+                    for cell in row.iterfind(TAG_CELL):
+                        reference = cell.get("r")
+                        if reference is None:
+                            col_idx += 1
+                        else:
+                            letters = reference.rstrip(DIGITS)
+                            if letters not in letters_to_col_idx:
+                                letters_to_col_idx[letters] = split_reference(
+                                    reference
+                                )[1]
+                            col_idx = letters_to_col_idx[letters]
+                        # the cells after the table are not decoded
+                        if last_col_idx is not None and col_idx > last_col_idx:
+                            break
+                        row_values[col_idx] = self.read_cell_value(cell)
+                    # only the current row is kept in memory
+                    row.clear()
+
+                    if table is not None:
+                        if (
+                            row_idx >= table.first_row
+                            and row_values.get(table.key_col) is None
+                        ):
+                            break
+                        if row_idx == table.header_row:
+                            last_col_idx = table.first_col
+                            while row_values.get(last_col_idx) is not None:
+                                last_col_idx += 1
+                            last_col_idx -= 1
+                    row_idxs += [row_idx] * len(row_values)
+                    col_idxs += row_values.keys()
+                    values += row_values.values()
+        except (KeyError, SyntaxError, zipfile.BadZipFile) as e:
+            raise UnsupportedXlsx(f"Can not read the page '{page_name}' : {e}") from e
+
+        if last_col_idx is not None:
+            # the rows above the header are read before the columns are known
+            kept = np.asarray(col_idxs, dtype=int) <= last_col_idx
+            row_idxs = np.asarray(row_idxs, dtype=int)[kept]
+            col_idxs = np.asarray(col_idxs, dtype=int)[kept]
+            values = [value for value, keep in zip(values, kept) if keep]
+
+        page = np.full(
+            (max(row_idxs, default=-1) + 1, max(col_idxs, default=-1) + 1),
+            None,
+            dtype=object,
+        )
+        page_values = np.empty(len(values), dtype=object)
+        page_values[:] = values
+        page[row_idxs, col_idxs] = page_values
+        return page
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+if __name__ == "__main__":
+    import time
+
+    from helper.excel_editor import ExcelEditor
+    from vars import PATH_DOCS_PLANNING_MAY
+
+    start = time.perf_counter()
+    page = XlsxReader(PATH_DOCS_PLANNING_MAY).read_page("Anglos")
+    print(f"streamed in {time.perf_counter() - start:.3f} s")
+    start = time.perf_counter()
+    page_expected = ExcelEditor(PATH_DOCS_PLANNING_MAY).read_page("Anglos")
+    print(f"openpyxl in {time.perf_counter() - start:.3f} s")
+    nrows, ncols = page.shape
+    print((page == page_expected[:nrows, :ncols]).all())
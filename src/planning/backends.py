@@ -0,0 +1,446 @@
+import os
+import re
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pulp
+
+from planning.parameters import PlanningParameters
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.rules import (
+    EVENT_TYPE_TO_VARIABLE,
+    VARIABLES_MATRIX,
+    RuleContext,
+    Variable,
+    build_rule_context,
+    to_assignations,
+)
+from planning.solver import (
+    BIG_NUMBER,
+    SparseModel,
+    add_sparse_rows,
+    build_sparse_model,
+)
+
+# optional solvers, see 'requirements-backends.txt'; ortools first, 'cp_model'
+# fails on an undefined symbol when highspy is imported before it
+try:
+    from ortools.sat.python import cp_model
+except ImportError:
+    cp_model = None
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# without it a CP-SAT search never ends on the large instances
+TIME_LIMIT_BACKEND = 300.0  # seconds
+
+
+class BackendStatus(Enum):
+    OPTIMAL = "Optimal"
+    FEASIBLE = "Feasible"  # time limit reached with a solution
+    INFEASIBLE = "Infeasible"
+    UNBOUNDED = "Unbounded"
+    NOT_SOLVED = "Not Solved"  # time limit reached without a solution
+
+
+@dataclass
+class BackendResult:
+    status: BackendStatus
+    values: Optional[np.ndarray]  # flat, see 'RuleContext.index'
+    objective: Optional[float]
+    duration: float  # seconds, translation of the model included
+    time_to_first_feasible: Optional[float]  # seconds, None when unknown
+
+    @property
+    def time_to_optimal(self) -> Optional[float]:
+        return self.duration if self.status == BackendStatus.OPTIMAL else None
+
+
+class Backend(ABC):
+    """Solve a 'SparseModel' with a MIP solver."""
+
+    name = ""
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def solve(
+        self,
+        model: SparseModel,
+        time_limit: Optional[float] = None,
+        threads: Optional[int] = None,
+    ) -> BackendResult:
+        pass
+
+
+def get_time_first_feasible_cbc(log: str) -> Optional[float]:
+    """Time of the first solution in a CBC log, counted back from the end of the
+    process (negative)."""
+
+    match_solution = re.search(r"(Solution found of|Integer solution of)", log)
+    if match_solution is None:
+        return None
+    # the time is given on the same line or on the next ones
+    match_time = re.search(r"\(([\d.]+) seconds\)", log[match_solution.start() :])
+    match_total = re.search(r"Total time.*\(Wallclock seconds\):\s*([\d.]+)", log)
+    if match_time is None or match_total is None:
+        return None
+    return float(match_time.group(1)) - float(match_total.group(1))
+
+
+class CbcBackend(Backend):
+    name = "cbc"
+
+    def solve(
+        self,
+        model: SparseModel,
+        time_limit: Optional[float] = None,
+        threads: Optional[int] = None,
+    ) -> BackendResult:
+        start = time.perf_counter()
+        solver = pulp.LpProblem("pulp", pulp.LpMaximize)
+        variables = np.zeros(model.number_variables, dtype=object)
+        for idx in np.flatnonzero(model.upper_bounds):
+            variables[idx] = pulp.LpVariable(f"x{idx}", cat=pulp.LpBinary)
+        add_sparse_rows(solver, model, variables)
+        idxs = np.flatnonzero(model.objective)
+        solver += pulp.LpAffineExpression(
+            zip(variables[idxs], model.objective[idxs].tolist())
+        )
+
+        with tempfile.TemporaryDirectory() as dir_log:
+            path_log = os.path.join(dir_log, "cbc.log")
+            solver.solve(
+                pulp.PULP_CBC_CMD(
+                    msg=0, timeLimit=time_limit, threads=threads, logPath=path_log
+                )
+            )
+            with open(path_log) as f:
+                log = f.read()
+        duration = time.perf_counter() - start
+
+        if solver.status == pulp.LpStatusInfeasible:
+            status = BackendStatus.INFEASIBLE
+        elif solver.status == pulp.LpStatusUnbounded:
+            status = BackendStatus.UNBOUNDED
+        elif solver.sol_status == pulp.LpSolutionOptimal:
+            status = BackendStatus.OPTIMAL
+        elif solver.sol_status == pulp.LpSolutionIntegerFeasible:
+            status = BackendStatus.FEASIBLE
+        else:
+            status = BackendStatus.NOT_SOLVED
+        if status not in [BackendStatus.OPTIMAL, BackendStatus.FEASIBLE]:
+            return BackendResult(status, None, None, duration, None)
+
+        values = np.array(
+            [
+                (pulp.value(v) or 0) if isinstance(v, pulp.LpVariable) else 0
+                for v in variables
+            ]
+        )
+        time_first_feasible = get_time_first_feasible_cbc(log)
+        if time_first_feasible is not None:
+            # the log does not know the time spent writing the model
+            time_first_feasible += duration
+        elif status == BackendStatus.OPTIMAL:
+            # solved without search, e.g. by the preprocessing
+            time_first_feasible = duration
+        return BackendResult(
+            status=status,
+            values=values,
+            objective=pulp.value(solver.objective),
+            duration=duration,
+            time_to_first_feasible=time_first_feasible,
+        )
+
+
+def to_csc(model: SparseModel) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The rows in compressed sparse column format: starts, rows and values."""
+
+    rows = np.repeat(np.arange(model.number_rows), np.diff(model.starts))
+    order = np.argsort(model.cols, kind="stable")
+    number_terms = np.bincount(model.cols, minlength=model.number_variables)
+    starts = np.concatenate([[0], np.cumsum(number_terms)])
+    return starts, rows[order], model.values[order]
+
+
+class HighsBackend(Backend):
+    name = "highs"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return highspy is not None
+
+    def solve(
+        self,
+        model: SparseModel,
+        time_limit: Optional[float] = None,
+        threads: Optional[int] = None,
+    ) -> BackendResult:
+        start = time.perf_counter()
+        highs = highspy.Highs()
+        highs.setOptionValue("output_flag", False)
+        if time_limit is not None:
+            highs.setOptionValue("time_limit", float(time_limit))
+        if threads is not None:
+            highs.setOptionValue("threads", threads)
+
+        lp = highspy.HighsLp()
+        lp.num_col_ = model.number_variables
+        lp.num_row_ = model.number_rows
+        lp.sense_ = highspy.ObjSense.kMaximize
+        lp.col_cost_ = model.objective.astype(float)
+        lp.col_lower_ = np.zeros(model.number_variables)
+        lp.col_upper_ = model.upper_bounds.astype(float)
+        lp.row_lower_ = np.where(model.less_equal, -highspy.kHighsInf, model.bounds)
+        lp.row_upper_ = np.where(model.less_equal, model.bounds, highspy.kHighsInf)
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * model.number_variables
+        starts, rows, values = to_csc(model)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = starts
+        lp.a_matrix_.index_ = rows
+        lp.a_matrix_.value_ = values
+        highs.passModel(lp)
+
+        # the callbacks only exist in the recent versions
+        times_solution: List[float] = []
+        if hasattr(highs, "cbMipImprovingSolution"):
+            highs.cbMipImprovingSolution.subscribe(
+                lambda event: times_solution.append(time.perf_counter() - start)
+            )
+        highs.run()
+        duration = time.perf_counter() - start
+
+        model_status = highs.getModelStatus()
+        info = highs.getInfo()
+        has_solution = (
+            info.primal_solution_status
+            == highspy.SolutionStatus.kSolutionStatusFeasible
+        )
+        if model_status == highspy.HighsModelStatus.kOptimal:
+            status = BackendStatus.OPTIMAL
+        elif model_status == highspy.HighsModelStatus.kInfeasible:
+            status = BackendStatus.INFEASIBLE
+        elif model_status in [
+            highspy.HighsModelStatus.kUnbounded,
+            highspy.HighsModelStatus.kUnboundedOrInfeasible,
+        ]:
+            status = BackendStatus.UNBOUNDED
+        elif has_solution:
+            status = BackendStatus.FEASIBLE
+        else:
+            status = BackendStatus.NOT_SOLVED
+        if status not in [BackendStatus.OPTIMAL, BackendStatus.FEASIBLE]:
+            return BackendResult(status, None, None, duration, None)
+
+        return BackendResult(
+            status=status,
+            values=np.array(highs.getSolution().col_value),
+            objective=info.objective_function_value,
+            duration=duration,
+            time_to_first_feasible=times_solution[0] if times_solution else None,
+        )
+
+
+def remove_big_m(model: SparseModel) -> Tuple[np.ndarray, np.ndarray]:
+    """The rows as indicator constraints, only enforced when their activation
+    variable has its value: the terms kept (mask on 'cols') without the big M
+    ones, and the bounds of the rows once activated."""
+
+    activated = model.activation_cols >= 0
+    last_terms = model.starts[1:][activated] - 1
+    assert (model.cols[last_terms] == model.activation_cols[activated]).all()
+    terms_kept = np.ones(len(model.cols), dtype=bool)
+    terms_kept[last_terms] = False
+    sign = np.where(model.less_equal, 1, -1)
+    bounds = np.where(
+        activated & (model.activation_values == 1),
+        model.bounds - sign * BIG_NUMBER,
+        model.bounds,
+    )
+    return terms_kept, bounds
+
+
+class CpSatBackend(Backend):
+    name = "cp-sat"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return cp_model is not None
+
+    def solve(
+        self,
+        model: SparseModel,
+        time_limit: Optional[float] = None,
+        threads: Optional[int] = None,
+    ) -> BackendResult:
+        start = time.perf_counter()
+        # the big M rows are much weaker than indicator constraints for CP-SAT
+        terms_kept, bounds_activated = remove_big_m(model)
+        # CP-SAT only handles integer coefficients
+        values, bounds = np.rint(model.values), np.rint(bounds_activated)
+        objective = np.rint(model.objective)
+        assert (values == model.values).all() and (bounds == bounds_activated).all()
+        assert (objective == model.objective).all()
+
+        cp = cp_model.CpModel()
+        # no variable where the upper bound is 0
+        variables = np.zeros(model.number_variables, dtype=object)
+        for idx in np.flatnonzero(model.upper_bounds):
+            variables[idx] = cp.new_bool_var(f"x{idx}")
+        values, bounds = values.astype(int), bounds.astype(int).tolist()
+        activation_cols = model.activation_cols.tolist()
+        activation_values = model.activation_values.tolist()
+        for row_idx in range(model.number_rows):
+            terms = slice(model.starts[row_idx], model.starts[row_idx + 1])
+            kept = terms_kept[terms]
+            expression = cp_model.LinearExpr.weighted_sum(
+                variables[model.cols[terms][kept]].tolist(),
+                values[terms][kept].tolist(),
+            )
+            if model.less_equal[row_idx]:
+                constraint = cp.add(expression <= bounds[row_idx])
+            else:
+                constraint = cp.add(expression >= bounds[row_idx])
+            if activation_cols[row_idx] >= 0:
+                activation = variables[activation_cols[row_idx]]
+                constraint.only_enforce_if(
+                    activation if activation_values[row_idx] == 1 else ~activation
+                )
+        idxs = np.flatnonzero(objective)
+        cp.maximize(
+            cp_model.LinearExpr.weighted_sum(
+                variables[idxs].tolist(), objective[idxs].astype(int).tolist()
+            )
+        )
+
+        class SolutionTimes(cp_model.CpSolverSolutionCallback):
+            def __init__(self):
+                super().__init__()
+                self.times: List[float] = []
+
+            def on_solution_callback(self):
+                self.times.append(time.perf_counter() - start)
+
+        solver = cp_model.CpSolver()
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = time_limit
+        if threads is not None:
+            solver.parameters.num_workers = threads
+        solution_times = SolutionTimes()
+        cp_status = solver.solve(cp, solution_times)
+        duration = time.perf_counter() - start
+
+        status = {
+            cp_model.OPTIMAL: BackendStatus.OPTIMAL,
+            cp_model.FEASIBLE: BackendStatus.FEASIBLE,
+            cp_model.INFEASIBLE: BackendStatus.INFEASIBLE,
+        }.get(cp_status, BackendStatus.NOT_SOLVED)
+        if status not in [BackendStatus.OPTIMAL, BackendStatus.FEASIBLE]:
+            return BackendResult(status, None, None, duration, None)
+
+        return BackendResult(
+            status=status,
+            values=np.array(
+                [solver.value(v) if not isinstance(v, int) else 0 for v in variables]
+            ),
+            objective=solver.objective_value,
+            duration=duration,
+            time_to_first_feasible=(
+                solution_times.times[0] if solution_times.times else None
+            ),
+        )
+
+
+BACKENDS: Dict[str, Type[Backend]] = {
+    backend.name: backend for backend in [CbcBackend, HighsBackend, CpSatBackend]
+}
+
+
+def get_available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.is_available()]
+
+
+def get_backend(name: str) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', one of {list(BACKENDS)}.")
+    if not BACKENDS[name].is_available():
+        raise ImportError(
+            f"The solver of the backend '{name}' is not installed, "
+            "see 'requirements-backends.txt'."
+        )
+    return BACKENDS[name]()
+
+
+def get_assignations_values_flat(
+    context: RuleContext, values: np.ndarray
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray]:
+    """Same as 'get_assignations_values' from the flat values of a backend."""
+
+    matrices = values[
+        : len(VARIABLES_MATRIX) * context.number_persons * context.number_dates
+    ].reshape(len(VARIABLES_MATRIX), context.number_persons, context.number_dates)
+    matrices = matrices > 0.5
+    event_type_to_values = {
+        event_type: matrices[VARIABLES_MATRIX.index(variable)]
+        for event_type, variable in EVENT_TYPE_TO_VARIABLE.items()
+    }
+    references_values = matrices[VARIABLES_MATRIX.index(Variable.REFERENCE)]
+    return event_type_to_values, references_values
+
+
+def solve_planning_backend(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    backend: str = CbcBackend.name,
+    time_limit: Optional[float] = TIME_LIMIT_BACKEND,
+    low_memory: bool = True,
+) -> Planning:
+    context = build_rule_context(planning_availabilities, parameters)
+    model = build_sparse_model(context, low_memory)
+    result = get_backend(backend).solve(model, time_limit=time_limit)
+
+    if result.status == BackendStatus.INFEASIBLE:
+        raise RuntimeError("Infeasible planning")
+    elif result.status == BackendStatus.UNBOUNDED:
+        raise RuntimeError("Unbounded problem")
+    elif result.status == BackendStatus.NOT_SOLVED:
+        raise RuntimeError(f"No planning found in {time_limit} s")
+
+    return Planning(
+        events=planning_availabilities.events,
+        persons_infos=planning_availabilities.persons_infos,
+        availabilities=planning_availabilities.availabilities,
+        assignations=to_assignations(
+            context.days,
+            list(planning_availabilities.persons_infos["name"]),
+            *get_assignations_values_flat(context, result.values),
+        ),
+        solve_stats=SolveStats(
+            status=result.status.value,
+            duration=result.duration,
+            objective=result.objective,
+            number_variables=int(model.upper_bounds.sum()),
+            number_constraints=model.number_rows,
+            configuration=backend,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    planning = generate_planning(number_persons=300)
+    for backend in get_available_backends():
+        pl_assign = solve_planning_backend(planning, DEFAULT_PARAMETERS, backend)
+        print(pl_assign.solve_stats)
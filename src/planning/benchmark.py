@@ -0,0 +1,214 @@
+import multiprocessing
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from planning.backends import (
+    TIME_LIMIT_BACKEND,
+    get_available_backends,
+    get_backend,
+)
+from planning.generator import generate_planning
+from planning.parameters import PlanningParameters
+from planning.patterns import solve_planning_patterns
+from planning.planning_struct import Planning
+from planning.rules import build_rule_context
+from planning.solver import build_sparse_model, solve_planning
+
+NUMBERS_PERSONS = [100, 1000]
+
+# engine --> function solving a planning
+ENGINES: Dict[str, Callable[..., Planning]] = {
+    "compact": solve_planning,
+    "patterns": solve_planning_patterns,
+}
+
+# label --> arguments given to the engine, 'solve_planning' by default
+SOLVE_CONFIGURATIONS: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "low_memory": {"low_memory": True},
+    "lexicographic": {"low_memory": True, "lexicographic": True},
+    "patterns": {"engine": "patterns"},
+}
+
+
+@dataclass
+class BenchmarkResult:
+    label: str
+    number_persons: int
+    duration: float  # seconds
+    solve_duration: float  # seconds, only the solver
+    # bytes, peak resident memory of the process building the model and reading
+    # the solution above what it used before, and of the CBC process
+    peak_memory: int
+    peak_memory_solver: int
+    objective: Optional[float]
+    bound: Optional[float]  # given by the engines which prove one
+
+
+def get_peak_rss(who: int) -> int:
+    # kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss * 1024
+
+
+def benchmark_solve_worker(
+    planning: Planning,
+    parameters: PlanningParameters,
+    label: str,
+    solve_kwargs: Dict[str, Any],
+) -> BenchmarkResult:
+    solve_kwargs = dict(solve_kwargs)
+    solve = ENGINES[solve_kwargs.pop("engine", "compact")]
+    peak_memory_before = get_peak_rss(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    pl_assign = solve(
+        planning_availabilities=planning,
+        parameters=parameters,
+        verbose=False,
+        **solve_kwargs,
+    )
+    duration = time.perf_counter() - start
+
+    return BenchmarkResult(
+        label=label,
+        number_persons=len(planning.persons_infos),
+        duration=duration,
+        solve_duration=pl_assign.solve_stats.duration,
+        peak_memory=get_peak_rss(resource.RUSAGE_SELF) - peak_memory_before,
+        peak_memory_solver=get_peak_rss(resource.RUSAGE_CHILDREN),
+        objective=pl_assign.solve_stats.objective,
+        bound=pl_assign.solve_stats.bound,
+    )
+
+
+def benchmark_solve(
+    planning: Planning,
+    parameters: PlanningParameters,
+    label: str,
+    solve_kwargs: Dict[str, Any],
+) -> BenchmarkResult:
+    """Solve in a new process, its peak memory is only about this solve."""
+
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(
+            benchmark_solve_worker, planning, parameters, label, solve_kwargs
+        ).result()
+
+
+def run_benchmark(
+    parameters: PlanningParameters,
+    numbers_persons: List[int] = NUMBERS_PERSONS,
+    configurations: Dict[str, Dict[str, Any]] = SOLVE_CONFIGURATIONS,
+) -> List[BenchmarkResult]:
+    results = []
+    for number_persons in numbers_persons:
+        planning = generate_planning(number_persons=number_persons)
+        for label, solve_kwargs in configurations.items():
+            results.append(benchmark_solve(planning, parameters, label, solve_kwargs))
+    return results
+
+
+def print_results(results: List[BenchmarkResult]) -> None:
+    for result in results:
+        print(
+            f"{result.number_persons:>6} persons | {result.label:<14} | "
+            f"{result.duration:8.2f} s | solver {result.solve_duration:8.2f} s | "
+            f"{result.peak_memory / 2**20:8.1f} MiB | "
+            f"cbc {result.peak_memory_solver / 2**20:8.1f} MiB | "
+            f"objective {result.objective:.0f}"
+            + ("" if result.bound is None else f" <= {result.bound:.1f}")
+        )
+
+    # memory reduction of the low memory mode on each instance
+    for number_persons in sorted({result.number_persons for result in results}):
+        peaks = {
+            result.label: (result.peak_memory, result.peak_memory_solver)
+            for result in results
+            if result.number_persons == number_persons
+        }
+        if {"default", "low_memory"} <= set(peaks):
+            reductions = [
+                1 - low_memory / default
+                for low_memory, default in zip(peaks["low_memory"], peaks["default"])
+            ]
+            print(
+                f"{number_persons:>6} persons | peak memory reduction "
+                f"{reductions[0]:.0%}, cbc {reductions[1]:.0%}"
+            )
+
+
+# -- backends
+
+
+@dataclass
+class BackendBenchmarkResult:
+    backend: str
+    number_persons: int
+    status: str
+    objective: Optional[float]
+    build_duration: float  # seconds, the sparse model shared by the backends
+    time_to_first_feasible: Optional[float]  # seconds, None when unknown
+    time_to_optimal: Optional[float]  # seconds, None when not proven optimal
+
+
+def run_backends_benchmark(
+    parameters: PlanningParameters,
+    numbers_persons: List[int] = NUMBERS_PERSONS,
+    backends: Optional[List[str]] = None,
+    time_limit: float = TIME_LIMIT_BACKEND,
+) -> List[BackendBenchmarkResult]:
+    """Same instances on each backend, the model is built once per instance."""
+
+    backends = get_available_backends() if backends is None else backends
+    results = []
+    for number_persons in numbers_persons:
+        planning = generate_planning(number_persons=number_persons)
+        start = time.perf_counter()
+        model = build_sparse_model(
+            build_rule_context(planning, parameters), low_memory=True
+        )
+        build_duration = time.perf_counter() - start
+        for backend in backends:
+            result = get_backend(backend).solve(model, time_limit=time_limit)
+            results.append(
+                BackendBenchmarkResult(
+                    backend=backend,
+                    number_persons=number_persons,
+                    status=result.status.value,
+                    objective=result.objective,
+                    build_duration=build_duration,
+                    time_to_first_feasible=result.time_to_first_feasible,
+                    time_to_optimal=result.time_to_optimal,
+                )
+            )
+    return results
+
+
+def print_backends_results(results: List[BackendBenchmarkResult]) -> None:
+    def format_time(duration: Optional[float]) -> str:
+        return "       -" if duration is None else f"{duration:8.2f}"
+
+    for result in results:
+        objective = "-" if result.objective is None else f"{result.objective:.0f}"
+        print(
+            f"{result.number_persons:>6} persons | {result.backend:<6} | "
+            f"{result.status:<10} | {objective:>8} | "
+            f"build {result.build_duration:6.2f} s | "
+            f"first feasible {format_time(result.time_to_first_feasible)} s | "
+            f"optimal {format_time(result.time_to_optimal)} s"
+        )
+
+
+if __name__ == "__main__":
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    # python -m planning.benchmark [backends]
+    if "backends" in sys.argv[1:]:
+        print_backends_results(run_backends_benchmark(DEFAULT_PARAMETERS))
+    else:
+        print_results(run_benchmark(DEFAULT_PARAMETERS))
@@ -1,34 +1,29 @@
+import json
+import xml.etree.ElementTree as ET
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from enum import Enum
-from functools import reduce
-from typing import Any, Callable, List, Optional, Tuple, Union
+from functools import cached_property
+from pathlib import Path
+from typing import Iterator, List, Tuple
 
-import pandas as pd
+import numpy as np
 
-from planning.parameters import GapModality, PlanningParameters
+from planning.days import format_days, to_dates
+from planning.parameters import PlanningParameters
 from planning.planning_struct import EventType, Planning
+from planning.rules import (
+    RULES,
+    Rule,
+    Variable,
+    build_rule_context,
+    evaluate_rows,
+    flatten_variables,
+    from_assignations,
+)
 
 TYPE_PLANNING_ASSIGNATION_CHECKS = List[Tuple[List[str], str]]
 
-
-@dataclass
-class BinCond:
-    label: str
-    op: Callable[[Any, Any], bool]
-
-
-class BinConds(Enum):
-    INFERIOR = BinCond("<", lambda a, b: a < b)
-    INFERIOR_EQUAL = BinCond("<=", lambda a, b: a <= b)
-    SUPERIOR = BinCond(">", lambda a, b: a > b)
-    SUPERIOR_EQUAL = BinCond(">=", lambda a, b: a >= b)
-    EQUAL = BinCond("=", lambda a, b: a == b)
-    NOT_EQUAL = BinCond("not equal to", lambda a, b: a != b)
-
-
-def fd(date: datetime) -> str:
-    return date.strftime("%d/%m")
+# messages written in a JUnit failure, the others are only counted
+MAX_MESSAGES_JUNIT = 100
 
 
 class PlanningAssignationChecksBuilder:
@@ -47,269 +42,186 @@ class PlanningAssignationChecksBuilder:
         self.titles.append(sub_title)
 
     def add(self, detail: str) -> None:
-        self.obj.append((self.titles, detail))
-
-    def add_cond(self, label: str, a: Any, bin_cond: BinConds, b: Any):
-        str_a = fd(a) if isinstance(a, datetime) else a
-        str_b = fd(b) if isinstance(b, datetime) else b
-        if bin_cond.value.op(a, b):
-            self.add(
-                f"{label} : '{str_a}' {bin_cond.value.label} '{str_b}'",
-            )
-
-    def add_date_cond(
-        self, date: datetime, label: str, a: Any, bin_cond: BinConds, b: Any
-    ):
-        self.add_cond(f"On '{fd(date)}' {label}", a, bin_cond, b)
-
-    def add_person_cond(
-        self, person_name, label: str, a: Any, bin_cond: BinConds, b: Any
-    ) -> None:
-        self.add_cond(f"'{person_name}' {label}", a, bin_cond, b)
+        # a copy, the titles are changed by the next rule
+        self.obj.append((list(self.titles), detail))
 
     def get(self) -> TYPE_PLANNING_ASSIGNATION_CHECKS:
         return self.obj
 
 
-def filter_pl(
-    planning: pd.DataFrame,
-    assignation: bool,
-    person_name: Optional[str] = None,
-    date: Optional[datetime] = None,
-    event_type: Optional[EventType] = None,
-    is_referent: bool = False,
-) -> pd.DataFrame:
-    label = "assignation" if assignation else "available"
-
-    conds = []
-    if person_name is not None:
-        conds.append(planning["person_name"] == person_name)
-    if date is not None:
-        conds.append(planning["date"] == date)
-    if event_type is not None:
-        conds.append(planning["event_type"] == event_type)
-    if is_referent:
-        conds.append(planning[label] == "ref")
-
-    conds.append(planning[label].astype(bool) == True)
-
-    return planning[reduce(lambda a, b: a & b, conds)]
-
-
-def filter_as(
-    planning: pd.DataFrame,
-    person_name: Optional[str] = None,
-    date: Optional[datetime] = None,
-    event_type: Optional[EventType] = None,
-    is_referent: bool = False,
-):
-    return filter_pl(
-        planning=planning,
-        assignation=True,
-        person_name=person_name,
-        date=date,
-        event_type=event_type,
-        is_referent=is_referent,
-    )
+@dataclass
+class Violations:
+    """Rows of the rules violated by the assignations, one entry per row. The
+    messages are only rendered when asked, iterating gives the same
+    '(titles, detail)' as the checks."""
+
+    rules: List[Rule]
+    persons_name: List[str]
+    days: np.ndarray
+    rule_idxs: np.ndarray  # in 'rules'
+    person_idxs: np.ndarray  # -1 when not about a person
+    date_idxs: np.ndarray  # -1 when not about a date
+    observed: np.ndarray
+    limits: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rule_idxs)
+
+    def __getitem__(self, idx: int) -> Tuple[List[str], str]:
+        return self.get_titles(idx), self.render(idx)
+
+    def __iter__(self) -> Iterator[Tuple[List[str], str]]:
+        return (self[idx] for idx in range(len(self)))
+
+    @cached_property
+    def dates(self) -> np.ndarray:
+        return format_days(self.days)
+
+    def get_titles(self, idx: int) -> List[str]:
+        rule = self.rules[self.rule_idxs[idx]]
+        return [rule.title, rule.sub_title]
+
+    def render(self, idx: int) -> str:
+        person_idx, date_idx = self.person_idxs[idx], self.date_idxs[idx]
+        return self.rules[self.rule_idxs[idx]].message.format(
+            person=self.persons_name[person_idx] if person_idx >= 0 else None,
+            date=self.dates[date_idx] if date_idx >= 0 else None,
+            observed=self.observed[idx],
+            limit=self.limits[idx],
+        )
 
+    def count_by_rule(self) -> np.ndarray:
+        return np.bincount(self.rule_idxs, minlength=len(self.rules))
 
-def count_as(
-    planning: pd.DataFrame,
-    person_name: Optional[str] = None,
-    date: Optional[datetime] = None,
-    event_type: Optional[EventType] = None,
-    is_referent: bool = False,
-) -> pd.DataFrame:
-    return len(filter_pl(planning, True, person_name, date, event_type, is_referent))
+    def to_checks(self) -> TYPE_PLANNING_ASSIGNATION_CHECKS:
+        checks = PlanningAssignationChecksBuilder()
+        for idx in range(len(self)):
+            rule = self.rules[self.rule_idxs[idx]]
+            checks.set_title(rule.title)
+            checks.set_sub_title(rule.sub_title)
+            checks.add(self.render(idx))
+        return checks.get()
 
 
 def check_planning_assignation(
     planning_assignation: Planning, planning_parameters: PlanningParameters
-) -> TYPE_PLANNING_ASSIGNATION_CHECKS:
+) -> Violations:
+    """Rows of the rules of the solver which are violated by the assignations."""
 
     pa = planning_assignation
-    events = pa.events
-    dates = events["date"].sort_values()
-    person_infos = pa.persons_infos
-    person_infos_index_by_name = person_infos.set_index("name")
-    persons_name = person_infos["name"]
-    availabitilites = pa.availabilities
-    assignation = pa.assignations
-    assert assignation is not None
-    date_open_shifts = (
-        assignation[
-            (assignation["assignation"].astype(bool) == True)
-            & (assignation["event_type"] == EventType.SHIFT)
-        ]["date"]
-        .sort_values()
-        .unique()
-    )
-    params = planning_parameters
-
-    checks = PlanningAssignationChecksBuilder()
-
-    # -- Availabilities
-    if availabitilites is not None:
-        checks.set_title("availibilities")
-
-        for _, row in assignation[
-            assignation["assignation"].astype(bool) == True
-        ].iterrows():
-            person_name, date, event_type = (
-                row["person_name"],
-                row["date"],
-                row["event_type"],
-            )
-            n = len(
-                filter_pl(
-                    availabitilites,
-                    assignation=False,
-                    person_name=person_name,
-                    date=date,
-                    event_type=event_type,
-                )
-            )
-            if n == 0:
-                checks.add(
-                    f"'{person_name}' on '{date}' for the '{event_type.value}' is not available but has been assigned to it."
-                )
-
-    # -- shift rules
-    checks.set_title("shift_rules")
-
-    checks.set_sub_title("max_shift_per_person_per_month")
-    for person_name in persons_name:
-        n = count_as(assignation, person_name=person_name, event_type=EventType.SHIFT)
-        checks.add_person_cond(
-            person_name=person_name,
-            label="has too many shift on the month",
-            a=n,
-            bin_cond=BinConds.SUPERIOR,
-            b=params.max_number_shift_per_month,
-        )
+    assert pa.assignations is not None
+    context = build_rule_context(pa, planning_parameters)
+    persons_name = list(pa.persons_infos["name"])
 
-    checks.set_sub_title("min_per_shift_open")
-    for date in dates:
-        n = count_as(assignation, date=date, event_type=EventType.SHIFT)
-        if n == 0 or n >= params.min_number_person_per_shift:
-            continue
-        checks.add(
-            f"On '{date}' the number of person is anormal on the shift : 0 < '{n}' < '{params.min_number_person_per_shift}'",
-        )
-
-    checks.set_sub_title("max_person_per_shift")
-    for person_name in persons_name:
-        pl = filter_as(assignation, person_name=person_name, event_type=EventType.SHIFT)
-        pl = pl.sort_values("date")
-        for idx in range(len(pl) - 1):
-            d1: datetime = pl.iloc[idx]["date"]
-            d2: datetime = pl.iloc[idx + 1]["date"]
-            if (d2 - d1).days < params.min_number_days_between_two_shifts:
-                checks.add(
-                    f"'{person_name}' has two shifts too close : "
-                    f"difference between '{fd(d1)}' and '{fd(d2)}' < '{params.min_number_days_between_two_shifts}'",
-                )
-
-    # -- ref rules
-    checks.set_title("reference_rules")
-
-    checks.set_sub_title("max_number_reference_per_person_per_month")
-    for person_name in persons_name:
-        n = count_as(assignation, person_name=person_name, is_referent=True)
-        checks.add_person_cond(
-            person_name=person_name,
-            label="has too many references",
-            a=n,
-            bin_cond=BinConds.SUPERIOR,
-            b=params.max_number_reference_per_person_per_month,
-        )
+    event_type_to_values, references_values = from_assignations(
+        context.days, persons_name, pa.assignations
+    )
+    shifts = event_type_to_values[EventType.SHIFT]
+    gaps = event_type_to_values[EventType.GAP_FRANCO]
+    x = flatten_variables(
+        {
+            Variable.SHIFT: shifts,
+            Variable.GAP: gaps,
+            Variable.SCREENING: event_type_to_values[EventType.SCRENNINGS],
+            Variable.REFERENCE: references_values,
+            # events are open when someone is on them
+            Variable.OPEN_SHIFT: shifts.any(axis=0),
+            Variable.OPEN_GAP: gaps.any(axis=0),
+        }
+    ).astype(float)
+
+    rules = [rule for rule in RULES if rule.checked]
+    rule_idxs, person_idxs, date_idxs, observed, limits = [], [], [], [], []
+    for rule_idx, rule in enumerate(rules):
+        linear_rows = rule.build(context)
+        observed_rows, violated = evaluate_rows(linear_rows, x)
+        row_idxs = np.flatnonzero(violated)
+        rule_idxs.append(np.full(len(row_idxs), rule_idx))
+        person_idxs.append(linear_rows.person_idxs[row_idxs])
+        date_idxs.append(linear_rows.date_idxs[row_idxs])
+        observed.append(observed_rows[row_idxs])
+        limits.append(linear_rows.bounds[row_idxs])
+
+    return Violations(
+        rules=rules,
+        persons_name=persons_name,
+        days=context.days,
+        rule_idxs=np.concatenate(rule_idxs).astype(np.int16),
+        person_idxs=np.concatenate(person_idxs).astype(np.int32),
+        date_idxs=np.concatenate(date_idxs).astype(np.int32),
+        observed=np.rint(np.concatenate(observed)).astype(np.int32),
+        limits=np.rint(np.concatenate(limits)).astype(np.int32),
+    )
 
-    checks.set_sub_title("no_reference_for_babies")
-    for person_name in person_infos[person_infos["is_new"] == True]["name"]:
-        n = count_as(assignation, person_name=person_name, is_referent=True)
-        if n > 0:
-            checks.add(f"'{person_name}' is a baby but has a reference.")
-
-    checks.set_sub_title("exact_number_referent_per_open_shift")
-    for date in date_open_shifts:
-        n = count_as(assignation, date=date, is_referent=True)
-        checks.add_date_cond(
-            date,
-            label="there is not the good number of referent in an open shift",
-            a=n,
-            bin_cond=BinConds.NOT_EQUAL,
-            b=params.exact_number_referent_per_perm,
-        )
 
-    # -- gap rules
-    checks.set_title("gap_rules")
-
-    gaps_date = events[events[EventType.GAP_FRANCO.value] == True]["date"]
-    gaps_date = gaps_date.sort_values()
-
-    checks.set_sub_title("max_number_person_in_gap")
-    for date in gaps_date:
-        n = count_as(assignation, date=date, event_type=EventType.GAP_FRANCO)
-        checks.add_date_cond(
-            date=date,
-            label="there are too many persons on the gap",
-            a=n,
-            bin_cond=BinConds.SUPERIOR,
-            b=params.max_number_person_gap,
+def export_violations_json(violations: Violations, path: Path) -> None:
+    """Columns of the violations, the rules, persons and dates are given once and
+    referred to by index."""
+
+    data = {
+        "rules": [
+            {"title": rule.title, "sub_title": rule.sub_title, "message": rule.message}
+            for rule in violations.rules
+        ],
+        "persons": violations.persons_name,
+        "dates": np.datetime_as_string(to_dates(violations.days), unit="D").tolist(),
+        "violations": {
+            "rule": violations.rule_idxs.tolist(),
+            "person": violations.person_idxs.tolist(),
+            "date": violations.date_idxs.tolist(),
+            "observed": violations.observed.tolist(),
+            "limit": violations.limits.tolist(),
+        },
+    }
+    path.write_text(json.dumps(data))
+
+
+def export_violations_junit(
+    violations: Violations, path: Path, max_messages: int = MAX_MESSAGES_JUNIT
+) -> None:
+    """One test case per rule, failed when the rule is violated. Only the first
+    messages of each rule are rendered."""
+
+    counts = violations.count_by_rule()
+    testsuite = ET.Element(
+        "testsuite",
+        name="planning_checks",
+        tests=str(len(violations.rules)),
+        failures=str(int((counts > 0).sum())),
+    )
+    # indexes of the violations of each rule
+    order = np.argsort(violations.rule_idxs, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    for rule_idx, rule in enumerate(violations.rules):
+        testcase = ET.SubElement(
+            testsuite, "testcase", classname=rule.title, name=rule.sub_title
         )
-
-    checks.set_sub_title("min_number_person_in_gap")
-    for date in gaps_date:
-        n = count_as(assignation, date=date, event_type=EventType.GAP_FRANCO)
-        checks.add_date_cond(
-            date=date,
-            label="there are too few persons on the gap",
-            a=n,
-            bin_cond=BinConds.SUPERIOR,
-            b=params.min_number_person_gap,
+        if counts[rule_idx] == 0:
+            continue
+        idxs = order[starts[rule_idx] : starts[rule_idx] + max_messages]
+        failure = ET.SubElement(
+            testcase, "failure", message=f"{counts[rule_idx]} violations"
         )
-
-    checks.set_sub_title("no_shift_if_no_gap_before")
-    if params.gap_modality == GapModality.MONTH:
-        for person_name in persons_name:
-            if person_infos_index_by_name.loc[person_name, "did_gap_last_month"]:
-                continue
-
-            date_first_gap = filter_as(
-                assignation, person_name=person_name, event_type=EventType.GAP_FRANCO
-            )["date"].min()
-
-            shifts = filter_as(
-                assignation, person_name=person_name, event_type=EventType.SHIFT
-            )
-            for shift in shifts:
-                checks.add_person_cond(
-                    person_name=person_name,
-                    label="did not do a GAP last month and has a shift before its gap",
-                    a=shift["date"],
-                    bin_cond=BinConds.INFERIOR,
-                    b=date_first_gap,
-                )
-    elif params.gap_modality == GapModality.SHIFTS:
-        raise ValueError("Cheks on GapModality.SHIFTS has not been made.")
-
-    return checks.get()
+        lines = [violations.render(idx) for idx in idxs]
+        if counts[rule_idx] > len(idxs):
+            lines.append(f"... and {counts[rule_idx] - len(idxs)} more")
+        failure.text = "\n".join(lines)
+    ET.ElementTree(testsuite).write(path, encoding="utf-8", xml_declaration=True)
 
 
 if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from planning.generator import generate_planning
+    from planning.heuristic import plan_greedy
     from planning.parameters import DEFAULT_PARAMETERS
-    from planning.planning_reader import read_planning
-    from planning.solver import solve_planning
-    from vars import PATH_DOCS_PLANNING_MAY
-
-    print("Reading planning...")
-    planning = read_planning(PATH_DOCS_PLANNING_MAY)
-    print("Solving planning...")
-    params = DEFAULT_PARAMETERS
-    pl_assign = solve_planning(
-        planning_availabilities=planning, parameters=params, verbose=False
-    )
-    print("Check planning...")
-    params.min_number_days_between_two_shifts = 8
-    res = check_planning_assignation(pl_assign, params)
-    # print(res)
+
+    planning = generate_planning(number_persons=1000)
+    pl_assign = plan_greedy(planning, DEFAULT_PARAMETERS)
+    start = time.perf_counter()
+    violations = check_planning_assignation(pl_assign, DEFAULT_PARAMETERS)
+    print(f"{len(violations)} violations in {time.perf_counter() - start:.3f} s")
+    with tempfile.TemporaryDirectory() as folder:
+        export_violations_json(violations, Path(folder) / "checks.json")
+        export_violations_junit(violations, Path(folder) / "checks.xml")
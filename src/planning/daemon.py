@@ -0,0 +1,499 @@
+import argparse
+import asyncio
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+from dataclasses import dataclass
+from enum import Enum
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from planning.checker import check_planning_assignation
+from planning.generator import generate_planning
+from planning.parameters import (
+    DEFAULT_PARAMETERS,
+    GapModality,
+    GoalModality,
+    PlanningParameters,
+)
+from planning.planning_reader import read_planning
+from planning.planning_struct import EventType, Planning
+from planning.solution_cache import SolutionCache
+from planning.solver import solve_planning
+
+MAX_CONCURRENT_JOBS = 2
+
+# json-rpc 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class JobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    job_id: int
+    method: str
+    status: JobStatus = JobStatus.PENDING
+    result: Any = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    process: Optional[multiprocessing.Process] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "method": self.method,
+            "status": self.status.value,
+            "error": self.error,
+        }
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def parameters_from_dict(overrides: Dict[str, Any]) -> PlanningParameters:
+    """Default parameters with some fields changed, the enums are given by name."""
+
+    enums = {"gap_modality": GapModality, "goal_modality": GoalModality}
+    fields = {field.name for field in dataclasses.fields(PlanningParameters)}
+    unknown = set(overrides) - fields
+    if unknown:
+        raise RpcError(INVALID_PARAMS, f"Unknown parameters : {sorted(unknown)}")
+
+    return dataclasses.replace(
+        DEFAULT_PARAMETERS,
+        **{
+            name: enums[name][value] if name in enums else value
+            for name, value in overrides.items()
+        },
+    )
+
+
+def summarize_solution(pl_assign: Planning) -> Dict[str, Any]:
+    assignations = pl_assign.assignations
+    shifts = assignations[
+        (assignations["event_type"] == EventType.SHIFT)
+        & (assignations["assignation"].astype(bool) == True)
+    ]
+    return {
+        "solve_stats": dataclasses.asdict(pl_assign.solve_stats),
+        "number_persons_on_shifts": len(shifts),
+        "number_open_shifts": int(shifts["date"].nunique()),
+    }
+
+
+def solve_in_process(
+    conn: Connection,
+    planning: Planning,
+    parameters: PlanningParameters,
+    solve_kwargs: Dict[str, Any],
+) -> None:
+    # own process group, killing it also kills the CBC process
+    os.setpgrp()
+    try:
+        pl_assign = solve_planning(
+            planning_availabilities=planning,
+            parameters=parameters,
+            verbose=False,
+            **solve_kwargs,
+        )
+        conn.send((pl_assign.assignations, pl_assign.solve_stats, None))
+    except Exception as e:
+        conn.send((None, None, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+class PlanningDaemon:
+    """Keeps the plannings in memory and runs the jobs on them with a limited
+    concurrency. The solves run in a child process so they can be cancelled.
+    The files read and exported are under 'root', the working directory by
+    default."""
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = MAX_CONCURRENT_JOBS,
+        root: Optional[Path] = None,
+    ):
+        self.root = (root or Path.cwd()).resolve()
+        self.plannings: Dict[str, Planning] = {}
+        self.solutions: Dict[str, Planning] = {}
+        self.solutions_parameters: Dict[str, PlanningParameters] = {}
+        self.jobs: Dict[int, Job] = {}
+        self.job_ids = itertools.count(1)
+        self.semaphore = asyncio.Semaphore(max_concurrent_jobs)
+        self.mp_context = multiprocessing.get_context(
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        self.methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            # jobs
+            "read": self.read,
+            "generate": self.generate,
+            "solve": self.solve,
+            "check": self.check,
+            "export": self.export,
+            # jobs management
+            "job": self.job,
+            "jobs": self.list_jobs,
+            "wait": self.wait,
+            "cancel": self.cancel,
+            # state
+            "plannings": self.list_plannings,
+            "drop": self.drop,
+        }
+
+    # -- jobs
+
+    def submit(self, method: str, run: Callable[[Job], Awaitable[Any]]) -> int:
+        job = Job(job_id=next(self.job_ids), method=method)
+
+        async def run_job() -> None:
+            async with self.semaphore:
+                job.status = JobStatus.RUNNING
+                try:
+                    job.result = await run(job)
+                    job.status = JobStatus.DONE
+                except asyncio.CancelledError:
+                    job.status = JobStatus.CANCELLED
+                except Exception as e:
+                    job.status = JobStatus.FAILED
+                    job.error = f"{type(e).__name__}: {e}"
+
+        job.task = asyncio.create_task(run_job())
+        self.jobs[job.job_id] = job
+        return job.job_id
+
+    def submit_in_thread(
+        self,
+        method: str,
+        func: Callable[[], Any],
+        store: Optional[Callable[[Any], Any]] = None,
+    ) -> int:
+        """'func' runs in a thread, which keeps running if the job is cancelled,
+        so it must not change the state. 'store' is given its result to change the
+        state, back in the event loop and only if the job is not cancelled."""
+
+        async def run(job: Job) -> Any:
+            result = await asyncio.get_running_loop().run_in_executor(None, func)
+            return result if store is None else store(result)
+
+        return self.submit(method, run)
+
+    def resolve_path(self, path: str) -> Path:
+        resolved = (self.root / path).resolve()
+        if not resolved.is_relative_to(self.root):
+            raise RpcError(INVALID_PARAMS, f"The path '{path}' is not under the root.")
+        return resolved
+
+    def get_planning(self, planning_id: str, solved: bool = False) -> Planning:
+        plannings = self.solutions if solved else self.plannings
+        if planning_id not in plannings:
+            state = "solved planning" if solved else "planning"
+            raise RpcError(INVALID_PARAMS, f"No {state} '{planning_id}'.")
+        return plannings[planning_id]
+
+    async def read(self, path: str, planning_id: Optional[str] = None) -> int:
+        path_planning = self.resolve_path(path)
+        planning_id = planning_id or path_planning.stem
+
+        def store(planning: Planning) -> Dict[str, Any]:
+            self.plannings[planning_id] = planning
+            return self.describe(planning_id)
+
+        return self.submit_in_thread(
+            "read", lambda: read_planning(path_planning), store
+        )
+
+    async def generate(
+        self,
+        planning_id: str,
+        number_persons: int,
+        number_dates: int = 31,
+        seed: int = 0,
+    ) -> int:
+        def func() -> Planning:
+            return generate_planning(
+                number_persons=number_persons, number_dates=number_dates, seed=seed
+            )
+
+        def store(planning: Planning) -> Dict[str, Any]:
+            self.plannings[planning_id] = planning
+            return self.describe(planning_id)
+
+        return self.submit_in_thread("generate", func, store)
+
+    async def solve(
+        self,
+        planning_id: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        low_memory: bool = True,
+        lexicographic: bool = False,
+        use_cache: bool = False,
+    ) -> int:
+        planning = self.get_planning(planning_id)
+        planning_parameters = parameters_from_dict(parameters or {})
+        solve_kwargs = {
+            "low_memory": low_memory,
+            "lexicographic": lexicographic,
+            "cache": SolutionCache() if use_cache else None,
+        }
+
+        async def run(job: Job) -> Dict[str, Any]:
+            conn_parent, conn_child = self.mp_context.Pipe(duplex=False)
+            job.process = self.mp_context.Process(
+                target=solve_in_process,
+                args=(conn_child, planning, planning_parameters, solve_kwargs),
+                daemon=True,
+            )
+            job.process.start()
+            conn_child.close()
+
+            # the process is killed if the job is cancelled
+            loop = asyncio.get_running_loop()
+            try:
+                assignations, solve_stats, error = await loop.run_in_executor(
+                    None, conn_parent.recv
+                )
+            except EOFError:
+                error = "The solving process stopped without a result."
+            finally:
+                conn_parent.close()
+                await loop.run_in_executor(None, job.process.join)
+
+            if error is not None:
+                raise RuntimeError(error)
+            self.solutions[planning_id] = dataclasses.replace(
+                planning, assignations=assignations, solve_stats=solve_stats
+            )
+            self.solutions_parameters[planning_id] = planning_parameters
+            return summarize_solution(self.solutions[planning_id])
+
+        return self.submit("solve", run)
+
+    async def check(
+        self, planning_id: str, parameters: Optional[Dict[str, Any]] = None
+    ) -> int:
+        pl_assign = self.get_planning(planning_id, solved=True)
+        # by default the parameters of the solve
+        planning_parameters = (
+            self.solutions_parameters[planning_id]
+            if parameters is None
+            else parameters_from_dict(parameters)
+        )
+
+        def func() -> List[Dict[str, Any]]:
+            checks = check_planning_assignation(pl_assign, planning_parameters)
+            return [{"titles": titles, "detail": detail} for titles, detail in checks]
+
+        return self.submit_in_thread("check", func)
+
+    async def export(self, planning_id: str, path: str) -> int:
+        pl_assign = self.get_planning(planning_id, solved=True)
+        path_export = self.resolve_path(path)
+
+        # the file may still be written after a cancel
+        def func() -> str:
+            assignations = pl_assign.assignations.copy()
+            assignations["event_type"] = assignations["event_type"].map(
+                lambda event_type: event_type.value
+            )
+            if path_export.suffix == ".xlsx":
+                assignations.to_excel(path_export, index=False)
+            else:
+                assignations.to_csv(path_export, index=False)
+            return str(path_export)
+
+        return self.submit_in_thread("export", func)
+
+    # -- jobs management
+
+    def get_job(self, job_id: int) -> Job:
+        if job_id not in self.jobs:
+            raise RpcError(INVALID_PARAMS, f"No job '{job_id}'.")
+        return self.jobs[job_id]
+
+    async def job(self, job_id: int) -> Dict[str, Any]:
+        return self.get_job(job_id).to_dict()
+
+    async def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in self.jobs.values()]
+
+    async def wait(self, job_id: int, timeout: Optional[float] = None) -> Any:
+        job = self.get_job(job_id)
+        try:
+            await asyncio.wait_for(asyncio.shield(job.task), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return {**job.to_dict(), "result": job.result}
+
+    async def cancel(self, job_id: int) -> Dict[str, Any]:
+        job = self.get_job(job_id)
+        if job.status in [JobStatus.PENDING, JobStatus.RUNNING]:
+            if job.process is not None and job.process.is_alive():
+                try:
+                    os.killpg(job.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    # not yet in its own process group
+                    job.process.kill()
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+            # a job cancelled before running
+            job.status = JobStatus.CANCELLED
+        return job.to_dict()
+
+    # -- state
+
+    def describe(self, planning_id: str) -> Dict[str, Any]:
+        planning = self.plannings[planning_id]
+        return {
+            "planning_id": planning_id,
+            "number_persons": len(planning.persons_infos),
+            "number_dates": len(planning.events),
+            "solved": planning_id in self.solutions,
+        }
+
+    async def list_plannings(self) -> List[Dict[str, Any]]:
+        return [self.describe(planning_id) for planning_id in self.plannings]
+
+    async def drop(self, planning_id: str) -> bool:
+        self.solutions.pop(planning_id, None)
+        self.solutions_parameters.pop(planning_id, None)
+        return self.plannings.pop(planning_id, None) is not None
+
+    # -- json-rpc
+
+    async def handle_request(self, request: Any) -> Optional[Dict[str, Any]]:
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict) or not isinstance(
+                request.get("method"), str
+            ):
+                raise RpcError(INVALID_REQUEST, "Invalid request.")
+            method = self.methods.get(request["method"])
+            if method is None:
+                raise RpcError(
+                    METHOD_NOT_FOUND, f"Method '{request['method']}' not found."
+                )
+            params = request.get("params", {})
+            try:
+                result = await (
+                    method(*params) if isinstance(params, list) else method(**params)
+                )
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RpcError as e:
+            error = {"code": e.code, "message": str(e)}
+            response = {"jsonrpc": "2.0", "id": request_id, "error": error}
+        except Exception as e:
+            error = {"code": SERVER_ERROR, "message": f"{type(e).__name__}: {e}"}
+            response = {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+        # no response to notifications
+        if isinstance(request, dict) and "id" not in request:
+            return None
+        return response
+
+    async def handle_line(self, line: bytes) -> Optional[str]:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            error = {"code": PARSE_ERROR, "message": str(e)}
+            return json.dumps({"jsonrpc": "2.0", "id": None, "error": error})
+
+        response = await self.handle_request(request)
+        if response is None:
+            return None
+        return json.dumps(response, default=str)
+
+    async def serve_stream(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """One request per line, the requests are handled concurrently."""
+
+        async def respond(line: bytes) -> None:
+            response = await self.handle_line(line)
+            if response is not None:
+                writer.write(response.encode() + b"\n")
+                await writer.drain()
+
+        tasks = set()
+        while line := await reader.readline():
+            if not line.strip():
+                continue
+            task = asyncio.create_task(respond(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+
+async def serve_unix(daemon: PlanningDaemon, path: Path) -> None:
+    server = await asyncio.start_unix_server(daemon.serve_stream, path=str(path))
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_stdio(daemon: PlanningDaemon) -> None:
+    loop = asyncio.get_running_loop()
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    # the prints must not mix with the responses
+    sys.stdout = sys.stderr
+
+    await daemon.serve_stream(reader, writer)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local planning service (JSON-RPC).")
+    parser.add_argument("--socket", type=Path, help="unix socket, stdio if not given")
+    parser.add_argument("--max-concurrent-jobs", type=int, default=MAX_CONCURRENT_JOBS)
+    parser.add_argument(
+        "--root",
+        type=Path,
+        help="folder of the files read and exported, the working directory by default",
+    )
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        daemon = PlanningDaemon(
+            max_concurrent_jobs=args.max_concurrent_jobs, root=args.root
+        )
+        if args.socket is None:
+            await serve_stdio(daemon)
+        else:
+            await serve_unix(daemon, args.socket)
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+# dates are handled as days since 1970-01-01 (int64), converted back to dates only
+# to be shown or written
+
+# unknown day, same value as NaT
+NO_DAY = np.iinfo(np.int64).min
+
+TYPE_DATES = Union[pd.Series, np.ndarray, Iterable]
+
+
+def to_days(dates: TYPE_DATES) -> np.ndarray:
+    """Day of each date, NO_DAY for the missing ones. Anything else than a date
+    (e.g. a comment in a sheet) is missing."""
+
+    if isinstance(dates, pd.Series):
+        dates = dates.to_numpy()
+    dates = np.asarray(dates)
+    if dates.dtype == object:
+        dates = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy()
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+
+def to_dates(days: np.ndarray) -> np.ndarray:
+    return (
+        np.asarray(days, dtype=np.int64)
+        .astype("datetime64[D]")
+        .astype("datetime64[us]")
+    )
+
+
+def to_months(days: np.ndarray) -> np.ndarray:
+    """Calendar month of each day, as months since 1970-01."""
+
+    return (
+        np.asarray(days, dtype=np.int64)
+        .astype("datetime64[D]")
+        .astype("datetime64[M]")
+        .astype(np.int64)
+    )
+
+
+def get_days_since(days: np.ndarray, days_before: np.ndarray) -> np.ndarray:
+    """Days between each of 'days_before' (rows) and each of 'days' (columns), the
+    max integer when the day before is unknown."""
+
+    known = days_before != NO_DAY
+    return np.where(
+        known[:, np.newaxis],
+        days[np.newaxis, :] - np.where(known, days_before, 0)[:, np.newaxis],
+        np.iinfo(np.int64).max,
+    )
+
+
+def get_day_idxs(days: np.ndarray, days_looked: np.ndarray) -> np.ndarray:
+    """Index of each of 'days_looked' in the sorted 'days', KeyError if one of them
+    is not in it."""
+
+    idxs = np.searchsorted(days, days_looked)
+    found = idxs < len(days)
+    found[found] = days[idxs[found]] == days_looked[found]
+    if not found.all():
+        unknown = np.datetime_as_string(
+            to_dates(np.unique(days_looked[~found])), unit="D"
+        )
+        raise KeyError(f"Dates not in the planning : {unknown.tolist()}.")
+    return idxs
+
+
+def format_days(days: np.ndarray) -> np.ndarray:
+    """'dd/mm' of each day."""
+
+    months = to_months(days)
+    days_month = days - months.astype("datetime64[M]").astype("datetime64[D]").astype(
+        np.int64
+    )
+    return np.char.add(
+        np.char.add(np.char.zfill((days_month + 1).astype(str), 2), "/"),
+        np.char.zfill((months % 12 + 1).astype(str), 2),
+    )
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    days = to_days([datetime(2025, 5, 1), datetime(2025, 6, 30), None, "comment"])
+    print(days, to_dates(days[:2]), to_months(days[:2]), format_days(days[:2]))
+    print(get_days_since(days[:2], days[1:]))
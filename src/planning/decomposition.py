@@ -0,0 +1,193 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from planning.parameters import PlanningParameters
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.rules import (
+    EVENT_TYPES_ASSIGNABLE,
+    RuleContext,
+    build_rule_context,
+    to_assignations,
+)
+from planning.solver import (
+    build_planning_model_from_context,
+    combine_statuses,
+    compute_objective,
+    get_assignations_values,
+    solve_model,
+)
+
+# persons x dates, the smaller components are solved together
+MIN_SIZE_COMPONENT = 2000
+
+
+@dataclass
+class Component:
+    person_idxs: np.ndarray
+    date_idxs: np.ndarray  # sorted
+
+    @property
+    def size(self) -> int:
+        return len(self.person_idxs) * len(self.date_idxs)
+
+
+def find_components(context: RuleContext) -> List[Component]:
+    """Connected components of the graph linking a person to the dates it can be
+    assigned on. The rules are about a person or about a date, so the components
+    share no constraint. The persons and dates without any link are left out."""
+
+    adjacency = np.logical_or.reduce(
+        [
+            context.possible_assignations[event_type]
+            for event_type in EVENT_TYPES_ASSIGNABLE
+        ]
+    )
+    persons_left = adjacency.any(axis=1)
+    components = []
+    while persons_left.any():
+        persons = np.zeros(context.number_persons, dtype=bool)
+        persons[np.argmax(persons_left)] = True
+        # grow until the persons reached stay the same
+        while True:
+            dates = adjacency[persons].any(axis=0)
+            persons_reached = adjacency[:, dates].any(axis=1)
+            if persons_reached.sum() == persons.sum():
+                break
+            persons = persons_reached
+        persons_left &= ~persons
+        components.append(Component(np.flatnonzero(persons), np.flatnonzero(dates)))
+
+    return components
+
+
+def group_components(
+    components: List[Component], min_size: int = MIN_SIZE_COMPONENT
+) -> List[Component]:
+    """Merge the small components, a solve has a fixed cost. The merged ones are
+    still independent inside a model."""
+
+    groups = []
+    person_idxs, date_idxs = [], []
+    size = 0
+    for component in sorted(components, key=lambda component: component.size):
+        if component.size >= min_size:
+            groups.append(component)
+            continue
+        person_idxs.append(component.person_idxs)
+        date_idxs.append(component.date_idxs)
+        size += component.size
+        if size >= min_size:
+            groups.append(
+                Component(
+                    np.concatenate(person_idxs), np.sort(np.concatenate(date_idxs))
+                )
+            )
+            person_idxs, date_idxs, size = [], [], 0
+    if person_idxs:
+        groups.append(
+            Component(np.concatenate(person_idxs), np.sort(np.concatenate(date_idxs)))
+        )
+    return groups
+
+
+def solve_component(
+    context: RuleContext, persons_name: List[str], low_memory: bool
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray, SolveStats]:
+    model = build_planning_model_from_context(context, persons_name, low_memory)
+    solve_stats = solve_model(model, verbose=False)
+    event_type_to_values, references_values = get_assignations_values(model)
+    return event_type_to_values, references_values, solve_stats
+
+
+def solve_planning_decomposed(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    max_workers: Optional[int] = None,
+    low_memory: bool = True,
+    min_size_component: int = MIN_SIZE_COMPONENT,
+    verbose: bool = True,
+) -> Planning:
+    """Solve the independent components of the planning as separate models, in a
+    pool of processes, then merge them."""
+
+    start = time.perf_counter()
+    context = build_rule_context(planning_availabilities, parameters)
+    persons_name = np.asarray(planning_availabilities.persons_infos["name"])
+    components = group_components(find_components(context), min_size_component)
+    if verbose:
+        print(
+            f"{len(components)} components, sizes "
+            f"{[len(c.person_idxs) for c in components]} persons"
+        )
+
+    args = (
+        [context.subset(c.person_idxs, c.date_idxs) for c in components],
+        [list(persons_name[c.person_idxs]) for c in components],
+        [low_memory] * len(components),
+    )
+    if len(components) <= 1 or max_workers == 1:
+        results = list(map(solve_component, *args))
+    else:
+        mp_context = multiprocessing.get_context(
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        )
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=mp_context
+        ) as executor:
+            results = list(executor.map(solve_component, *args))
+
+    # merge, nothing is assigned outside of the components
+    shape = (context.number_persons, context.number_dates)
+    event_type_to_values = {
+        event_type: np.zeros(shape, dtype=bool) for event_type in EVENT_TYPES_ASSIGNABLE
+    }
+    references_values = np.zeros(shape, dtype=bool)
+    for component, result in zip(components, results):
+        cells = np.ix_(component.person_idxs, component.date_idxs)
+        component_event_type_to_values, component_references_values, _ = result
+        for event_type, values in component_event_type_to_values.items():
+            event_type_to_values[event_type][cells] = values
+        references_values[cells] = component_references_values
+
+    solve_stats = SolveStats(
+        status=combine_statuses([result[2].status for result in results]),
+        duration=time.perf_counter() - start,
+        objective=compute_objective(
+            parameters.goal_modality, event_type_to_values[EventType.SHIFT]
+        ),
+        number_variables=sum(result[2].number_variables for result in results),
+        number_constraints=sum(result[2].number_constraints for result in results),
+    )
+
+    return Planning(
+        events=planning_availabilities.events,
+        persons_infos=planning_availabilities.persons_infos,
+        availabilities=planning_availabilities.availabilities,
+        assignations=to_assignations(
+            context.days, list(persons_name), event_type_to_values, references_values
+        ),
+        solve_stats=solve_stats,
+    )
+
+
+if __name__ == "__main__":
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+    from planning.solver import solve_planning
+
+    planning = generate_planning(number_persons=1000, number_groups=4)
+    start = time.perf_counter()
+    pl_assign = solve_planning(
+        planning, DEFAULT_PARAMETERS, verbose=False, low_memory=True
+    )
+    print(f"monolithic : {time.perf_counter() - start:.2f} s, {pl_assign.solve_stats}")
+    start = time.perf_counter()
+    pl_decomposed = solve_planning_decomposed(planning, DEFAULT_PARAMETERS)
+    print(
+        f"decomposed : {time.perf_counter() - start:.2f} s, {pl_decomposed.solve_stats}"
+    )
@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from planning.planning_struct import EventType, Language, Planning
+
+# events drawn on the generated dates
+PROBA_SHIFT_OPEN = 0.8
+NUMBER_GAP_FRANCO = 3
+NUMBER_GAP_BILINGUAL = 1
+NUMBER_SCRENNINGS = 2
+
+# persons
+PROBA_NEW = 0.2
+PROBA_AGREE_TO_BE_REFERENT = 0.6
+PROBA_DID_GAP_LAST_MONTH = 0.8
+PROBA_AVAILABLE = 0.3
+
+
+def generate_planning(
+    number_persons: int,
+    number_dates: int = 31,
+    seed: int = 0,
+    start: datetime = datetime(2025, 5, 1),
+    number_groups: int = 1,
+) -> Planning:
+    """Random planning with the same layout as the one given by 'read_planning'.
+
+    With several groups, the persons and the dates are split in groups and the
+    persons are only available on the dates of their group."""
+
+    rng = np.random.default_rng(seed)
+    dates: List[datetime] = list(
+        pd.date_range(start, periods=number_dates, freq="D").to_pydatetime()
+    )
+
+    # events
+    data = {"date": dates}
+    for event in list(EventType):
+        data[event.value] = [False] * number_dates
+    df_events = pd.DataFrame(data=data)
+
+    is_shift = rng.random(number_dates) < PROBA_SHIFT_OPEN
+    df_events[EventType.SHIFT.value] = is_shift
+    df_events[EventType.NO_SHIFT.value] = ~is_shift
+    for event, number in [
+        (EventType.GAP_FRANCO, NUMBER_GAP_FRANCO),
+        (EventType.GAP_BILINGUAL, NUMBER_GAP_BILINGUAL),
+        (EventType.SCRENNINGS, NUMBER_SCRENNINGS),
+    ]:
+        date_idxs = rng.choice(
+            number_dates, size=min(number, number_dates), replace=False
+        )
+        df_events.loc[date_idxs, event.value] = True
+
+    # person infos
+    languages = list(Language)
+    df_persons_infos = pd.DataFrame(
+        data=[
+            {
+                "name": f"person_{person_idx}",
+                "is_new": bool(rng.random() < PROBA_NEW),
+                "number_shift_wanted": None,
+                "agree_to_be_referent": bool(rng.random() < PROBA_AGREE_TO_BE_REFERENT),
+                "date_last_shift": None,
+                "language": languages[rng.integers(len(languages))],
+                "did_gap_last_month": bool(rng.random() < PROBA_DID_GAP_LAST_MONTH),
+                "comments": None,
+            }
+            for person_idx in range(number_persons)
+        ]
+    )
+
+    # availabilities, one line per person per opened event as in the sheets
+    events_opened = [
+        (date, event)
+        for date_idx, date in enumerate(dates)
+        for event in [EventType.SHIFT, EventType.SCRENNINGS, EventType.GAP_FRANCO]
+        if df_events.loc[date_idx, event.value]
+    ]
+    available = rng.random((number_persons, len(events_opened))) < PROBA_AVAILABLE
+    date_to_group = {
+        date: date_idx % number_groups for date_idx, date in enumerate(dates)
+    }
+    available &= (np.arange(number_persons) % number_groups)[:, np.newaxis] == [
+        date_to_group[date] for date, _ in events_opened
+    ]
+    df_availabilities = pd.DataFrame(
+        data={
+            "person_name": np.repeat(
+                df_persons_infos["name"].to_numpy(), len(events_opened)
+            ),
+            "date": [date for date, _ in events_opened] * number_persons,
+            "event_type": [event for _, event in events_opened] * number_persons,
+            "available": available.ravel(),
+        }
+    )
+
+    return Planning(
+        events=df_events,
+        persons_infos=df_persons_infos,
+        availabilities=df_availabilities,
+    )
+
+
+if __name__ == "__main__":
+    planning = generate_planning(number_persons=10)
+    print(planning.events)
+    print(planning.availabilities)
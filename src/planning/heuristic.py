@@ -0,0 +1,238 @@
+import time
+
+import numpy as np
+
+from planning.days import get_days_since, to_days, to_months
+from planning.parameters import GapModality, PlanningParameters
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.rules import (
+    compute_possible_assignations,
+    get_persons_state,
+    to_assignations,
+)
+from planning.solver import BIG_NUMBER, compute_objective
+
+
+def pick(candidates: np.ndarray, number: int, *priorities: np.ndarray) -> np.ndarray:
+    """Indexes of 'number' candidates, the last priority is the primary sort key."""
+
+    candidate_idxs = np.flatnonzero(candidates)
+    order = np.lexsort(tuple(priority[candidate_idxs] for priority in priorities))
+    return candidate_idxs[order[:number]]
+
+
+def plan_greedy(
+    planning_availabilities: Planning, parameters: PlanningParameters
+) -> Planning:
+    """Fast planning respecting the rules of the solver, without optimality: the
+    GAPs are planned first, then the best covered shifts are opened first with
+    their referents and the minimal number of persons, then filled up."""
+
+    if parameters.gap_modality != GapModality.MONTH:
+        raise ValueError(f"Gap modality '{parameters.gap_modality}' not handled.")
+
+    start = time.perf_counter()
+
+    # Constants
+    events = planning_availabilities.events
+    persons_infos = planning_availabilities.persons_infos
+
+    number_persons = len(persons_infos)
+    days = np.sort(to_days(events["date"]))
+    number_dates = len(days)
+    is_new = persons_infos["is_new"].to_numpy(dtype=bool)
+    agree_to_be_referent = persons_infos["agree_to_be_referent"].to_numpy(dtype=bool)
+    did_gap_last_month = persons_infos["did_gap_last_month"].to_numpy(dtype=bool)
+    did_gap_this_month = get_persons_state(persons_infos, "did_gap_this_month").astype(
+        bool
+    )
+
+    # months counted from the first one
+    months = to_months(days)
+    months = months - months[0] if number_dates > 0 else months
+    number_months = months.max() + 1 if number_dates > 0 else 0
+
+    possible_assignations = compute_possible_assignations(planning_availabilities, days)
+    possible_shifts = possible_assignations[EventType.SHIFT]
+    possible_gaps = possible_assignations[EventType.GAP_FRANCO]
+
+    # what is still allowed, per person per month
+    shifts_left = np.full(
+        (number_persons, number_months), parameters.max_number_shift_per_month
+    )
+    references_left = np.full(
+        (number_persons, number_months),
+        parameters.max_number_reference_per_person_per_month,
+    )
+    gaps_left = np.ones((number_persons, number_months), dtype=bool)
+    if number_months > 0:
+        shifts_left[:, 0] -= get_persons_state(
+            persons_infos, "number_shift_this_month"
+        ).astype(int)
+        references_left[:, 0] -= get_persons_state(
+            persons_infos, "number_reference_this_month"
+        ).astype(int)
+        gaps_left[:, 0] &= ~did_gap_this_month
+
+    # GAP done before the dates, enough to do shifts on the month
+    gap_done_before = np.zeros((number_persons, number_months + 2), dtype=bool)
+    gap_done_before[:, 0] = did_gap_last_month | did_gap_this_month
+    gap_done_before[:, 1] = did_gap_this_month
+
+    # not too close to the last shift done before the dates
+    days_since_last_shift = get_days_since(
+        days, to_days(persons_infos["date_last_shift"])
+    )
+    possible_shifts &= ~(
+        days_since_last_shift < parameters.min_number_days_between_two_shifts
+    )
+
+    shifts = np.zeros((number_persons, number_dates), dtype=bool)
+    gaps = np.zeros((number_persons, number_dates), dtype=bool)
+    references = np.zeros((number_persons, number_dates), dtype=bool)
+
+    # -- GAPs, the earliest first for the persons who need one to do shifts
+    for date_idx in np.flatnonzero(possible_gaps.any(axis=0)):
+        month = months[date_idx]
+        # the GAP allows the shifts after it on its month and the next one
+        needed = np.zeros(number_persons, dtype=bool)
+        for month_allowed in [month, month + 1]:
+            if month_allowed < number_months:
+                needed |= ~gap_done_before[:, month_allowed] & possible_shifts[
+                    :, date_idx + 1 :
+                ][:, months[date_idx + 1 :] == month_allowed].any(axis=1)
+        candidates = possible_gaps[:, date_idx] & gaps_left[:, month] & needed
+        if candidates.sum() < parameters.min_number_person_gap:
+            continue
+
+        # the most available persons first
+        person_idxs = pick(
+            candidates,
+            min(parameters.max_number_person_gap, BIG_NUMBER),
+            -possible_shifts[:, date_idx + 1 :].sum(axis=1),
+        )
+        gaps[person_idxs, date_idx] = True
+        gaps_left[person_idxs, month] = False
+        # gap_done_before is only about the dates before the horizon
+
+    # -- Shifts, the best covered first
+    delta_days = parameters.min_number_days_between_two_shifts
+    number_referents = parameters.exact_number_referent_per_perm
+    number_persons_min = max(parameters.min_number_person_per_shift, number_referents)
+    coverage = possible_shifts.sum(axis=0)
+    dates_order = np.argsort(-coverage, kind="stable")
+    dates_order = dates_order[coverage[dates_order] > 0]
+
+    def get_assignable(date_idx: int) -> np.ndarray:
+        month = months[date_idx]
+        # the dates less than the amount of days apart
+        window = slice(
+            np.searchsorted(days, days[date_idx] - delta_days, side="right"),
+            np.searchsorted(days, days[date_idx] + delta_days, side="left"),
+        )
+        gap_before = gap_done_before[:, month] | gaps[:, :date_idx][
+            :, months[:date_idx] >= month - 1
+        ].any(axis=1)
+        return (
+            possible_shifts[:, date_idx]
+            & ~shifts[:, date_idx]
+            & (shifts_left[:, month] > 0)
+            & ~shifts[:, window].any(axis=1)
+            & gap_before
+        )
+
+    def assign(person_idxs: np.ndarray, date_idx: int) -> None:
+        shifts[person_idxs, date_idx] = True
+        shifts_left[person_idxs, months[date_idx]] -= 1
+
+    number_shifts_possible = possible_shifts.sum(axis=1)
+    for date_idx in dates_order:
+        assignable = get_assignable(date_idx)
+        referent_assignable = (
+            assignable & ~is_new & (references_left[:, months[date_idx]] > 0)
+        )
+        if (
+            referent_assignable.sum() < number_referents
+            or assignable.sum() < number_persons_min
+        ):
+            continue
+
+        # referents who agree first, then the least used and the least available
+        referent_idxs = pick(
+            referent_assignable,
+            number_referents,
+            number_shifts_possible,
+            shifts.sum(axis=1),
+            ~agree_to_be_referent,
+        )
+        references[referent_idxs, date_idx] = True
+        references_left[referent_idxs, months[date_idx]] -= 1
+        assign(referent_idxs, date_idx)
+
+        assignable[referent_idxs] = False
+        assign(
+            pick(
+                assignable,
+                number_persons_min - number_referents,
+                number_shifts_possible,
+                shifts.sum(axis=1),
+            ),
+            date_idx,
+        )
+
+    # fill up the open shifts
+    for date_idx in dates_order:
+        number_persons_shift = shifts[:, date_idx].sum()
+        if number_persons_shift > 0:
+            assign(
+                pick(
+                    get_assignable(date_idx),
+                    BIG_NUMBER - number_persons_shift,
+                    number_shifts_possible,
+                    shifts.sum(axis=1),
+                ),
+                date_idx,
+            )
+
+    solve_stats = SolveStats(
+        status="Heuristic",
+        duration=time.perf_counter() - start,
+        objective=compute_objective(parameters.goal_modality, shifts),
+        number_variables=0,
+        number_constraints=0,
+    )
+
+    return Planning(
+        events=events,
+        persons_infos=persons_infos,
+        availabilities=planning_availabilities.availabilities,
+        assignations=to_assignations(
+            days,
+            list(persons_infos["name"]),
+            {
+                EventType.SHIFT: shifts,
+                EventType.GAP_FRANCO: gaps,
+                EventType.SCRENNINGS: np.zeros_like(shifts),
+            },
+            references,
+        ),
+        solve_stats=solve_stats,
+    )
+
+
+if __name__ == "__main__":
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+    from planning.solver import solve_planning
+
+    planning = generate_planning(number_persons=1000)
+    pl_greedy = plan_greedy(planning, DEFAULT_PARAMETERS)
+    print(pl_greedy.solve_stats)
+    pl_assign = solve_planning(
+        planning,
+        DEFAULT_PARAMETERS,
+        verbose=False,
+        low_memory=True,
+        initial_assignations=pl_greedy.assignations,
+    )
+    print(pl_assign.solve_stats)
@@ -0,0 +1,547 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pulp
+
+from planning.days import get_days_since
+from planning.heuristic import plan_greedy
+from planning.parameters import GapModality, PlanningParameters
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.rules import (
+    RuleContext,
+    Variable,
+    build_rule_context,
+    from_assignations,
+    to_assignations,
+)
+from planning.solver import BIG_NUMBER, WEIGHT_PRIMARY_GOAL, order_goals
+
+MAX_ITERATIONS_PATTERNS = 200
+# minimal reduced cost of a new pattern, below it is numerical noise
+EPSILON_REDUCED_COST = 1e-4
+
+# actions of a person on a date
+NO_ACTION, SHIFT, GAP, SHIFT_AND_GAP = range(4)
+
+
+@dataclass
+class Patterns:
+    """Schedules of the persons on the whole dates, one per row."""
+
+    person_idxs: np.ndarray
+    shifts: np.ndarray  # patterns x dates
+    gaps: np.ndarray  # patterns x dates
+
+    def __len__(self) -> int:
+        return len(self.person_idxs)
+
+
+class PatternPricer:
+    """Best pattern of each person for given values of its shifts and GAPs, by
+    dynamic programming over the dates.
+
+    The state of a person on a date is: the days since its last shift (capped to
+    the minimal spacing), its number of shifts on the month, whether it did a GAP
+    on the previous month and whether it did one on the month. The persons are
+    handled all at once."""
+
+    def __init__(self, context: RuleContext):
+        parameters = context.parameters
+        if parameters.gap_modality != GapModality.MONTH:
+            raise ValueError(f"Gap modality '{parameters.gap_modality}' not handled.")
+
+        spacing = parameters.min_number_days_between_two_shifts
+        max_shifts = parameters.max_number_shift_per_month
+        shape = (spacing + 1, max_shifts + 1, 2, 2)
+        self.number_states = int(np.prod(shape))
+        days_since, shifts_month, gap_previous, gap_month = (
+            array.ravel() for array in np.indices(shape)
+        )
+
+        def encode(days_since, shifts_month, gap_previous, gap_month) -> np.ndarray:
+            return np.ravel_multi_index(
+                (days_since, shifts_month, gap_previous, gap_month), shape
+            )
+
+        possible_assignations = context.possible_assignations
+        days_since_last_shift = get_days_since(context.days, context.days_last_shift)
+        # the last shift before the dates only forbids some dates
+        self.possible_shifts = possible_assignations[EventType.SHIFT] & ~(
+            days_since_last_shift < spacing
+        )
+        self.possible_gaps = possible_assignations[EventType.GAP_FRANCO]
+        self.initial_states = encode(
+            spacing,
+            np.minimum(context.number_shift_this_month, max_shifts),
+            context.did_gap_last_month.astype(int),
+            context.did_gap_this_month.astype(int),
+        )
+
+        # for each date, the target of each state and action, sorted by target
+        month_idxs, _ = context.get_month_idxs()
+        days = context.days
+        # the state is known on the first month, before the first date
+        month_previous, day_previous = 0, days[0] if len(days) > 0 else 0
+        self.transitions: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for month_idx, day in zip(month_idxs, days):
+            # time passing
+            days_since_new = np.minimum(days_since + day - day_previous, spacing)
+            shifts_month_new, gap_previous_new, gap_month_new = (
+                shifts_month,
+                gap_previous,
+                gap_month,
+            )
+            if month_idx > month_previous:
+                shifts_month_new = np.zeros_like(shifts_month)
+                # a GAP allows the shifts of its month and of the next one
+                gap_previous_new = (
+                    gap_month
+                    if month_idx == month_previous + 1
+                    else np.zeros_like(gap_month)
+                )
+                gap_month_new = np.zeros_like(gap_month)
+            month_previous, day_previous = month_idx, day
+
+            # actions
+            can_shift = (
+                (days_since_new == spacing)
+                & (shifts_month_new < max_shifts)
+                & ((gap_previous_new | gap_month_new) == 1)
+            )
+            can_gap = gap_month_new == 0
+            shifts_month_next = np.minimum(shifts_month_new + 1, max_shifts)
+            targets = np.stack(
+                [
+                    encode(
+                        days_since_new,
+                        shifts_month_new,
+                        gap_previous_new,
+                        gap_month_new,
+                    ),
+                    encode(0, shifts_month_next, gap_previous_new, gap_month_new),
+                    encode(days_since_new, shifts_month_new, gap_previous_new, 1),
+                    encode(0, shifts_month_next, gap_previous_new, 1),
+                ]
+            ).ravel()
+            allowed = np.stack(
+                [np.ones_like(can_shift), can_shift, can_gap, can_shift & can_gap]
+            )
+            order = np.argsort(targets, kind="stable")
+            self.transitions.append((order, targets[order], allowed))
+
+    def price(
+        self, shift_values: np.ndarray, gap_values: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Best value of each person, and its shifts and GAPs (persons x dates)."""
+
+        number_persons, number_dates = self.possible_shifts.shape
+        number_states = self.number_states
+        person_idxs = np.arange(number_persons)
+
+        values = np.full((number_persons, number_states), -np.inf)
+        values[person_idxs, self.initial_states] = 0
+        # position of the best source of each state, in the sorted sources
+        backs = np.zeros((number_dates, number_persons, number_states), dtype=np.int16)
+        for date_idx, (order, targets_sorted, allowed) in enumerate(self.transitions):
+            possible_shift = self.possible_shifts[:, date_idx]
+            possible_gap = self.possible_gaps[:, date_idx]
+            shift_value = np.where(possible_shift, shift_values[:, date_idx], -np.inf)
+            gap_value = np.where(possible_gap, gap_values[:, date_idx], -np.inf)
+            gains = np.stack(
+                [
+                    np.zeros(number_persons),
+                    shift_value,
+                    gap_value,
+                    shift_value + gap_value,
+                ]
+            )
+            candidates = values[np.newaxis] + gains[:, :, np.newaxis]
+            candidates[~np.broadcast_to(allowed[:, np.newaxis], candidates.shape)] = (
+                -np.inf
+            )
+            candidates = candidates.transpose(1, 0, 2).reshape(number_persons, -1)
+            candidates = candidates[:, order]
+
+            # best source of each target
+            starts = np.flatnonzero(np.diff(targets_sorted, prepend=-1))
+            best = np.maximum.reduceat(candidates, starts, axis=1)
+            lengths = np.diff(np.append(starts, len(targets_sorted)))
+            hit = candidates == np.repeat(best, lengths, axis=1)
+            positions = np.where(hit, np.arange(len(targets_sorted)), len(order))
+            first = np.minimum.reduceat(positions, starts, axis=1)
+
+            values = np.full((number_persons, number_states), -np.inf)
+            values[:, targets_sorted[starts]] = best
+            backs[date_idx][:, targets_sorted[starts]] = first
+
+        # back from the best final state
+        states = np.argmax(values, axis=1)
+        best_values = values[person_idxs, states]
+        shifts = np.zeros((number_persons, number_dates), dtype=bool)
+        gaps = np.zeros((number_persons, number_dates), dtype=bool)
+        for date_idx in range(number_dates - 1, -1, -1):
+            order = self.transitions[date_idx][0]
+            sources = order[backs[date_idx][person_idxs, states]]
+            actions, states = np.divmod(sources, number_states)
+            shifts[:, date_idx] = (actions == SHIFT) | (actions == SHIFT_AND_GAP)
+            gaps[:, date_idx] = (actions == GAP) | (actions == SHIFT_AND_GAP)
+
+        return best_values, shifts, gaps
+
+
+class PatternMaster:
+    """Restricted master problem: one pattern per person, the opening of the
+    shifts and GAPs and the referents, with the per date rules."""
+
+    def __init__(self, context: RuleContext):
+        self.context = context
+        parameters = context.parameters
+        number_persons, number_dates = context.number_persons, context.number_dates
+        possible_shifts = context.possible_assignations[EventType.SHIFT]
+        possible_gaps = context.possible_assignations[EventType.GAP_FRANCO]
+
+        # weight of a person on a shift and of an open shift
+        variable_to_weight = dict(
+            zip(
+                order_goals(
+                    parameters.goal_modality, Variable.OPEN_SHIFT, Variable.SHIFT
+                ),
+                [WEIGHT_PRIMARY_GOAL, 1],
+            )
+        )
+        self.weight_shift = variable_to_weight[Variable.SHIFT]
+        weight_open_shift = variable_to_weight[Variable.OPEN_SHIFT]
+
+        self.solver = pulp.LpProblem("patterns", pulp.LpMaximize)
+        objective = pulp.LpAffineExpression()
+        self.solver.setObjective(objective)
+
+        def add(expression, sense, rhs) -> pulp.LpConstraint:
+            constraint = pulp.LpConstraint(
+                pulp.LpAffineExpression(expression), sense=sense, rhs=rhs
+            )
+            self.solver += constraint
+            return constraint
+
+        # open events, none where nobody can be
+        self.open_shifts = np.zeros(number_dates, dtype=object)
+        self.open_gaps = np.zeros(number_dates, dtype=object)
+        for date_idx in np.flatnonzero(possible_shifts.any(axis=0)):
+            self.open_shifts[date_idx] = pulp.LpVariable(f"o{date_idx}", 0, 1)
+            objective[self.open_shifts[date_idx]] = weight_open_shift
+        for date_idx in np.flatnonzero(possible_gaps.any(axis=0)):
+            self.open_gaps[date_idx] = pulp.LpVariable(f"q{date_idx}", 0, 1)
+
+        # referents
+        possible_references = possible_shifts & ~context.is_new[:, np.newaxis]
+        self.references = np.zeros((number_persons, number_dates), dtype=object)
+        for person_idx, date_idx in zip(*np.nonzero(possible_references)):
+            self.references[person_idx, date_idx] = pulp.LpVariable(
+                f"r{person_idx}_{date_idx}", 0, 1
+            )
+
+        self.one_pattern = np.zeros(number_persons, dtype=object)
+        for person_idx in range(number_persons):
+            self.one_pattern[person_idx] = add([], pulp.LpConstraintEQ, 1)
+        number_referents = parameters.exact_number_referent_per_perm
+        self.min_persons_shift = np.zeros(number_dates, dtype=object)
+        self.max_persons_shift = np.zeros(number_dates, dtype=object)
+        self.min_persons_gap = np.zeros(number_dates, dtype=object)
+        self.max_persons_gap = np.zeros(number_dates, dtype=object)
+        for date_idx, open_shift in enumerate(self.open_shifts):
+            if isinstance(open_shift, pulp.LpVariable):
+                min_persons = parameters.min_number_person_per_shift
+                self.min_persons_shift[date_idx] = add(
+                    [(open_shift, -min_persons)], pulp.LpConstraintGE, 0
+                )
+                self.max_persons_shift[date_idx] = add(
+                    [(open_shift, -BIG_NUMBER)], pulp.LpConstraintLE, 0
+                )
+                # the exact number of referents on an open shift, none if closed
+                references = [
+                    (reference, 1)
+                    for reference in self.references[:, date_idx]
+                    if isinstance(reference, pulp.LpVariable)
+                ]
+                add(
+                    references + [(open_shift, -number_referents)],
+                    pulp.LpConstraintEQ,
+                    0,
+                )
+        for date_idx, open_gap in enumerate(self.open_gaps):
+            if isinstance(open_gap, pulp.LpVariable):
+                self.min_persons_gap[date_idx] = add(
+                    [(open_gap, -parameters.min_number_person_gap)],
+                    pulp.LpConstraintGE,
+                    0,
+                )
+                self.max_persons_gap[date_idx] = add(
+                    [(open_gap, -min(parameters.max_number_person_gap, BIG_NUMBER))],
+                    pulp.LpConstraintLE,
+                    0,
+                )
+
+        # a referent is on the shift of its pattern, and not too often
+        self.referent_on_shift = np.zeros((number_persons, number_dates), dtype=object)
+        for person_idx, date_idx in zip(*np.nonzero(possible_references)):
+            self.referent_on_shift[person_idx, date_idx] = add(
+                [(self.references[person_idx, date_idx], 1)], pulp.LpConstraintLE, 0
+            )
+        month_idxs, number_months = context.get_month_idxs()
+        max_references = np.full(
+            (number_persons, number_months),
+            parameters.max_number_reference_per_person_per_month,
+        )
+        if number_months > 0:
+            max_references[:, 0] -= context.number_reference_this_month
+        for person_idx in np.flatnonzero(possible_references.any(axis=1)):
+            for month_idx in range(number_months):
+                references = [
+                    (reference, 1)
+                    for reference in self.references[
+                        person_idx, month_idxs == month_idx
+                    ]
+                    if isinstance(reference, pulp.LpVariable)
+                ]
+                if references:
+                    add(
+                        references,
+                        pulp.LpConstraintLE,
+                        max_references[person_idx, month_idx],
+                    )
+
+        self.patterns = Patterns(
+            person_idxs=np.zeros(0, dtype=int),
+            shifts=np.zeros((0, number_dates), dtype=bool),
+            gaps=np.zeros((0, number_dates), dtype=bool),
+        )
+        self.patterns_variables: List[pulp.LpVariable] = []
+
+    @property
+    def number_constraints(self) -> int:
+        return self.solver.numConstraints()
+
+    def add_patterns(self, patterns: Patterns) -> None:
+        objective = self.solver.objective
+        for person_idx, shifts, gaps in zip(
+            patterns.person_idxs, patterns.shifts, patterns.gaps
+        ):
+            variable = pulp.LpVariable(f"p{len(self.patterns_variables)}", 0)
+            self.patterns_variables.append(variable)
+            objective[variable] = self.weight_shift * int(shifts.sum())
+            # new column in the constraints
+            self.one_pattern[person_idx].expr[variable] = 1
+            for date_idx in np.flatnonzero(shifts):
+                self.min_persons_shift[date_idx].expr[variable] = 1
+                self.max_persons_shift[date_idx].expr[variable] = 1
+                referent_on_shift = self.referent_on_shift[person_idx, date_idx]
+                if isinstance(referent_on_shift, pulp.LpConstraint):
+                    referent_on_shift.expr[variable] = -1
+            for date_idx in np.flatnonzero(gaps):
+                self.min_persons_gap[date_idx].expr[variable] = 1
+                self.max_persons_gap[date_idx].expr[variable] = 1
+
+        self.patterns = Patterns(
+            person_idxs=np.concatenate(
+                [self.patterns.person_idxs, patterns.person_idxs]
+            ),
+            shifts=np.concatenate([self.patterns.shifts, patterns.shifts]),
+            gaps=np.concatenate([self.patterns.gaps, patterns.gaps]),
+        )
+
+    def set_integer(self, integer: bool) -> None:
+        category = pulp.LpInteger if integer else pulp.LpContinuous
+        for variable in self.solver.variables():
+            variable.cat = category
+
+    def solve(
+        self, time_limit: Optional[float] = None, warm_start: bool = False
+    ) -> float:
+        self.solver.solve(
+            pulp.PULP_CBC_CMD(msg=0, timeLimit=time_limit, warmStart=warm_start)
+        )
+        if self.solver.status != pulp.LpStatusOptimal:
+            raise RuntimeError(
+                f"Master problem not solved : {pulp.LpStatus[self.solver.status]}"
+            )
+        return pulp.value(self.solver.objective)
+
+    def get_duals(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Value of a shift and of a GAP for each person on each date, and the dual
+        of the pattern of each person."""
+
+        def pi(constraints: np.ndarray) -> np.ndarray:
+            return np.array(
+                [
+                    (c.pi or 0) if isinstance(c, pulp.LpConstraint) else 0
+                    for c in np.ravel(constraints)
+                ]
+            ).reshape(constraints.shape)
+
+        # reduced cost 'objective - sum(dual * coefficient)' of each term
+        shift_values = (
+            self.weight_shift
+            - pi(self.min_persons_shift)
+            - pi(self.max_persons_shift)
+            + pi(self.referent_on_shift)
+        )
+        gap_values = np.broadcast_to(
+            -pi(self.min_persons_gap) - pi(self.max_persons_gap),
+            shift_values.shape,
+        )
+        return shift_values, gap_values, pi(self.one_pattern)
+
+    def get_values(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Shifts, GAPs and references of the persons, persons x dates."""
+
+        shape = (self.context.number_persons, self.context.number_dates)
+        shifts = np.zeros(shape, dtype=bool)
+        gaps = np.zeros(shape, dtype=bool)
+        chosen = np.array([(v.varValue or 0) > 0.5 for v in self.patterns_variables])
+        person_idxs = self.patterns.person_idxs[chosen]
+        shifts[person_idxs] = self.patterns.shifts[chosen]
+        gaps[person_idxs] = self.patterns.gaps[chosen]
+        references = np.zeros(shape, dtype=bool)
+        for idx, reference in np.ndenumerate(self.references):
+            if isinstance(reference, pulp.LpVariable):
+                references[idx] = (reference.varValue or 0) > 0.5
+        return shifts, gaps, references
+
+
+def solve_planning_patterns(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    max_iterations: int = MAX_ITERATIONS_PATTERNS,
+    time_limit: Optional[float] = None,
+    verbose: bool = True,
+) -> Planning:
+    """Column generation on the schedules of the persons: the linear relaxation
+    of the master problem is solved with the patterns found so far, then the
+    patterns with a positive reduced cost are added, until there are none. The
+    master is finally solved in integers on the patterns found (price and
+    branch), the relaxation gives a bound on the objective."""
+
+    start = time.perf_counter()
+    context = build_rule_context(planning_availabilities, parameters)
+    number_persons, number_dates = context.number_persons, context.number_dates
+    persons_name = list(planning_availabilities.persons_infos["name"])
+    pricer = PatternPricer(context)
+    master = PatternMaster(context)
+
+    # empty patterns so that the master is feasible, and the greedy planning
+    pl_greedy = plan_greedy(planning_availabilities, parameters)
+    event_type_to_values, references_greedy = from_assignations(
+        context.days, persons_name, pl_greedy.assignations
+    )
+    person_idxs = np.arange(number_persons)
+    master.add_patterns(
+        Patterns(
+            person_idxs=np.concatenate([person_idxs, person_idxs]),
+            shifts=np.concatenate(
+                [
+                    np.zeros((number_persons, number_dates), dtype=bool),
+                    event_type_to_values[EventType.SHIFT],
+                ]
+            ),
+            gaps=np.concatenate(
+                [
+                    np.zeros((number_persons, number_dates), dtype=bool),
+                    event_type_to_values[EventType.GAP_FRANCO],
+                ]
+            ),
+        )
+    )
+
+    bound = np.inf
+    for iteration in range(max_iterations):
+        objective_relaxation = master.solve()
+        shift_values, gap_values, pattern_duals = master.get_duals()
+        values, shifts, gaps = pricer.price(shift_values, gap_values)
+        reduced_costs = values - pattern_duals
+        # the relaxation plus the best improvement of each person bounds it
+        bound = min(bound, objective_relaxation + np.maximum(reduced_costs, 0).sum())
+        improving = reduced_costs > EPSILON_REDUCED_COST
+        if verbose:
+            print(
+                f"iteration {iteration} : relaxation {objective_relaxation:.1f}, "
+                f"bound {bound:.1f}, {improving.sum()} patterns added"
+            )
+        if not improving.any():
+            break
+        master.add_patterns(
+            Patterns(
+                person_idxs=person_idxs[improving],
+                shifts=shifts[improving],
+                gaps=gaps[improving],
+            )
+        )
+
+    # integer solution on the patterns found, from the greedy one
+    master.set_integer(True)
+    number_patterns = len(master.patterns)
+    for idx, variable in enumerate(master.patterns_variables):
+        variable.setInitialValue(int(number_persons <= idx < 2 * number_persons))
+    for values_greedy, variables in [
+        (references_greedy, master.references),
+        (event_type_to_values[EventType.SHIFT].any(axis=0), master.open_shifts),
+        (event_type_to_values[EventType.GAP_FRANCO].any(axis=0), master.open_gaps),
+    ]:
+        for idx, variable in np.ndenumerate(variables):
+            if isinstance(variable, pulp.LpVariable):
+                variable.setInitialValue(int(values_greedy[idx]))
+    time_limit_integer = (
+        None
+        if time_limit is None
+        else max(time_limit - (time.perf_counter() - start), 1)
+    )
+    objective = master.solve(time_limit=time_limit_integer, warm_start=True)
+    shifts, gaps, references = master.get_values()
+
+    # the objective is an integer
+    status = "Optimal" if objective > bound - 1 + 1e-6 else "Feasible"
+    return Planning(
+        events=planning_availabilities.events,
+        persons_infos=planning_availabilities.persons_infos,
+        availabilities=planning_availabilities.availabilities,
+        assignations=to_assignations(
+            context.days,
+            persons_name,
+            {
+                EventType.SHIFT: shifts,
+                EventType.GAP_FRANCO: gaps,
+                EventType.SCRENNINGS: np.zeros_like(shifts),
+            },
+            references,
+        ),
+        solve_stats=SolveStats(
+            status=status,
+            duration=time.perf_counter() - start,
+            objective=objective,
+            number_variables=number_patterns,
+            number_constraints=master.number_constraints,
+            bound=float(bound),
+        ),
+    )
+
+
+if __name__ == "__main__":
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+    from planning.solver import build_planning_model, solve_planning
+
+    planning = generate_planning(number_persons=1000)
+    pl_patterns = solve_planning_patterns(planning, DEFAULT_PARAMETERS)
+    print(pl_patterns.solve_stats)
+    pl_assign = solve_planning(
+        planning, DEFAULT_PARAMETERS, verbose=False, low_memory=True
+    )
+    print(pl_assign.solve_stats)
+
+    # bound given by the linear relaxation of the compact model
+    model = build_planning_model(planning, DEFAULT_PARAMETERS, low_memory=True)
+    for variable in model.solver.variables():
+        variable.cat = pulp.LpContinuous
+    model.solver.solve(pulp.PULP_CBC_CMD(msg=0))
+    print(f"relaxation of the compact model : {pulp.value(model.solver.objective)}")
@@ -1,12 +1,13 @@
-from datetime import datetime
 from functools import reduce
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Union
 
 import numpy as np
 import pandas as pd
 
 from helper.excel_editor import ExcelEditor
+from helper.xlsx_reader import TableBounds, UnsupportedXlsx, XlsxReader
+from planning.days import NO_DAY, to_dates, to_days
 from planning.planning_struct import EventType, Language, Planning
 
 ROW_DATES = 2
@@ -23,6 +24,14 @@ COL_PERSON_NUMBER_SHIFT_WANTED = 3
 COL_PERSON_AGREE_TO_BE_REFERENT = 4
 COL_PERSON_DATE_LAST_SHIFT = 5
 
+# events in columns, persons in rows
+PAGE_TABLE = TableBounds(
+    header_row=ROW_EVENT_NAME,
+    first_col=COL_SHIFT,
+    first_row=ROW_FIRST_PERSON,
+    key_col=COL_PERSON_NAME,
+)
+
 
 # mappers
 TYPE_EVENTS_NAME_MAPPER = Dict[str, EventType]
@@ -68,9 +77,23 @@ available_mapper = {None: False, False: False, True: True, "false": False, "true
 available_mapper = {label: not b for label, b in available_mapper.items()}
 
 
-def read_page(ee: ExcelEditor, page_name: str, language: Language) -> Planning:
+PAGES_LANGUAGE = {
+    "Franco": Language.FRENCH_ONLY,
+    "Anglos": Language.ENGLISH_ONLY,
+    "Bilingues": Language.BILINGUUAL,
+}
+
 
-    page = ee.read_page(page_name)
+def read_page(
+    ee: Union[XlsxReader, ExcelEditor], page_name: str, language: Language
+) -> Planning:
+
+    # the stream stops at the end of the table
+    page = (
+        ee.read_page(page_name)
+        if isinstance(ee, ExcelEditor)
+        else ee.read_page(page_name, PAGE_TABLE)
+    )
 
     # store ...
     col = COL_SHIFT
@@ -78,26 +101,25 @@ def read_page(ee: ExcelEditor, page_name: str, language: Language) -> Planning:
         col += 1
     col_after_last_shift = col
 
-    dates: List[datetime] = page[ROW_DATES, COL_SHIFT:col_after_last_shift]
     events_name: List[str] = page[ROW_EVENT_NAME, COL_SHIFT:col_after_last_shift]
+    events_type = [events_name_mapper[event_name] for event_name in events_name]
 
-    # pre-process dates
-    for i in range(1, len(dates)):
-        if dates[i] is None:
-            dates[i] = dates[i - 1]
+    # dates as days, an empty cell is the date of the previous one
+    days = to_days(page[ROW_DATES, COL_SHIFT:col_after_last_shift])
+    cols_filled = np.maximum.accumulate(
+        np.where(days != NO_DAY, np.arange(len(days)), 0)
+    )
+    days = days[cols_filled]
 
-    # init events
-    dates_unique = np.unique(dates)
-    dates_unique.sort()
-    data = {"date": dates_unique}
+    # events
+    days_unique = np.unique(days)
+    date_idxs = np.searchsorted(days_unique, days)
+    data = {"date": to_dates(days_unique)}
     for event in list(EventType):
-        data[event.value] = [False] * len(dates_unique)
-    df_events = pd.DataFrame(data=data).set_index("date")
-
-    # fill events
-    for date, event_name in zip(dates, events_name):
-        event = events_name_mapper[event_name]
-        df_events.loc[date, event.value] = True
+        data[event.value] = np.zeros(len(days_unique), dtype=bool)
+    for date_idx, event in zip(date_idxs, events_type):
+        data[event.value][date_idx] = True
+    df_events = pd.DataFrame(data=data)
 
     # person infos
     row = ROW_FIRST_PERSON
@@ -124,27 +146,25 @@ def read_page(ee: ExcelEditor, page_name: str, language: Language) -> Planning:
     ]
     df_persons_infos = pd.DataFrame(data=data)
 
-    # availabilities
-    data = [
-        {
-            "person_name": person_name,
-            "date": date,
-            "event_type": events_name_mapper[event_name],
-            "available": available_mapper[available],
+    # availabilities, persons x columns of the events
+    number_persons = len(df_persons_infos)
+    lines = page[ROW_FIRST_PERSON:row_after_last_person, COL_SHIFT:col_after_last_shift]
+    df_availabitilies = pd.DataFrame(
+        data={
+            "person_name": np.repeat(
+                df_persons_infos["name"].to_numpy(dtype=object), len(days)
+            ),
+            "date": np.tile(to_dates(days), number_persons),
+            "event_type": np.tile(
+                np.asarray(events_type, dtype=object), number_persons
+            ),
+            "available": [available_mapper[available] for available in lines.ravel()],
         }
-        for person_name, line in zip(
-            df_persons_infos["name"],
-            page[
-                ROW_FIRST_PERSON:row_after_last_person, COL_SHIFT:col_after_last_shift
-            ],
-        )
-        for date, event_name, available in zip(dates, events_name, line)
-    ]
-    df_availabitilies = pd.DataFrame(data=data)
+    )
 
     # store and return
     return Planning(
-        events=df_events.reset_index(),
+        events=df_events,
         persons_infos=df_persons_infos,
         availabilities=df_availabitilies,
     )
@@ -152,17 +172,22 @@ def read_page(ee: ExcelEditor, page_name: str, language: Language) -> Planning:
 
 def read_planning(pathfile: Path) -> Planning:
 
-    ee = ExcelEditor(path_excel=pathfile)
-    # assert set(ee.get_pages_name()) == {"Franco", "Anglos", "Bilingues"}
-
-    plannings = [
-        read_page(ee, page_name, language)
-        for page_name, language in {
-            "Franco": Language.FRENCH_ONLY,
-            "Anglos": Language.ENGLISH_ONLY,
-            "Bilingues": Language.BILINGUUAL,
-        }.items()
-    ]
+    # streamed, openpyxl only reads what the stream does not handle
+    try:
+        reader = XlsxReader(path_excel=pathfile)
+        try:
+            plannings = [
+                read_page(reader, page_name, language)
+                for page_name, language in PAGES_LANGUAGE.items()
+            ]
+        finally:
+            reader.close()
+    except UnsupportedXlsx:
+        ee = ExcelEditor(path_excel=pathfile)
+        plannings = [
+            read_page(ee, page_name, language)
+            for page_name, language in PAGES_LANGUAGE.items()
+        ]
 
     # -- merge
 
@@ -19,6 +19,18 @@ class Language(Enum):
     BILINGUUAL = 3
 
 
+@dataclass
+class SolveStats:
+    status: str
+    duration: float  # seconds
+    objective: Optional[float]
+    number_variables: int
+    number_constraints: int
+    from_cache: bool = False
+    configuration: Optional[str] = None  # winner of a portfolio solve
+    bound: Optional[float] = None  # proven upper bound of the objective, if any
+
+
 @dataclass
 class Planning:
     events: (
@@ -30,3 +42,4 @@ class Planning:
 
     availabilities: Optional[pd.DataFrame] = None
     assignations: Optional[pd.DataFrame] = None
+    solve_stats: Optional[SolveStats] = None
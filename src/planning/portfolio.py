@@ -0,0 +1,210 @@
+import dataclasses
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional
+
+import pulp
+
+from planning.parameters import PlanningParameters
+from planning.planning_struct import Planning
+from planning.rules import to_assignations
+from planning.shared_planning import SharedPlanning, SharedPlanningHandle
+from planning.solver import (
+    build_planning_model_from_context,
+    get_assignations_values,
+    solve_model,
+)
+
+TIME_LIMIT_PORTFOLIO = 60.0  # seconds
+# time given to the configurations to send their incumbent after the time limit
+GRACE_PERIOD = 5.0  # seconds
+
+
+@dataclass
+class SolveConfiguration:
+    label: str
+    options: List[str] = field(default_factory=list)  # CBC command line options
+    threads: Optional[int] = None
+    low_memory: bool = True  # sparse or dense formulation
+
+
+PORTFOLIO_CONFIGURATIONS = [
+    SolveConfiguration("default"),
+    SolveConfiguration("seed_1", options=["randomCbcSeed 1", "randomSeed 1"]),
+    SolveConfiguration("cuts_root_no_presolve", options=["cuts root", "presolve off"]),
+    SolveConfiguration("dense", low_memory=False),
+]
+
+
+@dataclass
+class ConfigurationResult:
+    configuration: SolveConfiguration
+    planning: Optional[Planning] = None
+    proven_optimal: bool = False
+    error: Optional[str] = None
+
+
+def solve_configuration(
+    conn: Connection,
+    handle: SharedPlanningHandle,
+    parameters: PlanningParameters,
+    configuration: SolveConfiguration,
+    deadline: float,
+) -> None:
+    # own process group, killing it also kills the CBC process
+    os.setpgrp()
+    try:
+        shared = SharedPlanning.attach(handle)
+        model = build_planning_model_from_context(
+            shared.to_rule_context(parameters),
+            shared.persons_name,
+            configuration.low_memory,
+        )
+        solve_stats = solve_model(
+            model,
+            # the time spent building the model counts
+            time_limit=max(deadline - time.time(), 1.0),
+            verbose=False,
+            options=configuration.options,
+            threads=configuration.threads,
+        )
+        proven_optimal = model.solver.sol_status == pulp.LpSolutionOptimal
+        if not proven_optimal:
+            solve_stats = dataclasses.replace(solve_stats, status="Feasible")
+
+        # compact values, the assignations are built by the parent
+        conn.send((get_assignations_values(model), solve_stats, proven_optimal, None))
+    except Exception as e:
+        conn.send((None, None, False, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def kill(process: multiprocessing.Process) -> None:
+    if not process.is_alive():
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # not yet in its own process group
+        process.kill()
+
+
+def solve_planning_portfolio(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    configurations: List[SolveConfiguration] = PORTFOLIO_CONFIGURATIONS,
+    time_limit: float = TIME_LIMIT_PORTFOLIO,
+    verbose: bool = True,
+) -> Planning:
+    """Race the configurations, one process each. The first proven optimal solution
+    wins, otherwise the best one found before the time limit."""
+
+    mp_context = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    start = time.perf_counter()
+    deadline = time.time() + time_limit
+    # the workers attach to it instead of receiving a copy
+    shared = SharedPlanning.create(planning_availabilities)
+    # copied, the shared memory is released before the plannings are built
+    days = shared.days.copy()
+    persons_name = shared.persons_name
+
+    conn_to_result: Dict[Connection, ConfigurationResult] = {}
+    processes: List[multiprocessing.Process] = []
+    for configuration in configurations:
+        conn_parent, conn_child = mp_context.Pipe(duplex=False)
+        process = mp_context.Process(
+            target=solve_configuration,
+            args=(
+                conn_child,
+                shared.handle,
+                parameters,
+                configuration,
+                deadline,
+            ),
+            daemon=True,
+        )
+        process.start()
+        conn_child.close()
+        processes.append(process)
+        conn_to_result[conn_parent] = ConfigurationResult(configuration)
+
+    results: List[ConfigurationResult] = []
+    winner: Optional[ConfigurationResult] = None
+    try:
+        conns_pending = list(conn_to_result)
+        while conns_pending and winner is None:
+            timeout = deadline + GRACE_PERIOD - time.time()
+            if timeout <= 0:
+                break
+            for conn in wait(conns_pending, timeout=timeout):
+                conns_pending.remove(conn)
+                result = conn_to_result[conn]
+                try:
+                    values, solve_stats, proven_optimal, error = conn.recv()
+                except EOFError:
+                    values, solve_stats, proven_optimal = None, None, False
+                    error = "Process died without result"
+                finally:
+                    conn.close()
+                result.proven_optimal, result.error = proven_optimal, error
+                if error is None:
+                    result.planning = Planning(
+                        events=planning_availabilities.events,
+                        persons_infos=planning_availabilities.persons_infos,
+                        availabilities=planning_availabilities.availabilities,
+                        assignations=to_assignations(days, persons_name, *values),
+                        solve_stats=dataclasses.replace(
+                            solve_stats, configuration=result.configuration.label
+                        ),
+                    )
+                results.append(result)
+                if verbose:
+                    print(
+                        f"{result.configuration.label} : "
+                        f"{error or result.planning.solve_stats.status}"
+                    )
+                if proven_optimal:
+                    winner = result
+                    break
+                if error is not None and "Infeasible" in error:
+                    raise RuntimeError("Infeasible planning")
+    finally:
+        for process in processes:
+            kill(process)
+            process.join()
+        for conn in conn_to_result:
+            conn.close()
+        shared.close()
+
+    if winner is None:
+        results_solved = [result for result in results if result.planning is not None]
+        if len(results_solved) == 0:
+            errors = "; ".join(
+                f"{result.configuration.label}: {result.error}" for result in results
+            )
+            raise RuntimeError(f"No planning found in {time_limit} s ({errors})")
+        winner = max(
+            results_solved, key=lambda result: result.planning.solve_stats.objective
+        )
+
+    pl_assign = winner.planning
+    pl_assign.solve_stats = dataclasses.replace(
+        pl_assign.solve_stats, duration=time.perf_counter() - start
+    )
+    return pl_assign
+
+
+if __name__ == "__main__":
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    planning = generate_planning(number_persons=1000)
+    pl_assign = solve_planning_portfolio(planning, DEFAULT_PARAMETERS, time_limit=30)
+    print(pl_assign.solve_stats)
@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from planning.days import to_days
+from planning.parameters import PlanningParameters
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.rules import EVENT_TYPES_ASSIGNABLE, from_assignations, get_persons_state
+from planning.solver import combine_statuses, compute_objective, solve_planning
+
+NUMBER_DAYS_COMMITTED = 14
+NUMBER_DAYS_LOOKAHEAD = 7
+
+
+def restrict_planning(
+    planning: Planning,
+    date_start: datetime,
+    date_end: datetime,
+    persons_infos: pd.DataFrame,
+) -> Planning:
+    """Planning on the dates in [date_start, date_end[ for the given persons infos."""
+
+    events = planning.events
+    availabilities = planning.availabilities
+    return Planning(
+        events=events[
+            (events["date"] >= date_start) & (events["date"] < date_end)
+        ].reset_index(drop=True),
+        persons_infos=persons_infos,
+        availabilities=(
+            None
+            if availabilities is None
+            else availabilities[
+                (availabilities["date"] >= date_start)
+                & (availabilities["date"] < date_end)
+            ]
+        ),
+    )
+
+
+def compute_persons_state(
+    persons_infos: pd.DataFrame,
+    date_start_horizon: datetime,
+    assignations: Optional[pd.DataFrame],
+    date: datetime,
+) -> pd.DataFrame:
+    """Persons infos at 'date' from the ones at the start of the horizon and the
+    assignations done in between."""
+
+    persons_state = persons_infos.copy()
+    if assignations is None:
+        return persons_state
+
+    assigned = assignations[assignations["assignation"].astype(bool) == True]
+    assigned_months = assigned["date"].dt.to_period("M")
+    month = pd.Period(date, "M")
+    month_start_horizon = pd.Period(date_start_horizon, "M")
+
+    def count(mask: pd.Series) -> np.ndarray:
+        counts = assigned[mask]["person_name"].value_counts()
+        return counts.reindex(persons_infos["name"], fill_value=0).to_numpy(copy=True)
+
+    is_shift = assigned["event_type"] == EventType.SHIFT
+    is_reference = assigned["assignation"] == "ref"
+    is_gap = assigned["event_type"] == EventType.GAP_FRANCO
+    this_month = assigned_months == month
+    last_month = assigned_months == month - 1
+
+    # what was done before the horizon only counts in its first month
+    number_shift_this_month = count(is_shift & this_month)
+    number_reference_this_month = count(is_reference & this_month)
+    did_gap_this_month = count(is_gap & this_month) > 0
+    did_gap_last_month = count(is_gap & last_month) > 0
+    if month == month_start_horizon:
+        number_shift_this_month += get_persons_state(
+            persons_infos, "number_shift_this_month"
+        ).astype(int)
+        number_reference_this_month += get_persons_state(
+            persons_infos, "number_reference_this_month"
+        ).astype(int)
+        did_gap_this_month |= get_persons_state(
+            persons_infos, "did_gap_this_month"
+        ).astype(bool)
+        did_gap_last_month = persons_infos["did_gap_last_month"].to_numpy(dtype=bool)
+    elif month == month_start_horizon + 1:
+        did_gap_last_month |= get_persons_state(
+            persons_infos, "did_gap_this_month"
+        ).astype(bool)
+
+    persons_state["number_shift_this_month"] = number_shift_this_month
+    persons_state["number_reference_this_month"] = number_reference_this_month
+    persons_state["did_gap_this_month"] = did_gap_this_month
+    persons_state["did_gap_last_month"] = did_gap_last_month
+
+    dates_last_shift = assigned[is_shift].groupby("person_name")["date"].max()
+    persons_state["date_last_shift"] = [
+        dates_last_shift.get(person_name, date_last_shift)
+        for person_name, date_last_shift in zip(
+            persons_infos["name"], persons_infos["date_last_shift"]
+        )
+    ]
+
+    return persons_state
+
+
+def sort_assignations(
+    assignations: pd.DataFrame, persons_name: List[str]
+) -> pd.DataFrame:
+    """Same order as the assignations given by 'solve_planning'."""
+
+    orders = {
+        "event_type": {
+            event_type: idx for idx, event_type in enumerate(EVENT_TYPES_ASSIGNABLE)
+        },
+        "person_name": {
+            person_name: idx for idx, person_name in enumerate(persons_name)
+        },
+    }
+    return assignations.sort_values(
+        ["event_type", "person_name", "date"],
+        key=lambda column: (
+            column.map(orders[column.name]) if column.name in orders else column
+        ),
+        kind="stable",
+        ignore_index=True,
+    )
+
+
+def solve_planning_rolling_horizon(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    number_days_committed: int = NUMBER_DAYS_COMMITTED,
+    number_days_lookahead: int = NUMBER_DAYS_LOOKAHEAD,
+    **solve_kwargs,
+) -> Planning:
+    """Solve windows of 'number_days_committed' + 'number_days_lookahead' days one
+    after the other, only the committed days of a window are kept."""
+
+    persons_infos = planning_availabilities.persons_infos
+    dates = pd.DatetimeIndex(np.sort(planning_availabilities.events["date"]))
+    if len(dates) == 0:
+        raise ValueError("No dates to plan.")
+
+    date_start = dates[0]
+    committed: List[pd.DataFrame] = []
+    solve_stats_windows: List[SolveStats] = []
+    while date_start <= dates[-1]:
+        date_end_committed = date_start + timedelta(days=number_days_committed)
+        date_end = date_end_committed + timedelta(days=number_days_lookahead)
+        if ((dates >= date_start) & (dates < date_end_committed)).any():
+            persons_state = compute_persons_state(
+                persons_infos,
+                date_start_horizon=dates[0],
+                assignations=(
+                    pd.concat(committed, ignore_index=True) if committed else None
+                ),
+                # the month of the first date is the first month of the window
+                date=dates[dates >= date_start][0],
+            )
+            window = restrict_planning(
+                planning_availabilities, date_start, date_end, persons_state
+            )
+            pl_assign = solve_planning(
+                planning_availabilities=window, parameters=parameters, **solve_kwargs
+            )
+            assignations = pl_assign.assignations
+            committed.append(assignations[assignations["date"] < date_end_committed])
+            solve_stats_windows.append(pl_assign.solve_stats)
+
+        date_start = date_end_committed
+
+    persons_name = list(persons_infos["name"])
+    assignations = sort_assignations(
+        pd.concat(committed, ignore_index=True), persons_name
+    )
+    # the objective of the whole planning, not the sum of the windows ones
+    event_type_to_values, _ = from_assignations(
+        np.sort(to_days(planning_availabilities.events["date"])),
+        persons_name,
+        assignations,
+    )
+    solve_stats = SolveStats(
+        status=combine_statuses([s.status for s in solve_stats_windows]),
+        duration=sum(solve_stats.duration for solve_stats in solve_stats_windows),
+        objective=compute_objective(
+            parameters.goal_modality, event_type_to_values[EventType.SHIFT]
+        ),
+        number_variables=max(s.number_variables for s in solve_stats_windows),
+        number_constraints=max(s.number_constraints for s in solve_stats_windows),
+    )
+
+    return Planning(
+        events=planning_availabilities.events,
+        persons_infos=persons_infos,
+        availabilities=planning_availabilities.availabilities,
+        assignations=assignations,
+        solve_stats=solve_stats,
+    )
+
+
+if __name__ == "__main__":
+    import time
+
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    planning = generate_planning(number_persons=200, number_dates=92)
+    for label, solve in [
+        ("rolling horizon", solve_planning_rolling_horizon),
+        ("monolithic", solve_planning),
+    ]:
+        start = time.perf_counter()
+        pl_assign = solve(planning, DEFAULT_PARAMETERS, verbose=False, low_memory=True)
+        assignations = pl_assign.assignations
+        shifts = assignations[
+            (assignations["event_type"] == EventType.SHIFT)
+            & (assignations["assignation"].astype(bool) == True)
+        ]
+        print(
+            f"{label} : {time.perf_counter() - start:.2f} s, "
+            f"{len(shifts)} persons on {shifts['date'].nunique()} open shifts"
+        )
@@ -0,0 +1,861 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from planning.days import get_day_idxs, get_days_since, to_dates, to_days, to_months
+from planning.parameters import GapModality, PlanningParameters
+from planning.planning_struct import EventType, Planning
+
+
+class Variable(Enum):
+    # persons x dates
+    SHIFT = 0
+    GAP = 1
+    SCREENING = 2
+    REFERENCE = 3
+    # dates
+    OPEN_SHIFT = 4
+    OPEN_GAP = 5
+
+
+VARIABLES_MATRIX = [
+    Variable.SHIFT,
+    Variable.GAP,
+    Variable.SCREENING,
+    Variable.REFERENCE,
+]
+EVENT_TYPES_ASSIGNABLE = [EventType.SHIFT, EventType.GAP_FRANCO, EventType.SCRENNINGS]
+EVENT_TYPE_TO_VARIABLE = {
+    EventType.SHIFT: Variable.SHIFT,
+    EventType.GAP_FRANCO: Variable.GAP,
+    EventType.SCRENNINGS: Variable.SCREENING,
+}
+
+
+class Sense(Enum):
+    LESS_EQUAL = "<="
+    GREATER_EQUAL = ">="
+
+
+@dataclass
+class RuleContext:
+    """Everything the rules are made of. The dates are days since 1970-01-01
+    (see 'planning.days'), sorted."""
+
+    parameters: PlanningParameters
+    days: np.ndarray
+    months: np.ndarray  # calendar month of each date
+    # event type --> persons x dates which can be assigned
+    possible_assignations: Dict[EventType, np.ndarray]
+    # persons
+    is_new: np.ndarray
+    did_gap_last_month: np.ndarray
+    did_gap_this_month: np.ndarray
+    number_shift_this_month: np.ndarray
+    number_reference_this_month: np.ndarray
+    days_last_shift: np.ndarray  # NO_DAY when unknown
+    # month the state of the persons is about, the one of the first date if None
+    first_month: Optional[int] = None
+
+    @property
+    def number_persons(self) -> int:
+        return len(self.is_new)
+
+    @property
+    def number_dates(self) -> int:
+        return len(self.days)
+
+    def index(
+        self,
+        variable: Variable,
+        person_idxs: Optional[np.ndarray] = None,
+        date_idxs: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Flat index of the variables, persons and dates broadcast together."""
+
+        size_matrix = self.number_persons * self.number_dates
+        if variable in VARIABLES_MATRIX:
+            offset = VARIABLES_MATRIX.index(variable) * size_matrix
+            return offset + np.asarray(person_idxs) * self.number_dates + date_idxs
+        offset = len(VARIABLES_MATRIX) * size_matrix
+        if variable == Variable.OPEN_GAP:
+            offset += self.number_dates
+        return offset + np.asarray(date_idxs)
+
+    def get_month_idxs(self) -> Tuple[np.ndarray, int]:
+        """Month of each date counted from the first one, and the number of months."""
+
+        if self.number_dates == 0:
+            return self.months, 0
+        first_month = self.months[0] if self.first_month is None else self.first_month
+        month_idxs = self.months - first_month
+        return month_idxs, int(month_idxs.max()) + 1
+
+    def subset(self, person_idxs: np.ndarray, date_idxs: np.ndarray) -> "RuleContext":
+        """Context of some persons on some dates (sorted), the months are still
+        counted from the same first month."""
+
+        first_month = self.first_month
+        if first_month is None and self.number_dates > 0:
+            first_month = int(self.months[0])
+        return RuleContext(
+            parameters=self.parameters,
+            days=self.days[date_idxs],
+            months=self.months[date_idxs],
+            possible_assignations={
+                event_type: possible[np.ix_(person_idxs, date_idxs)]
+                for event_type, possible in self.possible_assignations.items()
+            },
+            is_new=self.is_new[person_idxs],
+            did_gap_last_month=self.did_gap_last_month[person_idxs],
+            did_gap_this_month=self.did_gap_this_month[person_idxs],
+            number_shift_this_month=self.number_shift_this_month[person_idxs],
+            number_reference_this_month=self.number_reference_this_month[person_idxs],
+            days_last_shift=self.days_last_shift[person_idxs],
+            first_month=first_month,
+        )
+
+
+@dataclass
+class LinearRows:
+    """Rows 'sum(values * x[cols]) sense bounds' in coordinate format, a row only
+    applies when its activation variable has the activation value."""
+
+    rows: np.ndarray  # row of each term
+    cols: np.ndarray  # flat index of the variable of each term
+    values: np.ndarray  # coefficient of each term
+    sense: Sense
+    bounds: np.ndarray  # one per row
+    person_idxs: np.ndarray  # one per row, -1 when not about a person
+    date_idxs: np.ndarray  # one per row, -1 when not about a date
+    activation_cols: Optional[np.ndarray] = None  # one per row
+    activation_value: int = 1
+
+    @property
+    def number_rows(self) -> int:
+        return len(self.bounds)
+
+
+@dataclass
+class Rule:
+    title: str
+    sub_title: str
+    # formatted with 'person', 'date', 'observed' and 'limit'
+    message: str
+    build: Callable[[RuleContext], LinearRows]
+    # the bounds are this parameter plus a constant
+    parameter: Optional[str] = None
+    # only about the auxiliary variables, nothing to check on assignations
+    checked: bool = True
+    # to increment each time the rows built change, see 'get_rules_version'
+    version: int = 1
+
+
+def cells_rows(
+    context: RuleContext,
+    variable: Variable,
+    cells: np.ndarray,
+    sense: Sense,
+    bound: int,
+) -> LinearRows:
+    """One row per cell of the persons x dates matrix: 'variable[cell] sense bound'."""
+
+    person_idxs, date_idxs = np.nonzero(cells)
+    number_rows = len(person_idxs)
+    return LinearRows(
+        rows=np.arange(number_rows),
+        cols=context.index(variable, person_idxs, date_idxs),
+        values=np.ones(number_rows),
+        sense=sense,
+        bounds=np.full(number_rows, bound),
+        person_idxs=person_idxs,
+        date_idxs=date_idxs,
+    )
+
+
+def dates_rows(
+    context: RuleContext,
+    variable: Variable,
+    sense: Sense,
+    bound: int,
+    activation: Optional[Tuple[Variable, int]] = None,
+) -> LinearRows:
+    """One row per date: 'sum(variable[:, date]) sense bound'."""
+
+    number_persons, number_dates = context.number_persons, context.number_dates
+    person_idxs, date_idxs = np.meshgrid(
+        np.arange(number_persons), np.arange(number_dates), indexing="ij"
+    )
+    activation_variable, activation_value = activation or (None, 1)
+    return LinearRows(
+        rows=date_idxs.ravel(),
+        cols=context.index(variable, person_idxs, date_idxs).ravel(),
+        values=np.ones(number_persons * number_dates),
+        sense=sense,
+        bounds=np.full(number_dates, bound),
+        person_idxs=np.full(number_dates, -1),
+        date_idxs=np.arange(number_dates),
+        activation_cols=(
+            None
+            if activation_variable is None
+            else context.index(activation_variable, date_idxs=np.arange(number_dates))
+        ),
+        activation_value=activation_value,
+    )
+
+
+def months_rows(
+    context: RuleContext,
+    variable: Variable,
+    bound: int,
+    already_done: np.ndarray,
+) -> LinearRows:
+    """One row per person per calendar month: 'sum(variable[person, month]) <=
+    bound', minus what is already done on the first month."""
+
+    number_persons, number_dates = context.number_persons, context.number_dates
+    month_idxs, number_months = context.get_month_idxs()
+    person_idxs, date_idxs = np.meshgrid(
+        np.arange(number_persons), np.arange(number_dates), indexing="ij"
+    )
+    bounds = np.full((number_persons, number_months), bound)
+    if number_months > 0:
+        bounds[:, 0] -= already_done.astype(int)
+    dates_first_idxs = np.searchsorted(month_idxs, np.arange(number_months))
+    return LinearRows(
+        rows=(person_idxs * number_months + month_idxs[date_idxs]).ravel(),
+        cols=context.index(variable, person_idxs, date_idxs).ravel(),
+        values=np.ones(number_persons * number_dates),
+        sense=Sense.LESS_EQUAL,
+        bounds=bounds.ravel(),
+        person_idxs=np.repeat(np.arange(number_persons), number_months),
+        date_idxs=np.tile(dates_first_idxs, number_persons),
+    )
+
+
+def windows_rows(
+    context: RuleContext,
+    windows: List[np.ndarray],
+    variables: List[Tuple[Variable, int]],
+    bounds: np.ndarray,
+    dates_windows: np.ndarray,
+) -> LinearRows:
+    """One row per person per window of dates: 'sum(coefficient * variable[person,
+    window]) <= bound'."""
+
+    number_persons = context.number_persons
+    number_windows = len(windows)
+    window_idxs = np.repeat(np.arange(number_windows), [len(w) for w in windows])
+    date_idxs = np.concatenate(windows) if windows else np.zeros(0, dtype=int)
+
+    rows, cols, values = [], [], []
+    person_idxs = np.arange(number_persons)[:, np.newaxis]
+    for variable, coefficient in variables:
+        rows.append((person_idxs * number_windows + window_idxs).ravel())
+        cols.append(context.index(variable, person_idxs, date_idxs).ravel())
+        values.append(np.full(rows[-1].shape, coefficient))
+    return LinearRows(
+        rows=np.concatenate(rows),
+        cols=np.concatenate(cols),
+        values=np.concatenate(values),
+        sense=Sense.LESS_EQUAL,
+        bounds=np.asarray(bounds).ravel(),
+        person_idxs=np.repeat(np.arange(number_persons), number_windows),
+        date_idxs=np.tile(dates_windows, number_persons),
+    )
+
+
+# -- Availabilities
+
+
+def build_availability(event_type: EventType) -> Callable[[RuleContext], LinearRows]:
+    def build(context: RuleContext) -> LinearRows:
+        return cells_rows(
+            context,
+            EVENT_TYPE_TO_VARIABLE[event_type],
+            ~context.possible_assignations[event_type],
+            Sense.LESS_EQUAL,
+            0,
+        )
+
+    return build
+
+
+def build_closed_events(context: RuleContext) -> LinearRows:
+    # open events without any person who can be on them are closed
+    rows = []
+    for variable, event_type in [
+        (Variable.OPEN_SHIFT, EventType.SHIFT),
+        (Variable.OPEN_GAP, EventType.GAP_FRANCO),
+    ]:
+        date_idxs = np.flatnonzero(
+            ~context.possible_assignations[event_type].any(axis=0)
+        )
+        rows.append((context.index(variable, date_idxs=date_idxs), date_idxs))
+    cols = np.concatenate([cols for cols, _ in rows])
+    return LinearRows(
+        rows=np.arange(len(cols)),
+        cols=cols,
+        values=np.ones(len(cols)),
+        sense=Sense.LESS_EQUAL,
+        bounds=np.zeros(len(cols)),
+        person_idxs=np.full(len(cols), -1),
+        date_idxs=np.concatenate([date_idxs for _, date_idxs in rows]),
+    )
+
+
+# -- Shift rules
+
+
+def build_max_shift_per_month(context: RuleContext) -> LinearRows:
+    return months_rows(
+        context,
+        Variable.SHIFT,
+        context.parameters.max_number_shift_per_month,
+        context.number_shift_this_month,
+    )
+
+
+def build_min_person_per_open_shift(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.SHIFT,
+        Sense.GREATER_EQUAL,
+        context.parameters.min_number_person_per_shift,
+        activation=(Variable.OPEN_SHIFT, 1),
+    )
+
+
+def build_no_person_on_closed_shift(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.SHIFT,
+        Sense.LESS_EQUAL,
+        0,
+        activation=(Variable.OPEN_SHIFT, 0),
+    )
+
+
+def build_days_between_two_shifts(context: RuleContext) -> LinearRows:
+    # windows of dates less than the amount of days apart, without the windows
+    # included in the previous one
+    number_days = context.parameters.min_number_days_between_two_shifts
+    ends = np.searchsorted(context.days, context.days + number_days, side="left")
+    windows, dates_windows = [], []
+    end_previous = 0
+    for date_idx, end in enumerate(ends):
+        if end - date_idx >= 2 and end > end_previous:
+            windows.append(np.arange(date_idx, end))
+            dates_windows.append(date_idx)
+        end_previous = end
+    return windows_rows(
+        context,
+        windows,
+        [(Variable.SHIFT, 1)],
+        np.ones(context.number_persons * len(windows)),
+        np.asarray(dates_windows, dtype=int),
+    )
+
+
+def build_days_since_last_shift(context: RuleContext) -> LinearRows:
+    days_since_last_shift = get_days_since(context.days, context.days_last_shift)
+    return cells_rows(
+        context,
+        Variable.SHIFT,
+        days_since_last_shift < context.parameters.min_number_days_between_two_shifts,
+        Sense.LESS_EQUAL,
+        0,
+    )
+
+
+# -- Reference rules
+
+
+def build_max_reference_per_month(context: RuleContext) -> LinearRows:
+    return months_rows(
+        context,
+        Variable.REFERENCE,
+        context.parameters.max_number_reference_per_person_per_month,
+        context.number_reference_this_month,
+    )
+
+
+def build_no_reference_for_babies(context: RuleContext) -> LinearRows:
+    return cells_rows(
+        context,
+        Variable.REFERENCE,
+        np.repeat(context.is_new[:, np.newaxis], context.number_dates, axis=1),
+        Sense.LESS_EQUAL,
+        0,
+    )
+
+
+def build_max_referent_per_shift(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.REFERENCE,
+        Sense.LESS_EQUAL,
+        context.parameters.exact_number_referent_per_perm,
+    )
+
+
+def build_min_referent_per_open_shift(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.REFERENCE,
+        Sense.GREATER_EQUAL,
+        context.parameters.exact_number_referent_per_perm,
+        activation=(Variable.OPEN_SHIFT, 1),
+    )
+
+
+def build_no_referent_on_closed_shift(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.REFERENCE,
+        Sense.LESS_EQUAL,
+        0,
+        activation=(Variable.OPEN_SHIFT, 0),
+    )
+
+
+def build_referent_on_shift(context: RuleContext) -> LinearRows:
+    # reference - shift <= 0
+    cells = np.ones((context.number_persons, context.number_dates), dtype=bool)
+    rows = cells_rows(context, Variable.REFERENCE, cells, Sense.LESS_EQUAL, 0)
+    person_idxs, date_idxs = rows.person_idxs, rows.date_idxs
+    rows.rows = np.concatenate([rows.rows, rows.rows])
+    rows.cols = np.concatenate(
+        [rows.cols, context.index(Variable.SHIFT, person_idxs, date_idxs)]
+    )
+    rows.values = np.concatenate([rows.values, -rows.values])
+    return rows
+
+
+# -- GAP rules
+
+
+def build_max_gap_per_month(context: RuleContext) -> LinearRows:
+    return months_rows(context, Variable.GAP, 1, context.did_gap_this_month)
+
+
+def build_max_person_in_gap(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.GAP,
+        Sense.LESS_EQUAL,
+        context.parameters.max_number_person_gap,
+    )
+
+
+def build_min_person_in_open_gap(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context,
+        Variable.GAP,
+        Sense.GREATER_EQUAL,
+        context.parameters.min_number_person_gap,
+        activation=(Variable.OPEN_GAP, 1),
+    )
+
+
+def build_no_person_in_closed_gap(context: RuleContext) -> LinearRows:
+    return dates_rows(
+        context, Variable.GAP, Sense.LESS_EQUAL, 0, activation=(Variable.OPEN_GAP, 0)
+    )
+
+
+def build_no_shift_if_no_gap_before(context: RuleContext) -> LinearRows:
+    # shift - sum(gaps before on the month or the previous one) <= 0
+    if context.parameters.gap_modality != GapModality.MONTH:
+        raise ValueError(
+            f"Gap modality '{context.parameters.gap_modality}' not handled."
+        )
+
+    month_idxs, number_months = context.get_month_idxs()
+    number_persons, number_dates = context.number_persons, context.number_dates
+    # gap done before the dates, for the first month and the next one
+    gap_done_before = np.zeros((number_persons, max(number_months, 2)), dtype=bool)
+    gap_done_before[:, 0] = context.did_gap_last_month | context.did_gap_this_month
+    gap_done_before[:, 1] = context.did_gap_this_month
+
+    rows, cols, values = [], [], []
+    person_idxs_rows, date_idxs_rows = [], []
+    number_rows = 0
+    for date_idx in range(number_dates):
+        month_idx = month_idxs[date_idx]
+        person_idxs = np.flatnonzero(~gap_done_before[:, month_idx])
+        gap_date_idxs = np.flatnonzero(month_idxs[:date_idx] >= month_idx - 1)
+        row_idxs = number_rows + np.arange(len(person_idxs))
+        number_rows += len(person_idxs)
+
+        rows += [row_idxs, np.repeat(row_idxs, len(gap_date_idxs))]
+        cols += [
+            context.index(Variable.SHIFT, person_idxs, date_idx),
+            context.index(
+                Variable.GAP, person_idxs[:, np.newaxis], gap_date_idxs
+            ).ravel(),
+        ]
+        values += [
+            np.ones(len(person_idxs)),
+            -np.ones(len(person_idxs) * len(gap_date_idxs)),
+        ]
+        person_idxs_rows.append(person_idxs)
+        date_idxs_rows.append(np.full(len(person_idxs), date_idx))
+
+    return LinearRows(
+        rows=np.concatenate(rows) if rows else np.zeros(0, dtype=int),
+        cols=np.concatenate(cols) if cols else np.zeros(0, dtype=int),
+        values=np.concatenate(values) if values else np.zeros(0),
+        sense=Sense.LESS_EQUAL,
+        bounds=np.zeros(number_rows),
+        person_idxs=(
+            np.concatenate(person_idxs_rows)
+            if person_idxs_rows
+            else np.zeros(0, dtype=int)
+        ),
+        date_idxs=(
+            np.concatenate(date_idxs_rows) if date_idxs_rows else np.zeros(0, dtype=int)
+        ),
+    )
+
+
+RULES: List[Rule] = [
+    # -- Availabilities
+    *[
+        Rule(
+            "availibilities",
+            f"available_{event_type.value}",
+            "'{person}' on '{date}' for the '"
+            + event_type.value
+            + "' is not available but has been assigned to it.",
+            build_availability(event_type),
+        )
+        for event_type in EVENT_TYPE_TO_VARIABLE
+    ],
+    Rule(
+        "availibilities",
+        "closed_events",
+        "On '{date}' an event nobody can be on is open.",
+        build_closed_events,
+        checked=False,
+    ),
+    # -- Shift rules
+    Rule(
+        "shift_rules",
+        "max_shift_per_person_per_month",
+        "'{person}' has too many shift on the month : '{observed}' > '{limit}'",
+        build_max_shift_per_month,
+        parameter="max_number_shift_per_month",
+    ),
+    Rule(
+        "shift_rules",
+        "min_per_shift_open",
+        "On '{date}' the number of person is anormal on the shift : "
+        "0 < '{observed}' < '{limit}'",
+        build_min_person_per_open_shift,
+        parameter="min_number_person_per_shift",
+    ),
+    Rule(
+        "shift_rules",
+        "no_person_on_closed_shift",
+        "On '{date}' the shift is closed but has '{observed}' persons.",
+        build_no_person_on_closed_shift,
+    ),
+    Rule(
+        "shift_rules",
+        "min_days_between_two_shifts",
+        "'{person}' has two shifts too close : '{observed}' shifts in the days "
+        "from '{date}'",
+        build_days_between_two_shifts,
+    ),
+    Rule(
+        "shift_rules",
+        "min_days_since_last_shift",
+        "'{person}' has a shift on '{date}' too close to its last shift.",
+        build_days_since_last_shift,
+    ),
+    # -- Reference rules
+    Rule(
+        "reference_rules",
+        "max_number_reference_per_person_per_month",
+        "'{person}' has too many references : '{observed}' > '{limit}'",
+        build_max_reference_per_month,
+        parameter="max_number_reference_per_person_per_month",
+    ),
+    Rule(
+        "reference_rules",
+        "no_reference_for_babies",
+        "'{person}' is a baby but has a reference on '{date}'.",
+        build_no_reference_for_babies,
+    ),
+    Rule(
+        "reference_rules",
+        "exact_number_referent_per_open_shift",
+        "On '{date}' there are too many referents : '{observed}' > '{limit}'",
+        build_max_referent_per_shift,
+        parameter="exact_number_referent_per_perm",
+    ),
+    Rule(
+        "reference_rules",
+        "exact_number_referent_per_open_shift",
+        "On '{date}' there are too few referents in an open shift : "
+        "'{observed}' < '{limit}'",
+        build_min_referent_per_open_shift,
+        parameter="exact_number_referent_per_perm",
+    ),
+    Rule(
+        "reference_rules",
+        "no_referent_on_closed_shift",
+        "On '{date}' the shift is closed but has '{observed}' referents.",
+        build_no_referent_on_closed_shift,
+    ),
+    Rule(
+        "reference_rules",
+        "referent_on_shift",
+        "'{person}' is referent on '{date}' without being on the shift.",
+        build_referent_on_shift,
+    ),
+    # -- GAP rules
+    Rule(
+        "gap_rules",
+        "max_gap_per_person_per_month",
+        "'{person}' has too many GAPs on the month : '{observed}' > '{limit}'",
+        build_max_gap_per_month,
+    ),
+    Rule(
+        "gap_rules",
+        "max_number_person_in_gap",
+        "On '{date}' there are too many persons on the gap : "
+        "'{observed}' > '{limit}'",
+        build_max_person_in_gap,
+        parameter="max_number_person_gap",
+    ),
+    Rule(
+        "gap_rules",
+        "min_number_person_in_gap",
+        "On '{date}' there are too few persons on the gap : "
+        "'{observed}' < '{limit}'",
+        build_min_person_in_open_gap,
+        parameter="min_number_person_gap",
+    ),
+    Rule(
+        "gap_rules",
+        "no_person_in_closed_gap",
+        "On '{date}' the gap is closed but has '{observed}' persons.",
+        build_no_person_in_closed_gap,
+    ),
+    Rule(
+        "gap_rules",
+        "no_shift_if_no_gap_before",
+        "'{person}' did not do a GAP last month and has a shift on '{date}' "
+        "before its gap",
+        build_no_shift_if_no_gap_before,
+    ),
+]
+
+
+def get_rules_version(rules: List[Rule] = RULES) -> str:
+    """Changes with the names and the versions of the rules."""
+
+    description = [
+        [rule.title, rule.sub_title, rule.parameter, rule.checked, rule.version]
+        for rule in rules
+    ]
+    return hashlib.sha256(json.dumps(description).encode()).hexdigest()[:16]
+
+
+def flatten_variables(variable_to_values: Dict[Variable, np.ndarray]) -> np.ndarray:
+    """All the variables in one array, in the order of 'RuleContext.index'."""
+
+    return np.concatenate(
+        [np.ravel(variable_to_values[variable]) for variable in Variable]
+    )
+
+
+def evaluate_rows(
+    linear_rows: LinearRows, x: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Value of the left hand side of each row and the rows which are violated."""
+
+    observed = np.bincount(
+        linear_rows.rows,
+        weights=linear_rows.values * x[linear_rows.cols],
+        minlength=linear_rows.number_rows,
+    )
+    if linear_rows.sense == Sense.LESS_EQUAL:
+        violated = observed > linear_rows.bounds + 1e-6
+    else:
+        violated = observed < linear_rows.bounds - 1e-6
+    if linear_rows.activation_cols is not None:
+        violated &= x[linear_rows.activation_cols] == linear_rows.activation_value
+    return observed, violated
+
+
+# -- from a planning to the arrays of the rules, and back
+
+
+# optional columns of the persons infos, what was done in the first month before the dates
+PERSONS_STATE_DEFAULTS = {
+    "did_gap_this_month": False,
+    "number_shift_this_month": 0,
+    "number_reference_this_month": 0,
+}
+
+
+def get_persons_state(persons_infos: pd.DataFrame, column: str) -> np.ndarray:
+    if column in persons_infos:
+        return persons_infos[column].to_numpy()
+    return np.full(len(persons_infos), PERSONS_STATE_DEFAULTS[column])
+
+
+def get_persons_index(persons_name: List[str]) -> pd.Index:
+    """Index of the persons, the assignations are found by name."""
+
+    persons_index = pd.Index(persons_name)
+    if not persons_index.is_unique:
+        duplicated = sorted(set(persons_index[persons_index.duplicated()]))
+        raise ValueError(f"Persons named more than once : {duplicated}.")
+    return persons_index
+
+
+def get_person_idxs(persons_index: pd.Index, names: pd.Series) -> np.ndarray:
+    """Index of each of the 'names', KeyError if one of them is unknown."""
+
+    idxs = persons_index.get_indexer(names)
+    if (idxs < 0).any():
+        unknown = sorted(set(np.asarray(names)[idxs < 0]))
+        raise KeyError(f"Persons not in the planning : {unknown}.")
+    return idxs
+
+
+def compute_possible_assignations(
+    planning_availabilities: Planning, days: np.ndarray
+) -> Dict[EventType, np.ndarray]:
+    """For each event type, matrix persons x dates of the cells which can be assigned,
+    the dates being the sorted 'days'."""
+
+    events = planning_availabilities.events
+    persons_infos = planning_availabilities.persons_infos
+    availabilities = planning_availabilities.availabilities
+
+    number_persons = len(persons_infos)
+    event_date_idxs = np.searchsorted(days, to_days(events["date"]))
+    persons_index = get_persons_index(list(persons_infos["name"]))
+    if availabilities is None:
+        availabilities = pd.DataFrame(
+            columns=["person_name", "date", "event_type", "available"]
+        )
+    not_availables = availabilities[~availabilities["available"].astype(bool)]
+
+    possible_assignations = {}
+    for event_type in EVENT_TYPES_ASSIGNABLE:
+        opened = np.zeros(len(days), dtype=bool)
+        opened[event_date_idxs] = events[event_type.value].to_numpy(dtype=bool)
+        possible = np.repeat(opened[np.newaxis, :], number_persons, axis=0)
+
+        not_available = not_availables[not_availables["event_type"] == event_type]
+        person_idxs = get_person_idxs(persons_index, not_available["person_name"])
+        date_idxs = get_day_idxs(days, to_days(not_available["date"]))
+        possible[person_idxs, date_idxs] = False
+
+        possible_assignations[event_type] = possible
+
+    return possible_assignations
+
+
+def build_rule_context(
+    planning_availabilities: Planning, parameters: PlanningParameters
+) -> RuleContext:
+    events = planning_availabilities.events
+    persons_infos = planning_availabilities.persons_infos
+
+    # the dates are converted once, everything after works on days
+    days = np.sort(to_days(events["date"]))
+    return RuleContext(
+        parameters=parameters,
+        days=days,
+        months=to_months(days),
+        possible_assignations=compute_possible_assignations(
+            planning_availabilities, days
+        ),
+        is_new=persons_infos["is_new"].to_numpy(dtype=bool),
+        did_gap_last_month=persons_infos["did_gap_last_month"].to_numpy(dtype=bool),
+        did_gap_this_month=get_persons_state(
+            persons_infos, "did_gap_this_month"
+        ).astype(bool),
+        number_shift_this_month=get_persons_state(
+            persons_infos, "number_shift_this_month"
+        ).astype(int),
+        number_reference_this_month=get_persons_state(
+            persons_infos, "number_reference_this_month"
+        ).astype(int),
+        # the sheets may hold anything else than a date
+        days_last_shift=to_days(persons_infos["date_last_shift"]),
+    )
+
+
+def from_assignations(
+    days: np.ndarray, persons_name: List[str], assignations: pd.DataFrame
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray]:
+    """Inverse of 'to_assignations'. Only the event types the solver assigns are
+    handled, the assignations on the others are rejected."""
+
+    number_persons, number_dates = len(persons_name), len(days)
+    persons_index = get_persons_index(persons_name)
+    assigned = assignations[assignations["assignation"].astype(bool) == True]
+    not_handled = set(assigned["event_type"]) - set(EVENT_TYPES_ASSIGNABLE)
+    if not_handled:
+        raise ValueError(
+            "Assignations on event types not handled : "
+            f"{sorted(event_type.value for event_type in not_handled)}."
+        )
+    person_idxs = get_person_idxs(persons_index, assigned["person_name"])
+    date_idxs = get_day_idxs(days, to_days(assigned["date"]))
+
+    event_type_to_values = {}
+    for event_type in EVENT_TYPES_ASSIGNABLE:
+        values = np.zeros((number_persons, number_dates), dtype=bool)
+        is_event_type = (assigned["event_type"] == event_type).to_numpy()
+        values[person_idxs[is_event_type], date_idxs[is_event_type]] = True
+        event_type_to_values[event_type] = values
+
+    references_values = np.zeros((number_persons, number_dates), dtype=bool)
+    is_reference = (assigned["assignation"] == "ref").to_numpy()
+    references_values[person_idxs[is_reference], date_idxs[is_reference]] = True
+    return event_type_to_values, references_values
+
+
+def to_assignations(
+    days: np.ndarray,
+    persons_name: List[str],
+    event_type_to_values: Dict[EventType, np.ndarray],
+    references_values: np.ndarray,
+) -> pd.DataFrame:
+    number_persons, number_dates = len(persons_name), len(days)
+    # back to dates, the assignations are shown or written
+    dates = to_dates(days)
+
+    assignations = []
+    for event_type, values in event_type_to_values.items():
+        assignation = values.astype(object)
+        if event_type == EventType.SHIFT:
+            # erase the True by "ref"
+            assignation[references_values] = "ref"
+
+        assignations.append(
+            pd.DataFrame(
+                {
+                    "person_name": np.repeat(persons_name, number_dates),
+                    "date": np.tile(dates, number_persons),
+                    "event_type": [event_type] * (number_persons * number_dates),
+                    "assignation": assignation.ravel(),
+                }
+            )
+        )
+
+    return pd.concat(assignations, ignore_index=True)
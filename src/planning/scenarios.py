@@ -0,0 +1,190 @@
+import dataclasses
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from planning.days import to_days
+from planning.parameters import PlanningParameters
+from planning.planning_struct import Planning
+from planning.rules import RULES, to_assignations
+from planning.solver import (
+    PlanningModel,
+    build_planning_model,
+    get_assignations_values,
+    solve_model,
+)
+
+# parameters only used as a right hand side, they can change without rebuilding
+PARAMETERS_SCENARIO = sorted({rule.parameter for rule in RULES if rule.parameter})
+
+
+@dataclass
+class Scenario:
+    label: str
+    persons_out: List[str] = field(default_factory=list)  # not assigned at all
+    dates_closed: List[datetime] = field(default_factory=list)  # shift closed
+    parameters: Dict[str, int] = field(default_factory=dict)  # name --> new value
+
+
+@dataclass
+class ScenarioResult:
+    scenario: Scenario
+    planning: Planning
+    # assignations which differ from the baseline
+    diff: pd.DataFrame
+
+
+def get_variables(variables: np.ndarray) -> List[pulp.LpVariable]:
+    # sparse matrices hold 0 where there is no variable
+    return [v for v in np.ravel(variables) if isinstance(v, pulp.LpVariable)]
+
+
+def diff_assignations(
+    baseline: pd.DataFrame, assignations: pd.DataFrame
+) -> pd.DataFrame:
+    """Both assignations come from the same model, so they have the same rows."""
+
+    different = baseline["assignation"].map(str) != assignations["assignation"].map(str)
+    diff = baseline[different][["person_name", "date", "event_type"]].copy()
+    diff["baseline"] = baseline["assignation"][different]
+    diff["scenario"] = assignations["assignation"][different]
+    return diff.reset_index(drop=True)
+
+
+class ScenarioPlanner:
+    """Build and solve the model once, then solve variants of it warm started from
+    the baseline solution."""
+
+    def __init__(
+        self,
+        planning_availabilities: Planning,
+        parameters: PlanningParameters,
+        low_memory: bool = False,
+    ):
+        self.planning_availabilities = planning_availabilities
+        self.parameters = parameters
+        self.model: PlanningModel = build_planning_model(
+            planning_availabilities, parameters, low_memory
+        )
+        self.variables = get_variables(self.model.solver.variables())
+
+        self.baseline = self.to_planning(solve_model(self.model, verbose=False))
+        self.baseline_values = {v.name: v.varValue for v in self.variables}
+
+    def to_planning(self, solve_stats) -> Planning:
+        event_type_to_values, references_values = get_assignations_values(self.model)
+        return Planning(
+            events=self.planning_availabilities.events,
+            persons_infos=self.planning_availabilities.persons_infos,
+            availabilities=self.planning_availabilities.availabilities,
+            assignations=to_assignations(
+                self.model.days,
+                self.model.persons_name,
+                event_type_to_values,
+                references_values,
+            ),
+            solve_stats=solve_stats,
+        )
+
+    def get_person_variables(self, person_name: str) -> List[pulp.LpVariable]:
+        model = self.model
+        if person_name not in model.persons_name:
+            raise ValueError(f"Unknown person : {person_name}")
+        person_idx = model.persons_name.index(person_name)
+        matrices = [model.references] + [
+            variables
+            for variables in model.event_type_to_variables.values()
+            if variables is not None
+        ]
+        return [v for matrix in matrices for v in get_variables(matrix[person_idx])]
+
+    def get_date_variables(self, date: datetime) -> List[pulp.LpVariable]:
+        date_idxs = np.flatnonzero(self.model.days == to_days([date])[0])
+        if len(date_idxs) == 0:
+            raise ValueError(f"Unknown date : {date}")
+        return get_variables(self.model.open_shifts[date_idxs])
+
+    def get_parameter_constraints(self, parameter_name: str) -> List[pulp.LpConstraint]:
+        if parameter_name not in PARAMETERS_SCENARIO:
+            raise ValueError(
+                f"Parameter '{parameter_name}' changes the structure of the model, "
+                "rebuild it with 'build_planning_model'."
+            )
+        return self.model.parameters_constraints.get(parameter_name, [])
+
+    def solve_scenario(self, scenario: Scenario) -> ScenarioResult:
+        # fixed to 0 with their upper bound
+        variables_fixed = [
+            v
+            for person_name in scenario.persons_out
+            for v in self.get_person_variables(person_name)
+        ] + [v for date in scenario.dates_closed for v in self.get_date_variables(date)]
+        # shift of the right hand side of each constraint
+        constraints_shifted = [
+            (constraint, value - getattr(self.parameters, parameter_name))
+            for parameter_name, value in scenario.parameters.items()
+            for constraint in self.get_parameter_constraints(parameter_name)
+        ]
+
+        up_bounds = [v.upBound for v in variables_fixed]
+        try:
+            # warm start from the baseline, as close to feasible as it can be
+            for v in self.variables:
+                v.setInitialValue(self.baseline_values[v.name])
+            for v in variables_fixed:
+                v.setInitialValue(0)
+                v.upBound = 0
+            for constraint, delta in constraints_shifted:
+                # 'expr >= rhs' is stored as 'expr - rhs >= 0'
+                constraint.constant -= delta
+
+            solve_stats = solve_model(self.model, warm_start=True, verbose=False)
+            planning = self.to_planning(solve_stats)
+        finally:
+            for v, up_bound in zip(variables_fixed, up_bounds):
+                v.upBound = up_bound
+            for constraint, delta in constraints_shifted:
+                constraint.constant += delta
+
+        return ScenarioResult(
+            scenario=scenario,
+            planning=planning,
+            diff=diff_assignations(self.baseline.assignations, planning.assignations),
+        )
+
+    def solve_scenarios(self, scenarios: List[Scenario]) -> List[ScenarioResult]:
+        return [self.solve_scenario(scenario) for scenario in scenarios]
+
+    def parameters_of(self, scenario: Scenario) -> PlanningParameters:
+        """Parameters as if the model had been built for the scenario."""
+
+        return dataclasses.replace(self.parameters, **scenario.parameters)
+
+
+if __name__ == "__main__":
+    import time
+
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    planning = generate_planning(number_persons=100)
+    start = time.perf_counter()
+    planner = ScenarioPlanner(planning, DEFAULT_PARAMETERS, low_memory=True)
+    print(f"baseline : {time.perf_counter() - start:.2f} s")
+
+    scenarios = [
+        Scenario("person_0 out", persons_out=["person_0"]),
+        Scenario("first date closed", dates_closed=[datetime(2025, 5, 1)]),
+        Scenario("2 persons per shift", parameters={"min_number_person_per_shift": 2}),
+    ]
+    for scenario in scenarios:
+        start = time.perf_counter()
+        result = planner.solve_scenario(scenario)
+        print(
+            f"{scenario.label} : {time.perf_counter() - start:.2f} s, "
+            f"{len(result.diff)} assignations changed"
+        )
@@ -0,0 +1,415 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from planning.days import get_day_idxs, to_dates, to_days, to_months
+from planning.parameters import PlanningParameters
+from planning.planning_struct import EventType, Language, Planning, SolveStats
+from planning.rules import (
+    EVENT_TYPES_ASSIGNABLE,
+    PERSONS_STATE_DEFAULTS,
+    RuleContext,
+    get_person_idxs,
+    get_persons_index,
+    get_persons_state,
+    to_assignations,
+)
+from planning.solver import (
+    build_planning_model_from_context,
+    get_assignations_values,
+    solve_model,
+)
+
+EVENT_TYPES = list(EventType)
+LANGUAGES = list(Language)
+
+# codes of the availabilities
+NO_AVAILABILITY = -1  # no line in the sheets
+NOT_AVAILABLE = 0
+AVAILABLE = 1
+
+ALIGNMENT = 64  # bytes
+
+
+@dataclass
+class ArraySpec:
+    dtype: str
+    shape: Tuple[int, ...]
+    offset: int  # bytes from the start of the buffer
+
+
+@dataclass
+class SharedPlanningHandle:
+    """All a process needs to attach to a shared planning, small to pickle."""
+
+    layout: Dict[str, ArraySpec]
+    size: int  # bytes
+    persons_columns: List[str]  # state columns of the persons infos
+    shm_name: Optional[str] = None
+    path: Optional[str] = None  # memory mapped file
+
+
+def encode_planning(planning: Planning) -> Dict[str, np.ndarray]:
+    """Fixed width columns of the planning: persons, dates and event types are
+    integer coded. The comments and the dates of last shift which are not dates
+    are dropped."""
+
+    events = planning.events
+    persons_infos = planning.persons_infos
+    availabilities = planning.availabilities
+
+    days = np.sort(to_days(events["date"]))
+    event_date_idxs = np.searchsorted(days, to_days(events["date"]))
+    names = persons_infos["name"].astype(str).tolist()
+    names_bytes = [name.encode() for name in names]
+
+    def encode_optional_int(column: str) -> np.ndarray:
+        values = pd.to_numeric(persons_infos[column], errors="coerce")
+        return values.fillna(-1).to_numpy(dtype=np.int16)
+
+    arrays = {
+        "days": days,
+        "events": np.zeros((len(EVENT_TYPES), len(days)), dtype=bool),
+        "names_bytes": np.frombuffer(b"".join(names_bytes), dtype=np.uint8),
+        "names_offsets": np.cumsum([0] + [len(name) for name in names_bytes]),
+        "is_new": persons_infos["is_new"].to_numpy(dtype=bool),
+        "agree_to_be_referent": persons_infos["agree_to_be_referent"].to_numpy(
+            dtype=bool
+        ),
+        "did_gap_last_month": persons_infos["did_gap_last_month"].to_numpy(dtype=bool),
+        "language": np.array(
+            [
+                LANGUAGES.index(language) if language in LANGUAGES else -1
+                for language in persons_infos["language"]
+            ],
+            dtype=np.int8,
+        ),
+        "number_shift_wanted": encode_optional_int("number_shift_wanted"),
+        "day_last_shift": to_days(persons_infos["date_last_shift"]),
+    }
+    for event_type_idx, event_type in enumerate(EVENT_TYPES):
+        arrays["events"][event_type_idx, event_date_idxs] = events[
+            event_type.value
+        ].to_numpy(dtype=bool)
+    for column in PERSONS_STATE_DEFAULTS:
+        arrays[column] = get_persons_state(persons_infos, column).astype(
+            bool if column == "did_gap_this_month" else np.int16
+        )
+
+    # event types x persons x dates
+    codes = np.full(
+        (len(EVENT_TYPES), len(names), len(days)), NO_AVAILABILITY, dtype=np.int8
+    )
+    if availabilities is not None and len(availabilities) > 0:
+        event_type_idxs = availabilities["event_type"].map(EVENT_TYPES.index)
+        person_idxs = get_person_idxs(
+            get_persons_index(names), availabilities["person_name"]
+        )
+        date_idxs = get_day_idxs(days, to_days(availabilities["date"]))
+        codes[event_type_idxs.to_numpy(dtype=int), person_idxs, date_idxs] = np.where(
+            availabilities["available"].astype(bool), AVAILABLE, NOT_AVAILABLE
+        )
+    arrays["availabilities"] = codes
+
+    return arrays
+
+
+def compute_layout(arrays: Dict[str, np.ndarray]) -> Tuple[Dict[str, ArraySpec], int]:
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = ArraySpec(array.dtype.str, array.shape, offset)
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    return layout, max(offset, 1)
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    # the owner takes care of the lifetime of the block, not the attached processes
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13 attaching also registers the block to be unlinked
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SharedPlanning:
+    """Columns of a planning in one shared memory block or memory mapped file,
+    the arrays are views on it without any copy."""
+
+    def __init__(
+        self,
+        handle: SharedPlanningHandle,
+        shm: Optional[shared_memory.SharedMemory] = None,
+        mmap: Optional[np.memmap] = None,
+        owner: bool = False,
+    ):
+        self.handle = handle
+        self.shm = shm
+        self.mmap = mmap
+        self.owner = owner
+        buffer = shm.buf if shm is not None else mmap
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.ndarray(
+                spec.shape, dtype=spec.dtype, buffer=buffer, offset=spec.offset
+            )
+            for name, spec in handle.layout.items()
+        }
+
+    @classmethod
+    def create(
+        cls, planning: Planning, path: Optional[Path] = None
+    ) -> "SharedPlanning":
+        """Copy the planning in a new shared memory block, or in the file 'path'."""
+
+        arrays = encode_planning(planning)
+        layout, size = compute_layout(arrays)
+        persons_columns = [
+            column
+            for column in PERSONS_STATE_DEFAULTS
+            if column in planning.persons_infos
+        ]
+        if path is None:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+            handle = SharedPlanningHandle(layout, size, persons_columns, shm.name)
+            shared = cls(handle, shm=shm, owner=True)
+        else:
+            mmap = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+            handle = SharedPlanningHandle(layout, size, persons_columns, path=str(path))
+            shared = cls(handle, mmap=mmap, owner=True)
+
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        if shared.mmap is not None:
+            shared.mmap.flush()
+        return shared
+
+    @classmethod
+    def attach(cls, handle: SharedPlanningHandle) -> "SharedPlanning":
+        if handle.shm_name is not None:
+            return cls(handle, shm=attach_shared_memory(handle.shm_name))
+        mmap = np.memmap(handle.path, dtype=np.uint8, mode="r", shape=(handle.size,))
+        return cls(handle, mmap=mmap)
+
+    def close(self) -> None:
+        # the views must be gone before closing the block
+        self.arrays = {}
+        if self.shm is not None:
+            self.shm.close()
+            if self.owner:
+                # the processes attached before python 3.13 share the resource
+                # tracker of the owner and unregistered the block from it, 'unlink'
+                # unregisters it once more
+                resource_tracker.register(self.shm._name, "shared_memory")
+                self.shm.unlink()
+        self.mmap = None
+
+    def __enter__(self) -> "SharedPlanning":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def days(self) -> np.ndarray:
+        return self.arrays["days"]
+
+    @property
+    def persons_name(self) -> List[str]:
+        names_bytes = self.arrays["names_bytes"].tobytes()
+        offsets = self.arrays["names_offsets"]
+        return [
+            names_bytes[start:end].decode()
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+    def get_possible_assignations(self) -> Dict[EventType, np.ndarray]:
+        """Same as 'compute_possible_assignations' on the decoded planning."""
+
+        events = self.arrays["events"]
+        codes = self.arrays["availabilities"]
+        return {
+            event_type: events[EVENT_TYPES.index(event_type)][np.newaxis, :]
+            & (codes[EVENT_TYPES.index(event_type)] != NOT_AVAILABLE)
+            for event_type in EVENT_TYPES_ASSIGNABLE
+        }
+
+    def to_rule_context(self, parameters: PlanningParameters) -> RuleContext:
+        """Context of the rules without building the dataframes."""
+
+        arrays = self.arrays
+        return RuleContext(
+            parameters=parameters,
+            days=self.days,
+            months=to_months(self.days),
+            possible_assignations=self.get_possible_assignations(),
+            is_new=arrays["is_new"],
+            did_gap_last_month=arrays["did_gap_last_month"],
+            did_gap_this_month=arrays["did_gap_this_month"],
+            number_shift_this_month=arrays["number_shift_this_month"],
+            number_reference_this_month=arrays["number_reference_this_month"],
+            days_last_shift=arrays["day_last_shift"],
+        )
+
+    def to_planning(self) -> Planning:
+        arrays = self.arrays
+        dates = pd.DatetimeIndex(to_dates(self.days))
+        persons_name = self.persons_name
+
+        events = pd.DataFrame({"date": dates})
+        for event_type, opened in zip(EVENT_TYPES, arrays["events"]):
+            events[event_type.value] = opened
+
+        date_last_shift = pd.DatetimeIndex(to_dates(arrays["day_last_shift"]))
+        persons_infos = pd.DataFrame(
+            {
+                "name": persons_name,
+                "is_new": arrays["is_new"],
+                "number_shift_wanted": [
+                    None if n < 0 else int(n) for n in arrays["number_shift_wanted"]
+                ],
+                "agree_to_be_referent": arrays["agree_to_be_referent"],
+                "date_last_shift": [
+                    None if pd.isna(date) else date.to_pydatetime()
+                    for date in date_last_shift
+                ],
+                "language": [
+                    None if idx < 0 else LANGUAGES[idx] for idx in arrays["language"]
+                ],
+                "did_gap_last_month": arrays["did_gap_last_month"],
+                "comments": None,
+            }
+        )
+        for column in self.handle.persons_columns:
+            persons_infos[column] = arrays[column]
+
+        codes = arrays["availabilities"]
+        event_type_idxs, person_idxs, date_idxs = np.nonzero(codes != NO_AVAILABILITY)
+        availabilities = pd.DataFrame(
+            {
+                "person_name": np.asarray(persons_name, dtype=object)[person_idxs],
+                "date": dates[date_idxs],
+                "event_type": np.asarray(EVENT_TYPES, dtype=object)[event_type_idxs],
+                "available": codes[event_type_idxs, person_idxs, date_idxs]
+                == AVAILABLE,
+            }
+        )
+
+        return Planning(
+            events=events, persons_infos=persons_infos, availabilities=availabilities
+        )
+
+
+def solve_shared(
+    shared: SharedPlanning, parameters: PlanningParameters, **solve_kwargs
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray, SolveStats]:
+    """Solve without building the dataframes, the compact values are returned."""
+
+    model = build_planning_model_from_context(
+        shared.to_rule_context(parameters),
+        shared.persons_name,
+        solve_kwargs.pop("low_memory", False),
+    )
+    solve_stats = solve_model(model, verbose=False, **solve_kwargs)
+    event_type_to_values, references_values = get_assignations_values(model)
+    return event_type_to_values, references_values, solve_stats
+
+
+# shared planning of a worker of 'solve_parameters_sweep'
+worker_shared: Optional[SharedPlanning] = None
+
+
+def init_worker(handle: SharedPlanningHandle) -> None:
+    global worker_shared
+    worker_shared = SharedPlanning.attach(handle)
+
+
+def solve_worker(
+    parameters: PlanningParameters, low_memory: bool
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray, SolveStats]:
+    return solve_shared(worker_shared, parameters, low_memory=low_memory)
+
+
+def solve_parameters_sweep(
+    planning_availabilities: Planning,
+    parameters_sweep: List[PlanningParameters],
+    max_workers: Optional[int] = None,
+    low_memory: bool = True,
+) -> List[Planning]:
+    """Solve the planning for each parameters in a pool of processes, the
+    planning is shared once instead of being sent with each task."""
+
+    mp_context = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    )
+    with SharedPlanning.create(planning_availabilities) as shared:
+        # copied, the shared memory is released before the plannings are built
+        days = shared.days.copy()
+        persons_name = shared.persons_name
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=mp_context,
+            initializer=init_worker,
+            initargs=(shared.handle,),
+        ) as executor:
+            results = list(
+                executor.map(
+                    solve_worker,
+                    parameters_sweep,
+                    [low_memory] * len(parameters_sweep),
+                )
+            )
+
+    return [
+        Planning(
+            events=planning_availabilities.events,
+            persons_infos=planning_availabilities.persons_infos,
+            availabilities=planning_availabilities.availabilities,
+            assignations=to_assignations(
+                days, persons_name, event_type_to_values, references_values
+            ),
+            solve_stats=solve_stats,
+        )
+        for event_type_to_values, references_values, solve_stats in results
+    ]
+
+
+if __name__ == "__main__":
+    import dataclasses
+    import pickle
+    import time
+
+    from planning.generator import generate_planning
+    from planning.parameters import DEFAULT_PARAMETERS
+
+    planning = generate_planning(number_persons=1000)
+    start = time.perf_counter()
+    size_pickle = len(pickle.dumps(planning))
+    print(
+        f"pickle : {size_pickle / 2**20:.1f} MiB, {time.perf_counter() - start:.3f} s"
+    )
+
+    with SharedPlanning.create(planning) as shared:
+        size_handle = len(pickle.dumps(shared.handle))
+        start = time.perf_counter()
+        attached = SharedPlanning.attach(pickle.loads(pickle.dumps(shared.handle)))
+        print(
+            f"shared : {shared.handle.size / 2**20:.1f} MiB, handle {size_handle} B, "
+            f"attach {time.perf_counter() - start:.4f} s"
+        )
+        attached.close()
+
+    parameters_sweep = [
+        dataclasses.replace(DEFAULT_PARAMETERS, min_number_person_per_shift=n)
+        for n in [2, 3, 4]
+    ]
+    start = time.perf_counter()
+    for pl_assign in solve_parameters_sweep(planning, parameters_sweep):
+        print(pl_assign.solve_stats)
+    print(f"sweep : {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,122 @@
+import dataclasses
+import gzip
+import hashlib
+import json
+import os
+import pickle
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from planning.parameters import PlanningParameters
+from planning.planning_struct import Planning, SolveStats
+
+PATH_CACHE = Path.home() / ".cache" / "planning" / "solutions"
+MAX_SIZE_CACHE = 256 * 2**20  # bytes
+
+TYPE_CACHED_SOLUTION = Tuple[pd.DataFrame, SolveStats]
+
+
+def canonical_value(value: Any) -> str:
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}"
+    if isinstance(value, (datetime, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "None"
+    return repr(value.item() if isinstance(value, np.generic) else value)
+
+
+def hash_dataframe(df: pd.DataFrame, sort_rows: bool) -> bytes:
+    df = df[sorted(df.columns)].map(canonical_value)
+    if sort_rows:
+        df = df.sort_values(list(df.columns))
+    header = json.dumps(list(df.columns)).encode()
+    return header + pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+
+
+def compute_key(
+    planning: Planning,
+    parameters: PlanningParameters,
+    solver_version: str,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Hash of the solver inputs, independent of the events and availabilities order.
+    The 'options' are the arguments of the solve changing its result, the
+    dataframes among them are hashed like the planning."""
+
+    h = hashlib.sha256()
+    h.update(hash_dataframe(planning.events, sort_rows=True))
+    # the order of the persons is the order of the assignations
+    h.update(hash_dataframe(planning.persons_infos, sort_rows=False))
+    if planning.availabilities is not None:
+        h.update(hash_dataframe(planning.availabilities, sort_rows=True))
+    h.update(
+        json.dumps(
+            dataclasses.asdict(parameters), sort_keys=True, default=canonical_value
+        ).encode()
+    )
+    h.update(solver_version.encode())
+    for name, value in sorted((options or {}).items()):
+        h.update(name.encode())
+        if isinstance(value, pd.DataFrame):
+            h.update(hash_dataframe(value, sort_rows=True))
+        else:
+            h.update(json.dumps(value, default=canonical_value).encode())
+    return h.hexdigest()
+
+
+class SolutionCache:
+    """Solutions on disk, the least recently used are removed above 'max_size' bytes."""
+
+    def __init__(self, path: Path = PATH_CACHE, max_size: int = MAX_SIZE_CACHE):
+        self.path = path
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, key: str) -> Path:
+        return self.path / f"{key}.pkl.gz"
+
+    def get(self, key: str) -> Optional[TYPE_CACHED_SOLUTION]:
+        path = self.get_path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                assignations, solve_stats = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # truncated, or pickled with classes which changed since
+            path.unlink(missing_ok=True)
+            return None
+
+        # mark as recently used
+        os.utime(path)
+        return assignations, solve_stats
+
+    def put(
+        self, key: str, assignations: pd.DataFrame, solve_stats: SolveStats
+    ) -> None:
+        path = self.get_path(key)
+        path_tmp = path.with_name(f"{key}.tmp{os.getpid()}")
+        with gzip.open(path_tmp, "wb") as f:
+            pickle.dump((assignations, solve_stats), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = [(path, path.stat()) for path in self.path.glob("*.pkl.gz")]
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+
+    def clear(self) -> None:
+        for path in self.path.glob("*.pkl.gz"):
+            path.unlink(missing_ok=True)
@@ -1,13 +1,35 @@
-from datetime import datetime
+import dataclasses
+import time
+from collections import defaultdict
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Union
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import pulp
 
-from planning.parameters import GapModality, GoalModality, PlanningParameters
-from planning.planning_struct import EventType, Language, Planning
+from planning.parameters import GoalModality, PlanningParameters
+from planning.planning_struct import EventType, Language, Planning, SolveStats
+from planning.rules import (
+    RULES,
+    VARIABLES_MATRIX,
+    Rule,
+    RuleContext,
+    Sense,
+    Variable,
+    build_rule_context,
+    flatten_variables,
+    from_assignations,
+    get_rules_version,
+    to_assignations,
+)
+from planning.solution_cache import SolutionCache, compute_key
+
+# to change when the variables or the objective change, the rules have their own
+# versions; invalidates the cached solutions and the golden assignations
+MODEL_VERSION = 3
+SOLVER_VERSION = f"{MODEL_VERSION}-{get_rules_version()}"
 
 
 class SolverStatus(Enum):
@@ -16,6 +38,27 @@ class SolverStatus(Enum):
     SUCESS = 1
 
 
+class NoSolutionFound(RuntimeError):
+    """The time limit is reached before any planning is found."""
+
+
+# statuses of a solve, from the best to the worst
+STATUSES = ["Optimal", "Feasible", "Not Solved", "Undefined", "Infeasible", "Unbounded"]
+
+
+def combine_statuses(statuses: List[str]) -> str:
+    """Status of a planning solved in parts, the worst status of the parts."""
+
+    return max(statuses, key=STATUSES.index, default=STATUSES[0])
+
+
+# big M of the disjunctive constraints, also the max number of persons on an event
+BIG_NUMBER = 100
+
+# the primary goal is worth more than any value of the secondary goal
+WEIGHT_PRIMARY_GOAL = 1000
+
+
 def define_variables_array(label: str, n: int) -> np.ndarray:
     return np.array(
         [pulp.LpVariable(f"{label}_{idx}", cat=pulp.LpBinary) for idx in range(n)]
@@ -34,40 +77,307 @@ def define_variables_matrix(label: str, nrows: int, ncols: int) -> np.ndarray:
     )
 
 
-def solve_planning(
+def define_variables_sparse_array(label: str, mask: np.ndarray) -> np.ndarray:
+    variables = np.zeros(mask.shape, dtype=object)
+    for idx in np.flatnonzero(mask):
+        variables[idx] = pulp.LpVariable(f"{label}{idx}", cat=pulp.LpBinary)
+    return variables
+
+
+def define_variables_sparse_matrix(label: str, mask: np.ndarray) -> np.ndarray:
+    # no variable (constant 0) where the mask is False
+    variables = np.zeros(mask.shape, dtype=object)
+    for row_idx, col_idx in zip(*np.nonzero(mask)):
+        variables[row_idx, col_idx] = pulp.LpVariable(
+            f"{label}{row_idx}_{col_idx}", cat=pulp.LpBinary
+        )
+    return variables
+
+
+@dataclass
+class PlanningModel:
+    solver: pulp.LpProblem
+    days: np.ndarray
+    persons_name: List[str]
+    event_type_to_variables: Dict[EventType, Optional[np.ndarray]]
+    references: np.ndarray
+    open_shifts: np.ndarray
+    open_gaps: np.ndarray
+    goals: Tuple[pulp.LpAffineExpression, pulp.LpAffineExpression]  # by priority
+    # constraints with a right hand side equal to the parameter plus a constant
+    parameters_constraints: Dict[str, List[pulp.LpConstraint]]
+
+
+def order_goals(
+    goal_modality: GoalModality,
+    number_open_shift: pulp.LpAffineExpression,
+    number_person_shift: pulp.LpAffineExpression,
+) -> Tuple[pulp.LpAffineExpression, pulp.LpAffineExpression]:
+    if goal_modality == GoalModality.OPEN_SHIFT_PRIORITY:
+        return number_open_shift, number_person_shift
+    elif goal_modality == GoalModality.NUMBER_PERSON_SHIFT_PRIORITY:
+        return number_person_shift, number_open_shift
+    else:
+        raise ValueError(f"Goal modality '{goal_modality}' not handled.")
+
+
+def compute_objective(goal_modality: GoalModality, shifts_values: np.ndarray) -> int:
+    """Objective of the model from the shifts assigned, persons x dates."""
+
+    goals = order_goals(
+        goal_modality, int(shifts_values.any(axis=0).sum()), int(shifts_values.sum())
+    )
+    return goals[0] * WEIGHT_PRIMARY_GOAL + goals[1]
+
+
+@dataclass
+class SparseModel:
+    """Model independent of the solver: maximize 'objective . x', x binary and
+    lower than 'upper_bounds', under the rows in compressed sparse row format.
+    The variables are flat, see 'RuleContext.index'."""
+
+    upper_bounds: np.ndarray  # 0 where there is no variable
+    objective: np.ndarray
+    starts: np.ndarray  # the terms of the row i are 'starts[i]:starts[i + 1]'
+    cols: np.ndarray
+    values: np.ndarray
+    less_equal: np.ndarray  # sense of each row, else greater or equal
+    bounds: np.ndarray
+    # variable of each row activating it with a big M, its last term, -1 if none
+    activation_cols: np.ndarray
+    activation_values: np.ndarray  # value of the variable which activates the row
+    # parameter --> rows with a bound equal to the parameter plus a constant
+    parameters_rows: Dict[str, np.ndarray]
+
+    @property
+    def number_variables(self) -> int:
+        return len(self.upper_bounds)
+
+    @property
+    def number_rows(self) -> int:
+        return len(self.bounds)
+
+
+def get_variables_masks(
+    context: RuleContext, low_memory: bool = False
+) -> Dict[Variable, np.ndarray]:
+    """Where there is a variable, in low memory mode only for the cells which can
+    be assigned."""
+
+    number_persons, number_dates = context.number_persons, context.number_dates
+    if not low_memory:
+        return {
+            variable: np.ones(
+                (
+                    (number_persons, number_dates)
+                    if variable in VARIABLES_MATRIX
+                    else number_dates
+                ),
+                dtype=bool,
+            )
+            for variable in Variable
+        }
+
+    possible_assignations = context.possible_assignations
+    possible_shifts = possible_assignations[EventType.SHIFT]
+    possible_gaps = possible_assignations[EventType.GAP_FRANCO]
+    return {
+        Variable.SHIFT: possible_shifts,
+        Variable.GAP: possible_gaps,
+        Variable.SCREENING: possible_assignations[EventType.SCRENNINGS],
+        Variable.REFERENCE: possible_shifts & ~context.is_new[:, np.newaxis],
+        Variable.OPEN_SHIFT: possible_shifts.any(axis=0),
+        Variable.OPEN_GAP: possible_gaps.any(axis=0),
+    }
+
+
+def build_sparse_model(
+    context: RuleContext, low_memory: bool = False, rules: List[Rule] = RULES
+) -> SparseModel:
+    """Compile the rows of the rules, with a big M for the activations. Terms on
+    missing variables are dropped and rows which always hold are skipped, unless
+    their bound is a parameter (the scenarios may change it)."""
+
+    exists = flatten_variables(get_variables_masks(context, low_memory))
+
+    rows_number_terms, rows_cols, rows_values = [], [], []
+    rows_less_equal, rows_bounds = [], []
+    rows_activation_cols, rows_activation_values = [], []
+    parameters_rows: Dict[str, List[np.ndarray]] = defaultdict(list)
+    number_rows = 0
+    for rule in rules:
+        linear_rows = rule.build(context)
+        rows, cols, values = linear_rows.rows, linear_rows.cols, linear_rows.values
+        bounds = linear_rows.bounds.astype(float)
+        sign = 1 if linear_rows.sense == Sense.LESS_EQUAL else -1
+
+        # the activation of a row with a big M, kept for the solvers with indicator
+        # constraints unless the variable is missing (always 0, the term is dropped)
+        activation_cols = np.full(linear_rows.number_rows, -1)
+        if linear_rows.activation_cols is not None:
+            activation_cols = np.where(
+                exists[linear_rows.activation_cols], linear_rows.activation_cols, -1
+            )
+            row_idxs = np.arange(linear_rows.number_rows)
+            if linear_rows.activation_value == 1:
+                coefficient = sign * BIG_NUMBER
+                bounds = bounds + sign * BIG_NUMBER
+            else:
+                coefficient = -sign * BIG_NUMBER
+            rows = np.concatenate([rows, row_idxs])
+            cols = np.concatenate([cols, linear_rows.activation_cols])
+            values = np.concatenate([values, np.full(len(row_idxs), coefficient)])
+
+        # no variable --> always 0
+        keep = exists[cols]
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+        number_terms = np.bincount(rows, minlength=linear_rows.number_rows)
+        # bounds of the left hand side with binary variables
+        lhs_max = np.bincount(
+            rows, weights=np.maximum(values, 0), minlength=linear_rows.number_rows
+        )
+        lhs_min = np.bincount(
+            rows, weights=np.minimum(values, 0), minlength=linear_rows.number_rows
+        )
+        if linear_rows.sense == Sense.LESS_EQUAL:
+            always_valid = lhs_max <= bounds
+        else:
+            always_valid = lhs_min >= bounds
+        assert always_valid[
+            number_terms == 0
+        ].all(), f"Constant constraint of '{rule.sub_title}' is not satisfied."
+        if rule.parameter is None:
+            skipped = always_valid
+        else:
+            # kept for the scenarios changing the parameter
+            skipped = number_terms == 0
+
+        kept = ~skipped[rows]
+        order = np.argsort(rows[kept], kind="stable")
+        rows_cols.append(cols[kept][order])
+        rows_values.append(values[kept][order])
+        rows_number_terms.append(number_terms[~skipped])
+        rows_bounds.append(bounds[~skipped])
+        number_rows_rule = int((~skipped).sum())
+        rows_less_equal.append(
+            np.full(number_rows_rule, linear_rows.sense == Sense.LESS_EQUAL)
+        )
+        rows_activation_cols.append(activation_cols[~skipped])
+        rows_activation_values.append(
+            np.full(number_rows_rule, linear_rows.activation_value)
+        )
+        if rule.parameter is not None:
+            parameters_rows[rule.parameter].append(
+                np.arange(number_rows, number_rows + number_rows_rule)
+            )
+        number_rows += number_rows_rule
+
+    # objective, the primary goal is worth more than the secondary one
+    objective = np.zeros(len(exists))
+    primary, secondary = order_goals(
+        context.parameters.goal_modality, Variable.OPEN_SHIFT, Variable.SHIFT
+    )
+    for variable, weight in [(primary, WEIGHT_PRIMARY_GOAL), (secondary, 1)]:
+        variable_idxs = context.index(
+            variable,
+            *(
+                np.indices((context.number_persons, context.number_dates))
+                if variable in VARIABLES_MATRIX
+                else (None, np.arange(context.number_dates))
+            ),
+        )
+        objective[np.ravel(variable_idxs)] = weight
+
+    return SparseModel(
+        upper_bounds=exists.astype(int),
+        objective=objective * exists,
+        starts=np.concatenate([[0], np.cumsum(np.concatenate(rows_number_terms))]),
+        cols=np.concatenate(rows_cols),
+        values=np.concatenate(rows_values),
+        less_equal=np.concatenate(rows_less_equal),
+        bounds=np.concatenate(rows_bounds),
+        activation_cols=np.concatenate(rows_activation_cols),
+        activation_values=np.concatenate(rows_activation_values),
+        parameters_rows={
+            parameter: np.concatenate(rows_parameter)
+            for parameter, rows_parameter in parameters_rows.items()
+        },
+    )
+
+
+def add_sparse_rows(
+    solver: pulp.LpProblem, sparse_model: SparseModel, variables: np.ndarray
+) -> Dict[str, List[pulp.LpConstraint]]:
+    """Add the rows as constraints, 'variables' is flat and holds 0 where there is
+    no variable.
+
+    Returns the constraints of each parameter."""
+
+    row_to_parameter = {
+        row_idx: parameter
+        for parameter, row_idxs in sparse_model.parameters_rows.items()
+        for row_idx in row_idxs.tolist()
+    }
+    parameters_constraints: Dict[str, List[pulp.LpConstraint]] = defaultdict(list)
+    starts, cols = sparse_model.starts, sparse_model.cols
+    values = sparse_model.values.tolist()
+    for row_idx in range(sparse_model.number_rows):
+        start, end = starts[row_idx], starts[row_idx + 1]
+        constraint = pulp.LpConstraint(
+            pulp.LpAffineExpression(zip(variables[cols[start:end]], values[start:end])),
+            sense=(
+                pulp.LpConstraintLE
+                if sparse_model.less_equal[row_idx]
+                else pulp.LpConstraintGE
+            ),
+            rhs=sparse_model.bounds[row_idx],
+        )
+        solver += constraint
+        if row_idx in row_to_parameter:
+            parameters_constraints[row_to_parameter[row_idx]].append(constraint)
+
+    return parameters_constraints
+
+
+def build_planning_model(
     planning_availabilities: Planning,
     parameters: PlanningParameters,
-    verbose: bool = True,
-) -> Planning:
-
-    # Constants
-    events = planning_availabilities.events
-    persons_infos = planning_availabilities.persons_infos
-    availabilities = planning_availabilities.availabilities
-
-    number_persons = len(persons_infos)
-    dates = np.sort(events["date"])
-    number_dates = len(dates)
-    # dates_last_shift = persons_infos["date_last_shift"]
-    did_gap_last_month = persons_infos["did_gap_last_month"]
-    # is_new = persons_infos["is_new"]
-
-    date_to_date_idx: Dict[datetime, int] = dict(zip(dates, range(number_dates)))
-    person_name_to_person_idx: Dict[str, int] = dict(
-        zip(persons_infos["name"], range(number_persons))
+    low_memory: bool = False,
+) -> PlanningModel:
+    return build_planning_model_from_context(
+        build_rule_context(planning_availabilities, parameters),
+        list(planning_availabilities.persons_infos["name"]),
+        low_memory,
     )
-    persons_name: List[str] = list(persons_infos["name"])
 
-    BIG_NUMBER = 100
+
+def build_planning_model_from_context(
+    context: RuleContext, persons_name: List[str], low_memory: bool = False
+) -> PlanningModel:
+
+    # Constants
+    parameters = context.parameters
+    number_persons, number_dates = context.number_persons, context.number_dates
 
     # Variables
-    shifts = define_variables_matrix("shift", number_persons, number_dates)
-    gaps = define_variables_matrix("gap", number_persons, number_dates)
-    screenings = define_variables_matrix("scrennings", number_persons, number_dates)
-    references = define_variables_matrix("referencce", number_persons, number_dates)
+    masks = get_variables_masks(context, low_memory)
+    if low_memory:
+        # short names and no variable at all for the cells which can not be assigned
+        shifts = define_variables_sparse_matrix("s", masks[Variable.SHIFT])
+        gaps = define_variables_sparse_matrix("g", masks[Variable.GAP])
+        screenings = define_variables_sparse_matrix("c", masks[Variable.SCREENING])
+        references = define_variables_sparse_matrix("r", masks[Variable.REFERENCE])
+
+        open_shifts = define_variables_sparse_array("o", masks[Variable.OPEN_SHIFT])
+        open_gaps = define_variables_sparse_array("q", masks[Variable.OPEN_GAP])
+    else:
+        shifts = define_variables_matrix("shift", number_persons, number_dates)
+        gaps = define_variables_matrix("gap", number_persons, number_dates)
+        screenings = define_variables_matrix("scrennings", number_persons, number_dates)
+        references = define_variables_matrix("referencce", number_persons, number_dates)
 
-    open_shifts = define_variables_array("open_shifts", n=number_dates)
-    open_gaps = define_variables_array("open_gaps", n=number_dates)
+        open_shifts = define_variables_array("open_shifts", n=number_dates)
+        open_gaps = define_variables_array("open_gaps", n=number_dates)
 
     event_type_to_variables: Dict[EventType, np.ndarray] = {
         EventType.SHIFT: shifts,
@@ -80,259 +390,253 @@ def solve_planning(
     solver = pulp.LpProblem("pulp", pulp.LpMaximize)
 
     # Rules
+    variables = flatten_variables(
+        {
+            Variable.SHIFT: shifts,
+            Variable.GAP: gaps,
+            Variable.SCREENING: screenings,
+            Variable.REFERENCE: references,
+            Variable.OPEN_SHIFT: open_shifts,
+            Variable.OPEN_GAP: open_gaps,
+        }
+    )
+    parameters_constraints = add_sparse_rows(
+        solver, build_sparse_model(context, low_memory), variables
+    )
 
-    # -- Events openess
-
-    # not open events
-    for event_type, variables in event_type_to_variables.items():
-        if variables is None:
-            continue
-        for date, opened in zip(events["date"], events[event_type.value]):
-            if not opened:
-                date_idx = date_to_date_idx[date]
-
-                # close for the varible link to event
-                for person_idx in range(number_dates):
-                    solver += (
-                        variables[person_idx, date_idx] == 0,
-                        f"not_open_event_{event_type}_{person_idx}_{date_idx}",
-                    )
-                    # if person_idx == 0 and event_type == EventType.GAP_FRANCO:
-                    #     print(open_gaps[date_idx] == 0)
-
-                # special case for open shift
-                if event_type == EventType.SHIFT:
-                    solver += open_shifts[date_idx] == 0
-                elif event_type == EventType.GAP_FRANCO:
-                    solver += open_gaps[date_idx] == 0
-
-    # -- Availabilities
-
-    # not available --> shift|gaps|screenings = 0
-    for _, row in availabilities.iterrows():
-        if not row["available"]:
-            person_idx = person_name_to_person_idx[row["person_name"]]
-            date_idx = date_to_date_idx[row["date"]]
-            event_type = row["event_type"]
-            variables = event_type_to_variables[event_type]
-            if variables is None:
-                continue
-            # print(person_idx, date_idx)
-            # print(variables)
-
-            solver += (
-                variables[person_idx, date_idx] == 0,
-                f"not available_{event_type}_{person_idx}_{date_idx}",
-            )
-            # if person_idx == 0 and row["event_type"] == EventType.GAP_FRANCO:
-            #     print(variables[person_idx, date_idx] == 0)
-
-    # -- Shift rules
+    # goal
+    number_person_shift = pulp.lpSum(shifts[:, :])
+    number_open_shift = pulp.lpSum(open_shifts[:])
+    goals = order_goals(
+        parameters.goal_modality, number_open_shift, number_person_shift
+    )
+    solver += goals[0] * WEIGHT_PRIMARY_GOAL + goals[1]
+
+    return PlanningModel(
+        solver=solver,
+        days=context.days,
+        persons_name=persons_name,
+        event_type_to_variables=event_type_to_variables,
+        references=references,
+        open_shifts=open_shifts,
+        open_gaps=open_gaps,
+        goals=goals,
+        parameters_constraints=parameters_constraints,
+    )
 
-    if True:
-        # max number of shifts per month
-        for person_idx in range(number_persons):
-            solver += (
-                pulp.lpSum(shifts[person_idx, :])
-                <= parameters.max_number_shift_per_month
-            )
 
-        # a shift is neither open (nb person >= 3) or close (nb == 0)
-        for date_idx in range(number_dates):
-            nb_person_on_a_day = pulp.lpSum(shifts[:, date_idx])
+def solve_model(
+    model: PlanningModel,
+    time_limit: Optional[float] = None,
+    warm_start: bool = False,
+    verbose: bool = True,
+    options: Optional[List[str]] = None,
+    threads: Optional[int] = None,
+) -> SolveStats:
+    solver = model.solver
+    start = time.perf_counter()
+    solver.solve(
+        pulp.PULP_CBC_CMD(
+            msg=0,
+            timeLimit=time_limit,
+            warmStart=warm_start,
+            options=options,
+            threads=threads,
+        )
+    )
+    duration = time.perf_counter() - start
+    if solver.status == SolverStatus.INFEASIBLE.value:
+        raise RuntimeError("Infeasible planning")
+    elif solver.status == SolverStatus.UNBOUNDED.value:
+        raise RuntimeError("Unbounded problem")
+    elif solver.sol_status == pulp.LpSolutionOptimal:
+        status = pulp.LpStatus[pulp.LpStatusOptimal]
+    elif solver.sol_status == pulp.LpSolutionIntegerFeasible:
+        # time limit reached with a planning
+        status = "Feasible"
+    elif time_limit is not None:
+        raise NoSolutionFound(f"No planning found in {time_limit} s")
+    else:
+        raise RuntimeError(f"Not handled status : {solver.status}")
+    if verbose:
+        print("------------")
+        print("Sucess")
+        print("------------")
+
+    return SolveStats(
+        status=status,
+        duration=duration,
+        objective=pulp.value(solver.objective),
+        number_variables=solver.numVariables(),
+        number_constraints=solver.numConstraints(),
+    )
 
-            # disjuntive case thanks to BIG_NUMBER
-            solver += nb_person_on_a_day <= 0 + BIG_NUMBER * open_shifts[date_idx]
-            solver += (
-                nb_person_on_a_day
-                >= parameters.min_number_person_per_shift
-                - BIG_NUMBER * (1 - open_shifts[date_idx])
-            )
 
-        # no 2 shifts consecutively under an amount of days
-        for person_idx in range(number_persons):
-            for date_idx in range(
-                number_dates - parameters.min_number_days_between_two_shifts + 1
-            ):
-                vars = shifts[
-                    person_idx,
-                    range(
-                        date_idx,
-                        date_idx + parameters.min_number_days_between_two_shifts,
-                    ),
-                ]
-                solver += pulp.lpSum(vars) <= 1
-
-    # -- Reference
-
-    if True:
-        # max number reference per person per month
-        for person_idx in range(number_persons):
-            solver += pulp.lpSum(references[person_idx, :]) <= 1
-
-        # no reference for new person
-        for person_idx in range(number_persons):
-            if persons_infos["is_new"].iloc[person_idx]:
-                for date_idx in range(number_dates):
-                    solver += references[person_idx, date_idx] == 0
-
-        # max one referent per shift
-        for date_idx in range(number_dates):
-            solver += (
-                pulp.lpSum(references[:, date_idx])
-                <= parameters.exact_number_referent_per_perm
-            )
+def solve_model_lexicographic(
+    model: PlanningModel,
+    time_limits: Tuple[Optional[float], Optional[float]] = (None, None),
+    verbose: bool = True,
+    warm_start: bool = False,
+) -> SolveStats:
+    """Optimize the primary goal, fix its value then optimize the secondary goal.
+    Optimal only when both stages are, the planning of the first stage is kept
+    when the second one finds nothing in its time limit."""
+
+    solver = model.solver
+    primary_goal, secondary_goal = model.goals
+
+    solver.setObjective(primary_goal)
+    solve_stats_primary = solve_model(
+        model, time_limit=time_limits[0], warm_start=warm_start, verbose=verbose
+    )
 
-        # at least the good number of referent in an open shift
-        for date_idx in range(number_dates):
-            nb_referent_on_a_day = pulp.lpSum(references[:, date_idx])
+    solver += (
+        primary_goal >= round(pulp.value(primary_goal)),
+        "lexicographic_primary_goal",
+    )
+    solver.setObjective(secondary_goal)
+    variables = solver.variables()
+    values_primary = [variable.varValue for variable in variables]
+    # the solution of the first stage is still feasible
+    start = time.perf_counter()
+    try:
+        solve_stats = solve_model(
+            model, time_limit=time_limits[1], warm_start=True, verbose=verbose
+        )
+    except NoSolutionFound:
+        for variable, value in zip(variables, values_primary):
+            variable.varValue = value
+        solve_stats = dataclasses.replace(
+            solve_stats_primary,
+            status="Feasible",
+            duration=time.perf_counter() - start,
+            objective=pulp.value(solver.objective),
+        )
+
+    optimal = pulp.LpStatus[pulp.LpStatusOptimal]
+    return dataclasses.replace(
+        solve_stats,
+        status=(
+            optimal
+            if solve_stats_primary.status == optimal and solve_stats.status == optimal
+            else "Feasible"
+        ),
+        duration=solve_stats_primary.duration + solve_stats.duration,
+    )
 
-            # disjuntive case thanks to BIG_NUMBER
-            solver += nb_referent_on_a_day <= 0 + BIG_NUMBER * open_shifts[date_idx]
-            solver += (
-                nb_referent_on_a_day
-                >= parameters.exact_number_referent_per_perm
-                - BIG_NUMBER * (1 - open_shifts[date_idx])
-            )
 
-        # you are referent --> you have a shift
-        for person_idx in range(number_persons):
-            for date_idx in range(number_dates):
-                solver += (
-                    shifts[person_idx, date_idx] >= references[person_idx, date_idx]
-                )
+def get_variables_values(variables: np.ndarray) -> np.ndarray:
+    values = np.zeros(variables.shape, dtype=bool)
+    for idx, variable in np.ndenumerate(variables):
+        values[idx] = (pulp.value(variable) or 0) > 0.5
+    return values
 
-    # -- GAP
 
-    if True:
-        # max one GAP per person per month
-        for person_idx in range(number_persons):
-            solver += pulp.lpSum(gaps[person_idx, :]) <= 1
+def get_assignations_values(
+    model: PlanningModel,
+) -> Tuple[Dict[EventType, np.ndarray], np.ndarray]:
+    event_type_to_values = {
+        event_type: get_variables_values(variables)
+        for event_type, variables in model.event_type_to_variables.items()
+        if variables is not None
+    }
+    references_values = get_variables_values(model.references)
+    return event_type_to_values, references_values
+
+
+def set_initial_values(
+    model: PlanningModel,
+    event_type_to_values: Dict[EventType, np.ndarray],
+    references_values: np.ndarray,
+) -> None:
+    """Starting point of a warm started solve, inverse of 'get_assignations_values'."""
+
+    variables_values = [(model.references, references_values)] + [
+        (variables, event_type_to_values[event_type])
+        for event_type, variables in model.event_type_to_variables.items()
+        if variables is not None
+    ]
+    variables_values += [
+        (model.open_shifts, event_type_to_values[EventType.SHIFT].any(axis=0)),
+        (model.open_gaps, event_type_to_values[EventType.GAP_FRANCO].any(axis=0)),
+    ]
+    for variables, values in variables_values:
+        for idx, variable in np.ndenumerate(variables):
+            # sparse matrices hold 0 where there is no variable
+            if isinstance(variable, pulp.LpVariable):
+                variable.setInitialValue(int(values[idx]))
 
-        # max and min number person in a GAP
-        for date_idx in range(number_dates):
-            s = pulp.lpSum(gaps[:, date_idx])
 
-            # max
-            solver += s <= parameters.max_number_person_gap
+def solve_planning(
+    planning_availabilities: Planning,
+    parameters: PlanningParameters,
+    verbose: bool = True,
+    low_memory: bool = False,
+    cache: Optional[SolutionCache] = None,
+    bypass_cache: bool = False,
+    lexicographic: bool = False,
+    stage_time_limits: Tuple[Optional[float], Optional[float]] = (None, None),
+    initial_assignations: Optional[pd.DataFrame] = None,
+) -> Planning:
 
-            # min on open gaps
-            solver += s <= 0 + BIG_NUMBER * open_gaps[date_idx]
-            solver += s >= parameters.min_number_person_gap - BIG_NUMBER * (
-                1 - open_gaps[date_idx]
+    # already solved, only the optimal plannings are cached
+    if cache is not None:
+        key = compute_key(
+            planning_availabilities,
+            parameters,
+            SOLVER_VERSION,
+            options={
+                "lexicographic": lexicographic,
+                "stage_time_limits": stage_time_limits,
+                "initial_assignations": initial_assignations,
+            },
+        )
+        cached = None if bypass_cache else cache.get(key)
+        if cached is not None and cached[1].status == "Optimal":
+            assignations, solve_stats = cached
+            return Planning(
+                events=planning_availabilities.events,
+                persons_infos=planning_availabilities.persons_infos,
+                availabilities=planning_availabilities.availabilities,
+                assignations=assignations,
+                solve_stats=dataclasses.replace(solve_stats, from_cache=True),
             )
 
-        # modality gap
-        if parameters.gap_modality == GapModality.MONTH:
-            # no gap before the shifts (last month or before in the same month) --> no shifts
-            for person_idx in range(number_persons):
-                if not did_gap_last_month.iloc[person_idx]:
-                    for day_idx in range(number_dates):
-                        total_gap_done = pulp.lpSum(gaps[person_idx, :day_idx])
-                        solver += shifts[person_idx, day_idx] <= total_gap_done
-        else:
-            raise ValueError(f"Gap modality '{parameters.gap_modality}' not handled.")
-
-    # goal
-    number_person_shift = pulp.lpSum(shifts[:, :])
-    number_open_shift = pulp.lpSum(open_shifts[:])
-    if parameters.goal_modality == GoalModality.OPEN_SHIFT_PRIORITY:
-        solver += number_open_shift * 1000 + number_person_shift
-    elif parameters.goal_modality == GoalModality.NUMBER_PERSON_SHIFT_PRIORITY:
-        solver += number_person_shift * 1000 + number_open_shift
-    else:
-        raise ValueError(f"Goal modality '{parameters.goal_modality}' not handled.")
-
-    # solve
-    solver.solve(pulp.PULP_CBC_CMD(msg=0))
-    print("------------")
-    if solver.status == SolverStatus.INFEASIBLE.value:
-        raise RuntimeError("Infeasible planning")
-    elif solver.status == SolverStatus.UNBOUNDED.value:
-        raise RuntimeError("Unbounded problem")
-    elif solver.status == SolverStatus.SUCESS.value:
-        print("Sucess")
+    model = build_planning_model(planning_availabilities, parameters, low_memory)
+    # a feasible planning to start from, e.g. given by 'plan_greedy'
+    warm_start = initial_assignations is not None
+    if warm_start:
+        set_initial_values(
+            model,
+            *from_assignations(model.days, model.persons_name, initial_assignations),
+        )
+    if lexicographic:
+        solve_stats = solve_model_lexicographic(
+            model, stage_time_limits, verbose=verbose, warm_start=warm_start
+        )
     else:
-        raise RuntimeError(f"Not handled status : {solver.status}")
-    print("------------")
+        solve_stats = solve_model(model, warm_start=warm_start, verbose=verbose)
 
     # convert the results
-    data = []
-
-    def add_data(
-        person_idx: int,
-        date_idx: int,
-        event_type: EventType,
-        assignation: Union[bool, str],
-    ) -> None:
-        obj = {
-            "person_name": persons_name[person_idx],
-            "date": dates[date_idx],
-            "event_type": event_type,
-            "assignation": assignation,
-        }
-        data.append(obj)
-
-    # events
-    for event_type, variables in event_type_to_variables.items():
-        if variables is None:
-            continue
-        # print(event_type)
-        for person_idx, lst in enumerate(variables):
-            for date_idx, assigned in enumerate(lst):
-                add_data(person_idx, date_idx, event_type, bool(assigned.value()))
-
-    assignations = pd.DataFrame(data)
-    assignations["assignation"] = assignations["assignation"].astype(object)
-
-    # reference
-    for person_idx, lst in enumerate(references):
-        for date_idx, is_referent in enumerate(lst):
-            person_name = persons_name[person_idx]
-            date = dates[date_idx]
-
-            if bool(is_referent.value()):
-                # erase the True by "ref"
-                assignations.loc[
-                    (assignations["person_name"] == person_name)
-                    & (assignations["date"] == date)
-                    & (assignations["event_type"] == EventType.SHIFT),
-                    "assignation",
-                ] = "ref"
-
-    # os = [e.value() for e in open_shifts]
-    # print(len(os), os)
-
-    name = persons_infos.iloc[0]["name"]
-    # print(name)
-    # print(
-    #     availabilities[
-    #         (availabilities["person_name"] == name)
-    #         & (availabilities["event_type"] == EventType.GAP_FRANCO)
-    #     ]
-    # )
-    # print(
-    #     assignations[
-    #         (assignations["person_name"] == name)
-    #         & (assignations["event_type"] == EventType.GAP_FRANCO)
-    #     ]
-    # )
-    # print(
-    #     assignations[
-    #         (assignations["event_type"] == EventType.GAP_FRANCO)
-    #         & (assignations["assigned"] == True)
-    #     ]
-    # )
-    # for name, c in solver.constraints.items():
-    #     if "gap_0" in str(c):
-    #         print(name, c)
+    days, persons_name = model.days, model.persons_name
+    event_type_to_values, references_values = get_assignations_values(model)
+    if low_memory:
+        # only the compact arrays are kept while building the dataframe
+        del model
+
+    assignations = to_assignations(
+        days, persons_name, event_type_to_values, references_values
+    )
+    if cache is not None and solve_stats.status == "Optimal":
+        cache.put(key, assignations, solve_stats)
 
     # return
     return Planning(
         events=planning_availabilities.events,
         persons_infos=planning_availabilities.persons_infos,
-        availabilities=availabilities,
+        availabilities=planning_availabilities.availabilities,
         assignations=assignations,
+        solve_stats=solve_stats,
     )
 
 
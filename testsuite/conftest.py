@@ -0,0 +1,135 @@
+import dataclasses
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from planning.days import to_days
+from planning.generator import generate_planning
+from planning.parameters import DEFAULT_PARAMETERS, PlanningParameters
+from planning.planning_struct import EventType, Planning
+from planning.rules import EVENT_TYPES_ASSIGNABLE, to_assignations
+from planning.solution_cache import compute_key
+from planning.solver import SOLVER_VERSION, solve_planning
+
+# golden assignations, keyed on the inputs and SOLVER_VERSION (not the PuLP
+# version), written only with --update-goldens
+PATH_GOLDEN = Path(__file__).parent / "golden"
+
+INSTANCES_NUMBER_PERSONS: Dict[str, int] = {"small": 10, "medium": 40, "large": 100}
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--slow", action="store_true", help="also run the tests solving plannings"
+    )
+    parser.addoption(
+        "--update-goldens",
+        action="store_true",
+        help="solve and write the golden assignations which are missing",
+    )
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    if config.getoption("--slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="needs --slow to run")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip_slow)
+
+
+# -- golden assignations
+
+
+def write_golden(path: Path, assignations: pd.DataFrame) -> None:
+    assigned = assignations[assignations["assignation"].astype(bool) == True]
+    data = [
+        [person_name, date.isoformat(), event_type.value, assignation]
+        for person_name, date, event_type, assignation in zip(
+            assigned["person_name"],
+            assigned["date"],
+            assigned["event_type"],
+            assigned["assignation"],
+        )
+    ]
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps(data, indent=0))
+
+
+def read_golden(path: Path, planning: Planning) -> pd.DataFrame:
+    dates = np.sort(planning.events["date"])
+    persons_name = list(planning.persons_infos["name"])
+    date_to_date_idx = dict(zip(dates, range(len(dates))))
+    person_name_to_person_idx = dict(zip(persons_name, range(len(persons_name))))
+
+    shape = (len(persons_name), len(dates))
+    event_type_to_values = {
+        event_type: np.zeros(shape, dtype=bool) for event_type in EVENT_TYPES_ASSIGNABLE
+    }
+    references_values = np.zeros(shape, dtype=bool)
+
+    for person_name, date, event_type, assignation in json.loads(path.read_text()):
+        idx = (
+            person_name_to_person_idx[person_name],
+            date_to_date_idx[datetime.fromisoformat(date)],
+        )
+        event_type_to_values[EventType(event_type)][idx] = True
+        if assignation == "ref":
+            references_values[idx] = True
+
+    return to_assignations(
+        to_days(dates), persons_name, event_type_to_values, references_values
+    )
+
+
+# -- fixtures
+
+
+@pytest.fixture(scope="session")
+def parameters() -> PlanningParameters:
+    return dataclasses.replace(DEFAULT_PARAMETERS)
+
+
+@pytest.fixture(scope="session", params=list(INSTANCES_NUMBER_PERSONS))
+def planning(request: pytest.FixtureRequest) -> Planning:
+    return generate_planning(
+        number_persons=INSTANCES_NUMBER_PERSONS[request.param], seed=0
+    )
+
+
+@pytest.fixture(scope="session")
+def golden_planning_assignation(
+    request: pytest.FixtureRequest, planning: Planning, parameters: PlanningParameters
+) -> Planning:
+    key = compute_key(planning, parameters, SOLVER_VERSION)[:16]
+    path = PATH_GOLDEN / f"{key}.json"
+    if not path.exists():
+        if not request.config.getoption("--update-goldens"):
+            pytest.fail(
+                f"No golden assignation '{path.name}', the model or the instance "
+                "changed: run the tests with --update-goldens and commit it."
+            )
+        pl_assign = solve_planning(
+            planning_availabilities=planning,
+            parameters=parameters,
+            verbose=False,
+            low_memory=True,
+        )
+        write_golden(path, pl_assign.assignations)
+
+    return dataclasses.replace(planning, assignations=read_golden(path, planning))
+
+
+@pytest.fixture(scope="session")
+def planning_may() -> Planning:
+    vars_module = pytest.importorskip("vars", reason="the 'docs' are not available")
+    from planning.planning_reader import read_planning
+
+    return read_planning(vars_module.PATH_DOCS_PLANNING_MAY)
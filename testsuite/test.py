@@ -1,32 +1,741 @@
+import asyncio
+import dataclasses
+import gzip
+import json
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
 import pytest
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
 
-from planning.checker import check_planning_assignation
-from planning.parameters import DEFAULT_PARAMETERS
-from planning.planning_reader import read_planning
-from planning.solver import solve_planning
-from vars import PATH_DOCS_PLANNING_MAY
+import planning.solver as planning_solver
+from helper.excel_editor import ExcelEditor
+from helper.xlsx_reader import UnsupportedXlsx, XlsxReader, unescape
+from planning.backends import BACKENDS, remove_big_m, solve_planning_backend
+from planning.benchmark import SOLVE_CONFIGURATIONS, benchmark_solve
+from planning.checker import (
+    TYPE_PLANNING_ASSIGNATION_CHECKS,
+    check_planning_assignation,
+    export_violations_json,
+    export_violations_junit,
+)
+from planning.daemon import PlanningDaemon
+from planning.days import (
+    NO_DAY,
+    format_days,
+    get_days_since,
+    to_dates,
+    to_days,
+    to_months,
+)
+from planning.decomposition import find_components, solve_planning_decomposed
+from planning.generator import generate_planning
+from planning.heuristic import plan_greedy
+from planning.parameters import PlanningParameters
+from planning.patterns import solve_planning_patterns
+from planning.planning_reader import (
+    COL_SHIFT,
+    PAGE_TABLE,
+    PAGES_LANGUAGE,
+    ROW_DATES,
+    ROW_EVENT_NAME,
+    ROW_FIRST_PERSON,
+    read_planning,
+)
+from planning.planning_struct import EventType, Planning, SolveStats
+from planning.portfolio import solve_planning_portfolio
+from planning.rolling_horizon import solve_planning_rolling_horizon
+from planning.rules import build_rule_context, from_assignations
+from planning.scenarios import Scenario, ScenarioPlanner
+from planning.shared_planning import SharedPlanning, solve_parameters_sweep
+from planning.solution_cache import SolutionCache, compute_key
+from planning.solver import (
+    NoSolutionFound,
+    build_sparse_model,
+    combine_statuses,
+    solve_planning,
+)
 
-planning = read_planning(PATH_DOCS_PLANNING_MAY)
 
-params = DEFAULT_PARAMETERS
-pl_assign = solve_planning(
-    planning_availabilities=planning, parameters=params, verbose=False
-)
+def format_checks(checks: TYPE_PLANNING_ASSIGNATION_CHECKS) -> str:
+    return "\n".join(f"{'-'.join(titles)} : {detail}" for titles, detail in checks)
 
-checks = check_planning_assignation(pl_assign, params)
 
+def count_goals(pl_assign: Planning) -> Tuple[int, int]:
+    """Number of persons on shifts and number of open shifts."""
+    assignations = pl_assign.assignations
+    dates = assignations[
+        (assignations["event_type"] == EventType.SHIFT)
+        & (assignations["assignation"].astype(bool) == True)
+    ]["date"]
+    return len(dates), dates.nunique()
 
-@pytest.mark.parametrize(
-    ("error"),
-    [pytest.param(detail, id="-".join(titles)) for titles, detail in checks],
-)
-def test_failed(error: str):
-    assert error is None
 
+def test_golden_assignation(
+    golden_planning_assignation: Planning, parameters: PlanningParameters
+):
+    checks = check_planning_assignation(golden_planning_assignation, parameters)
+    assert len(checks) == 0, format_checks(checks)
 
-@pytest.mark.parametrize(
-    ("success"),
-    [pytest.param("success")] if len(checks) == 0 else [],
-)
-def test_sucess(success: str):
-    print(success)
+
+def test_checker_violations(
+    golden_planning_assignation: Planning,
+    parameters: PlanningParameters,
+    tmp_path: Path,
+):
+    assignations = golden_planning_assignation.assignations.copy()
+    is_shift = assignations["event_type"] == EventType.SHIFT
+    referent = assignations[is_shift & (assignations["assignation"] == "ref")].iloc[0]
+    is_referent = (
+        is_shift
+        & (assignations["person_name"] == referent["person_name"])
+        & (assignations["date"] == referent["date"])
+    )
+    # the referent is only on the shift, and also the day after
+    assignations.loc[is_referent, "assignation"] = True
+    assignations.loc[
+        is_shift
+        & (assignations["person_name"] == referent["person_name"])
+        & (assignations["date"] == referent["date"] + pd.Timedelta(days=1)),
+        "assignation",
+    ] = True
+
+    checks = check_planning_assignation(
+        dataclasses.replace(golden_planning_assignation, assignations=assignations),
+        parameters,
+    )
+    sub_titles = {titles[-1] for titles, _ in checks}
+    assert {
+        "exact_number_referent_per_open_shift",
+        "min_days_between_two_shifts",
+    } <= sub_titles, format_checks(checks)
+
+    # each check has its own titles
+    checks_built = checks.to_checks()
+    assert [titles for titles, _ in checks_built] == [titles for titles, _ in checks]
+    assert checks_built[0][0] is not checks_built[-1][0]
+
+    export_violations_json(checks, tmp_path / "checks.json")
+    data = json.loads((tmp_path / "checks.json").read_text())
+    assert len(data["violations"]["rule"]) == len(checks)
+    export_violations_junit(checks, tmp_path / "checks.xml", max_messages=1)
+    testsuite = ET.parse(tmp_path / "checks.xml").getroot()
+    failures = testsuite.findall("testcase/failure")
+    assert len(failures) == len(set(checks.rule_idxs))
+    assert sum(int(f.get("message").split()[0]) for f in failures) == len(checks)
+
+    # assignations the checker can not read
+    bilingual = assignations[is_referent].assign(event_type=EventType.GAP_BILINGUAL)
+    persons_infos = golden_planning_assignation.persons_infos.copy()
+    persons_infos.loc[1, "name"] = persons_infos.loc[0, "name"]
+    availabilities = golden_planning_assignation.availabilities.replace(
+        {
+            "person_name": dict(
+                zip(
+                    golden_planning_assignation.persons_infos["name"],
+                    persons_infos["name"],
+                )
+            )
+        }
+    )
+    for pl_assign, match in [
+        (
+            dataclasses.replace(
+                golden_planning_assignation,
+                assignations=pd.concat([assignations, bilingual], ignore_index=True),
+            ),
+            "event types not handled",
+        ),
+        (
+            dataclasses.replace(
+                golden_planning_assignation,
+                persons_infos=persons_infos,
+                availabilities=availabilities,
+            ),
+            "named more than once",
+        ),
+    ]:
+        with pytest.raises(ValueError, match=match):
+            check_planning_assignation(pl_assign, parameters)
+
+
+def write_planning_xlsx(path: Path) -> None:
+    """Small workbook with the layout of the availability sheets."""
+
+    events = [
+        (datetime(2025, 5, 1), "Perm"),
+        (None, CellRichText([TextBlock(InlineFont(b=True), "GAP"), "\n(bilingue)"])),
+        (datetime(2025, 5, 2), "Pas Perm"),
+        (datetime(2025, 5, 5), "Perm"),
+    ]
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for page_name in PAGES_LANGUAGE:
+        worksheet = workbook.create_sheet(page_name)
+        for col, (date, event_name) in enumerate(events, start=COL_SHIFT + 1):
+            worksheet.cell(ROW_DATES + 1, col, date)
+            worksheet.cell(ROW_EVENT_NAME + 1, col, event_name)
+        for person_idx in range(3):
+            row = ROW_FIRST_PERSON + person_idx + 1
+            line = ["🆕", f"{page_name}_{person_idx}", "comment", "Pause", "ok"]
+            line.append(datetime(2025, 4, 20) if person_idx == 0 else "?")
+            line += [True if (person_idx + col) % 3 == 0 else None for col in range(4)]
+            for col, value in enumerate(line, start=1):
+                worksheet.cell(row, col, value)
+    workbook.save(path)
+
+
+def test_read_planning_xlsx(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    path = tmp_path / "planning.xlsx"
+    write_planning_xlsx(path)
+    reader, ee = XlsxReader(path), ExcelEditor(path)
+    assert reader.get_pages_name() == ee.get_pages_name()
+    for page_name in PAGES_LANGUAGE:
+        page, page_expected = reader.read_page(page_name), ee.read_page(page_name)
+        assert page.shape == page_expected.shape
+        assert (page == page_expected).all()
+
+    planning = read_planning(path)
+    assert planning.events["gap_bilingual"].sum() == 1
+    assert planning.persons_infos["date_last_shift"].iloc[0] == datetime(2025, 4, 20)
+
+    # the files the stream does not handle are read by openpyxl
+    def raise_unsupported(*args, **kwargs):
+        raise UnsupportedXlsx("")
+
+    monkeypatch.setattr("planning.planning_reader.XlsxReader", raise_unsupported)
+    planning_fallback = read_planning(path)
+    for name in ["events", "persons_infos", "availabilities"]:
+        assert getattr(planning, name).equals(getattr(planning_fallback, name))
+
+
+def test_read_page_xlsx(tmp_path: Path):
+    # an escaped escape is kept as written
+    assert unescape("_x005F_x0041_") == "_x0041_"
+
+    path = tmp_path / "planning.xlsx"
+    write_planning_xlsx(path)
+    workbook = openpyxl.load_workbook(path)
+    for worksheet in workbook:
+        # an escaped '_' and carriage return
+        worksheet.cell(ROW_FIRST_PERSON + 1, 3, "a_x005F_b_x000D_c")
+        # after the table, the row without a name ends it
+        worksheet.cell(ROW_DATES + 1, COL_SHIFT + 8, "note")
+        worksheet.cell(ROW_FIRST_PERSON + 4, 1, "🆕")
+        worksheet.cell(ROW_FIRST_PERSON + 5, 2, "total")
+    workbook.save(path)
+
+    reader, ee = XlsxReader(path), ExcelEditor(path)
+    for page_name in PAGES_LANGUAGE:
+        # openpyxl only decodes the escaped '_'
+        page_expected = np.vectorize(
+            lambda value: unescape(value) if isinstance(value, str) else value,
+            otypes=[object],
+        )(ee.read_page(page_name))
+        page = reader.read_page(page_name)
+        assert page.shape == page_expected.shape
+        assert (page == page_expected).all()
+        assert page[ROW_FIRST_PERSON, 2] == "a_b\rc"
+
+        page_table = reader.read_page(page_name, PAGE_TABLE)
+        assert page_table.shape == (ROW_FIRST_PERSON + 3, COL_SHIFT + 4)
+        assert (
+            page_table == page_expected[: page_table.shape[0], : page_table.shape[1]]
+        ).all()
+
+    # a missing worksheet falls back to openpyxl like a file the stream can not read
+    reader.sheet_paths[page_name] = "xl/worksheets/missing.xml"
+    with pytest.raises(UnsupportedXlsx):
+        reader.read_page(page_name)
+
+
+def test_days():
+    dates = [datetime(2025, 4, 30), datetime(2025, 5, 1), None, "comment"]
+    days = to_days(dates)
+    assert (days[2:] == NO_DAY).all()
+    assert (to_dates(days[:2]) == np.array(dates[:2], dtype="datetime64[us]")).all()
+    assert list(format_days(days[:2])) == ["30/04", "01/05"]
+    assert to_months(days[1:2])[0] - to_months(days[:1])[0] == 1
+    # unknown days are never close
+    since = get_days_since(days[1:2], days[[0, 2]])
+    assert since[0, 0] == 1 and since[1, 0] > 10**9
+
+
+def test_unknown_persons_and_dates(parameters: PlanningParameters):
+    planning = generate_planning(number_persons=20)
+    availabilities = planning.availabilities
+    last_day = to_days(planning.events["date"]).max()
+    for column, value, match in [
+        ("person_name", "unknown", "Persons not in the planning"),
+        ("date", to_dates([last_day - 100])[0], "Dates not in the planning"),
+        ("date", to_dates([last_day + 100])[0], "Dates not in the planning"),
+    ]:
+        changed = availabilities.copy()
+        changed.loc[changed.index[0], column] = value
+        changed.loc[changed.index[0], "available"] = False
+        planning_changed = dataclasses.replace(planning, availabilities=changed)
+        with pytest.raises(KeyError, match=match):
+            build_rule_context(planning_changed, parameters)
+        with pytest.raises(KeyError, match=match):
+            SharedPlanning.create(planning_changed)
+        with pytest.raises(KeyError, match=match):
+            from_assignations(
+                to_days(planning.events["date"]),
+                list(planning.persons_infos["name"]),
+                changed.iloc[:1].assign(assignation=True, event_type=EventType.SHIFT),
+            )
+
+
+@pytest.mark.parametrize("memory_mapped", [False, True])
+def test_shared_planning(
+    planning: Planning,
+    parameters: PlanningParameters,
+    tmp_path: Path,
+    memory_mapped: bool,
+):
+    path = tmp_path / "planning.bin" if memory_mapped else None
+    with SharedPlanning.create(planning, path) as shared:
+        attached = SharedPlanning.attach(shared.handle)
+        context = attached.to_rule_context(parameters)
+        for planning_decoded in [planning, attached.to_planning()]:
+            expected = build_rule_context(planning_decoded, parameters)
+            assert (context.days == expected.days).all()
+            assert (context.days_last_shift == expected.days_last_shift).all()
+            assert (context.is_new == expected.is_new).all()
+            for event_type, possible in expected.possible_assignations.items():
+                assert (context.possible_assignations[event_type] == possible).all()
+        assert attached.persons_name == list(planning.persons_infos["name"])
+        del context
+        attached.close()
+
+
+def test_solution_cache(
+    golden_planning_assignation: Planning,
+    parameters: PlanningParameters,
+    tmp_path: Path,
+):
+    cache = SolutionCache(tmp_path)
+    assignations = golden_planning_assignation.assignations
+    solve_stats = SolveStats("Optimal", 1.0, 0.0, 0, 0)
+
+    cache.put("a", assignations, solve_stats)
+    cached_assignations, cached_solve_stats = cache.get("a")
+    assert cached_assignations.equals(assignations)
+    assert cached_solve_stats == solve_stats
+    assert cache.get("b") is None
+
+    # least recently used is evicted
+    cache.put("b", assignations, solve_stats)
+    cache.max_size = cache.get_path("a").stat().st_size
+    os.utime(cache.get_path("a"), (0, 0))
+    cache.put("c", assignations, solve_stats)
+    assert cache.get("a") is None and cache.get("c") is not None
+
+    # a stale pickle is a miss and is removed
+    with gzip.open(cache.get_path("d"), "wb") as f:
+        f.write(b"cplanning.removed_module\nRemovedClass\n.")
+    assert cache.get("d") is None and not cache.get_path("d").exists()
+
+    # the options of the solve are in the key
+    keys = {
+        compute_key(golden_planning_assignation, parameters, "1", options)
+        for options in [
+            None,
+            {"lexicographic": True},
+            {"stage_time_limits": (None, 1.0)},
+            {"initial_assignations": assignations},
+            {"initial_assignations": assignations.iloc[1:]},
+        ]
+    }
+    assert len(keys) == 5
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("planning", ["small"], indirect=True)
+def test_solve_planning_cache(
+    planning: Planning,
+    parameters: PlanningParameters,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = SolutionCache(tmp_path)
+    solved = solve_planning(planning, parameters, verbose=False, cache=cache)
+    assert not solved.solve_stats.from_cache
+
+    cached = solve_planning(planning, parameters, verbose=False, cache=cache)
+    assert cached.solve_stats.from_cache
+    assert cached.assignations.equals(solved.assignations)
+
+    bypassed = solve_planning(
+        planning, parameters, verbose=False, cache=cache, bypass_cache=True
+    )
+    assert not bypassed.solve_stats.from_cache
+
+    # only the optimal plannings are cached
+    cache.clear()
+    solve_model = planning_solver.solve_model
+    monkeypatch.setattr(
+        planning_solver,
+        "solve_model",
+        lambda *args, **kwargs: dataclasses.replace(
+            solve_model(*args, **kwargs), status="Feasible"
+        ),
+    )
+    feasible = solve_planning(planning, parameters, verbose=False, cache=cache)
+    assert feasible.solve_stats.status == "Feasible"
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("number_dates", [31, 92])
+def test_plan_greedy(parameters: PlanningParameters, number_dates: int):
+    planning = generate_planning(number_persons=40, number_dates=number_dates)
+    pl_greedy = plan_greedy(planning, parameters)
+    checks = check_planning_assignation(pl_greedy, parameters)
+    assert len(checks) == 0, format_checks(checks)
+    assert count_goals(pl_greedy)[1] > 0
+
+
+@pytest.mark.slow
+def test_solve_warm_start(planning: Planning, parameters: PlanningParameters):
+    pl_greedy = plan_greedy(planning, parameters)
+    pl_assign = solve_planning(
+        planning,
+        parameters,
+        verbose=False,
+        low_memory=True,
+        initial_assignations=pl_greedy.assignations,
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    assert pl_assign.solve_stats.objective >= pl_greedy.solve_stats.objective
+    assert count_goals(pl_assign) == count_goals(
+        solve_planning(planning, parameters, verbose=False, low_memory=True)
+    )
+
+
+@pytest.mark.slow
+def test_benchmark_low_memory(parameters: PlanningParameters):
+    planning = generate_planning(number_persons=300, seed=0)
+    default, low_memory = [
+        benchmark_solve(planning, parameters, label, SOLVE_CONFIGURATIONS[label])
+        for label in ["default", "low_memory"]
+    ]
+    assert low_memory.objective == default.objective
+    # resident memory, of the python process and of CBC
+    assert low_memory.peak_memory < default.peak_memory / 2
+    assert low_memory.peak_memory_solver < default.peak_memory_solver
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_solve(planning: Planning, parameters: PlanningParameters, low_memory: bool):
+    pl_assign = solve_planning(
+        planning_availabilities=planning,
+        parameters=parameters,
+        verbose=False,
+        low_memory=low_memory,
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+
+@pytest.mark.slow
+def test_solve_may(planning_may: Planning, parameters: PlanningParameters):
+    pl_assign = solve_planning(
+        planning_availabilities=planning_may, parameters=parameters, verbose=False
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+
+# the optional solvers are in 'requirements-backends.txt'
+BACKENDS_MODULE = {"cbc": "pulp", "highs": "highspy", "cp-sat": "ortools.sat.python"}
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("planning", ["small"], indirect=True)
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_solve_backend(
+    golden_planning_assignation: Planning, parameters: PlanningParameters, backend: str
+):
+    pytest.importorskip(BACKENDS_MODULE[backend])
+    pl_assign = solve_planning_backend(golden_planning_assignation, parameters, backend)
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    assert pl_assign.solve_stats.status == "Optimal"
+    assert count_goals(pl_assign) == count_goals(golden_planning_assignation)
+
+
+@pytest.mark.parametrize("planning", ["small"], indirect=True)
+def test_remove_big_m(planning: Planning, parameters: PlanningParameters):
+    # the indicator constraints of CP-SAT are the big M rows of the other backends
+    model = build_sparse_model(build_rule_context(planning, parameters))
+    terms_kept, bounds = remove_big_m(model)
+    activated = model.activation_cols >= 0
+    assert activated.any() and not terms_kept.all()
+
+    rows = np.repeat(np.arange(model.number_rows), np.diff(model.starts))
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        x = model.upper_bounds * (rng.random(model.number_variables) < rng.random())
+
+        def holds(terms: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+            products = model.values[terms] * x[model.cols[terms]]
+            lhs = np.bincount(rows[terms], products, minlength=model.number_rows)
+            return np.where(model.less_equal, lhs <= bounds, lhs >= bounds)
+
+        enforced = ~activated | (
+            x[np.maximum(model.activation_cols, 0)] == model.activation_values
+        )
+        big_m = holds(np.ones(len(model.cols), dtype=bool), model.bounds)
+        assert (big_m == (holds(terms_kept, bounds) | ~enforced)).all()
+
+
+@pytest.mark.slow
+def test_solve_patterns(
+    golden_planning_assignation: Planning, parameters: PlanningParameters
+):
+    pl_assign = solve_planning_patterns(
+        golden_planning_assignation, parameters, verbose=False
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    # the bound is not always reached on the small instances
+    solve_stats = pl_assign.solve_stats
+    assert solve_stats.objective <= solve_stats.bound + 1e-6
+    assert count_goals(pl_assign) == count_goals(golden_planning_assignation)
+
+
+@pytest.mark.slow
+def test_solve_lexicographic(planning: Planning, parameters: PlanningParameters):
+    weighted = solve_planning(planning, parameters, verbose=False, low_memory=True)
+    lexicographic = solve_planning(
+        planning, parameters, verbose=False, low_memory=True, lexicographic=True
+    )
+    checks = check_planning_assignation(lexicographic, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    assert count_goals(weighted) == count_goals(lexicographic)
+
+
+@pytest.mark.slow
+def test_solve_rolling_horizon_month_gap(parameters: PlanningParameters):
+    # a window starting in May while its first date is in June
+    planning = generate_planning(number_persons=40, number_dates=61, seed=1)
+    events = planning.events
+    kept = ~events["date"].between(datetime(2025, 5, 15), datetime(2025, 5, 31))
+    availabilities = planning.availabilities
+    planning = dataclasses.replace(
+        planning,
+        events=events[kept].reset_index(drop=True),
+        availabilities=availabilities[
+            availabilities["date"].isin(events[kept]["date"])
+        ],
+    )
+    pl_assign = solve_planning_rolling_horizon(
+        planning, parameters, verbose=False, low_memory=True
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+
+@pytest.mark.slow
+def test_solve_time_limit(parameters: PlanningParameters):
+    planning = generate_planning(number_persons=1000)
+    # the secondary stage is stopped early, the primary goals are kept
+    pl_assign = solve_planning(
+        planning,
+        parameters,
+        verbose=False,
+        low_memory=True,
+        lexicographic=True,
+        stage_time_limits=(None, 0.01),
+    )
+    assert pl_assign.solve_stats.status in ("Optimal", "Feasible")
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    with pytest.raises(NoSolutionFound, match="No planning found"):
+        solve_planning(
+            planning,
+            parameters,
+            verbose=False,
+            low_memory=True,
+            lexicographic=True,
+            stage_time_limits=(0.01, None),
+        )
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("number_dates", [31, 92])
+def test_solve_rolling_horizon(parameters: PlanningParameters, number_dates: int):
+    planning = generate_planning(number_persons=40, number_dates=number_dates)
+    pl_assign = solve_planning_rolling_horizon(
+        planning, parameters, verbose=False, low_memory=True
+    )
+    pl_assign_monolithic = solve_planning(
+        planning, parameters, verbose=False, low_memory=True
+    )
+    assert len(pl_assign.assignations) == len(pl_assign_monolithic.assignations)
+    assert pl_assign.solve_stats.objective <= pl_assign_monolithic.solve_stats.objective
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    # available on every date
+    planning = dataclasses.replace(planning, availabilities=None)
+    pl_assign = solve_planning_rolling_horizon(
+        planning, parameters, verbose=False, low_memory=True
+    )
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("number_groups", [1, 3])
+def test_solve_decomposed(parameters: PlanningParameters, number_groups: int):
+    planning = generate_planning(number_persons=60, number_groups=number_groups)
+    components = find_components(build_rule_context(planning, parameters))
+    assert len(components) == number_groups
+    for component in components:
+        # the persons of a group are only available on the dates of the group
+        assert len(set(component.person_idxs % number_groups)) == 1
+
+    pl_decomposed = solve_planning_decomposed(
+        planning, parameters, verbose=False, min_size_component=0
+    )
+    checks = check_planning_assignation(pl_decomposed, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    pl_assign = solve_planning(planning, parameters, verbose=False, low_memory=True)
+    assert pl_decomposed.solve_stats.objective == pl_assign.solve_stats.objective
+    assert pl_decomposed.solve_stats.status == "Optimal"
+
+    # the worst status of the components
+    assert combine_statuses(["Optimal", "Feasible", "Optimal"]) == "Feasible"
+    assert combine_statuses(["Optimal"] * number_groups) == "Optimal"
+
+
+@pytest.mark.slow
+def test_scenarios(planning: Planning, parameters: PlanningParameters):
+    planner = ScenarioPlanner(planning, parameters, low_memory=True)
+    person_name = planning.persons_infos["name"][0]
+    date = planner.baseline.assignations["date"].min()
+    scenarios = [
+        Scenario("baseline"),
+        Scenario("person out", persons_out=[person_name]),
+        Scenario("date closed", dates_closed=[date]),
+        Scenario("1 person per shift", parameters={"min_number_person_per_shift": 1}),
+    ]
+    results = planner.solve_scenarios(scenarios)
+    for result in results:
+        checks = check_planning_assignation(
+            result.planning, planner.parameters_of(result.scenario)
+        )
+        assert len(checks) == 0, format_checks(checks)
+
+    baseline, person_out, date_closed, relaxed = results
+    assert count_goals(baseline.planning) == count_goals(planner.baseline)
+    assigned = {
+        result.scenario.label: result.planning.assignations[
+            result.planning.assignations["assignation"].astype(bool) == True
+        ]
+        for result in [person_out, date_closed]
+    }
+    assert person_name not in set(assigned["person out"]["person_name"])
+    shifts = assigned["date closed"]
+    assert date not in set(shifts[shifts["event_type"] == EventType.SHIFT]["date"])
+    assert count_goals(relaxed.planning) >= count_goals(planner.baseline)
+
+    # the model is restored after each scenario
+    assert count_goals(planner.solve_scenario(Scenario("again")).planning) == (
+        count_goals(planner.baseline)
+    )
+
+
+@pytest.mark.slow
+def test_solve_portfolio(planning: Planning, parameters: PlanningParameters):
+    pl_assign = solve_planning_portfolio(planning, parameters, verbose=False)
+    assert pl_assign.solve_stats.status == "Optimal"
+    assert pl_assign.solve_stats.configuration is not None
+    checks = check_planning_assignation(pl_assign, parameters)
+    assert len(checks) == 0, format_checks(checks)
+
+    assert count_goals(pl_assign) == count_goals(
+        solve_planning(planning, parameters, verbose=False, low_memory=True)
+    )
+
+
+@pytest.mark.slow
+def test_solve_parameters_sweep(planning: Planning, parameters: PlanningParameters):
+    parameters_sweep = [
+        parameters,
+        dataclasses.replace(parameters, max_number_shift_per_month=1),
+    ]
+    pl_assigns = solve_parameters_sweep(planning, parameters_sweep, max_workers=2)
+    for pl_assign, parameters_solve in zip(pl_assigns, parameters_sweep):
+        checks = check_planning_assignation(pl_assign, parameters_solve)
+        assert len(checks) == 0, format_checks(checks)
+        assert count_goals(pl_assign) == count_goals(
+            solve_planning(planning, parameters_solve, verbose=False, low_memory=True)
+        )
+
+
+@pytest.mark.slow
+def test_daemon(tmp_path: Path):
+    async def run() -> None:
+        daemon = PlanningDaemon(root=tmp_path)
+
+        async def call(method: str, **params) -> Dict[str, Any]:
+            request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+            return await daemon.handle_request(request)
+
+        async def run_job(method: str, **params) -> Any:
+            job_id = (await call(method, **params))["result"]
+            job = (await call("wait", job_id=job_id))["result"]
+            assert job["status"] == "done", job["error"]
+            return job["result"]
+
+        await run_job("generate", planning_id="a", number_persons=20)
+        solution = await run_job("solve", planning_id="a")
+        assert solution["solve_stats"]["status"] == "Optimal"
+        assert await run_job("check", planning_id="a") == []
+        assert await run_job("export", planning_id="a", path="a.csv") == str(
+            tmp_path / "a.csv"
+        )
+        assert (tmp_path / "a.csv").exists()
+
+        # only the files under the root
+        for method, params in [
+            ("read", {}),
+            ("export", {"planning_id": "a"}),
+        ]:
+            for path in ["../a.xlsx", "/tmp/a.xlsx"]:
+                response = await call(method, path=path, **params)
+                assert response["error"]["code"] == -32602
+
+        assert (await call("solve", planning_id="b"))["error"]["code"] == -32602
+        assert (await call("unknown"))["error"]["code"] == -32601
+
+        # cancelled while solving
+        await run_job("generate", planning_id="c", number_persons=1000)
+        job_id = (await call("solve", planning_id="c", low_memory=False))["result"]
+        process = None
+        while process is None:
+            await asyncio.sleep(0.01)
+            process = daemon.jobs[job_id].process
+        job = (await call("cancel", job_id=job_id))["result"]
+        assert job["status"] == "cancelled"
+        # the process is killed and joined
+        assert process.exitcode is not None
+
+    asyncio.run(run())